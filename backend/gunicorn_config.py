@@ -1,4 +1,7 @@
 import multiprocessing
+import os
+import subprocess
+import sys
 
 # Server socket
 bind = "0.0.0.0:5000"
@@ -21,4 +24,10 @@ proc_name = "legal_chatbot"
 
 # SSL (uncomment and configure if using HTTPS)
 # keyfile = "path/to/keyfile"
-# certfile = "path/to/certfile" 
\ No newline at end of file
+# certfile = "path/to/certfile" 
+
+# Server hooks
+def on_starting(server):
+    """Build the Qdrant collection on first start, once in the master before any worker imports handle_graph"""
+    if os.getenv("VECTOR_BACKEND", "qdrant") != "numpy":
+        subprocess.run([sys.executable, "reindex.py", "init"], cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), "pythonllm"), check=True)
@@ -0,0 +1,106 @@
+"""Shared setup and timing helpers of the benchmark scripts"""
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance
+
+from handle_corpus import BACKEND_ROOT, load_corpus_embeddings
+from handle_dataset import load_dataset
+from handle_qdrant import get_qdrant_client, initialize_qdrant_collection
+
+META_PATH = os.path.join(BACKEND_ROOT, "data/all_doc_metas.json")
+MODEL_PATH_1 = os.path.join(BACKEND_ROOT, "embedding/output_v1")
+MODEL_PATH_2 = os.path.join(BACKEND_ROOT, "embedding/output_v2")
+
+VECTOR_NAME_1 = "vn-law-embedding_1"
+VECTOR_NAME_2 = "vn-law-embedding_2"
+VECTOR_SIZE = 128
+
+def timed_ms(fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    """Result of fn(*args, **kwargs) and its wall time in milliseconds"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+def latencies_ms(fn: Callable, inputs: Iterable[tuple]) -> List[float]:
+    """Wall time in milliseconds of fn(*item) for every item of `inputs`"""
+    return [timed_ms(fn, *item)[1] for item in inputs]
+
+def repeat_ms(fn: Callable, repeat: int) -> List[float]:
+    """Wall time in milliseconds of `repeat` calls of fn()"""
+    return latencies_ms(fn, [()] * repeat)
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q))
+
+def latency_summary(latencies: List[float], quantiles: Iterable[float] = (50, 95, 99)) -> Dict[str, float]:
+    return {f"p{q:g}": percentile(latencies, q) for q in quantiles}
+
+def rss_mb() -> float:
+    """Current resident set size (Linux)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def load_metas() -> List[dict]:
+    with open(META_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_questions(limit: int = None) -> List[str]:
+    """Questions of every law in the processed datasets"""
+    questions = load_dataset("questions", columns=["question"]).column("question").to_pylist()
+    return questions[:limit] if limit else questions
+
+def load_embedding_models(args):
+    from sentence_transformers import SentenceTransformer
+
+    return (
+        SentenceTransformer(args.model_1, truncate_dim=VECTOR_SIZE),
+        SentenceTransformer(args.model_2, truncate_dim=VECTOR_SIZE),
+    )
+
+def get_benchmark_qdrant_client(url: str, collection_name: str) -> QdrantClient:
+    """Qdrant client for benchmarks; ":memory:" builds a local-mode collection from the corpus"""
+    if url == ":memory:":
+        client = QdrantClient(location=":memory:")
+    else:
+        client = get_qdrant_client(url, os.getenv("QDRANT_API_KEY"))
+    initialize_qdrant_collection(client, collection_name, VECTOR_NAME_1, VECTOR_NAME_2, VECTOR_SIZE, Distance.COSINE)
+    return client
+
+def sample_query_vectors(count: int, noise: float, seed: int = 0, with_ids: bool = False):
+    """Perturbed corpus vectors used as stand-in queries (no embedding model needed)"""
+    corpus_embeddings_1, corpus_embeddings_2 = load_corpus_embeddings()
+    matrix_1 = np.asarray(corpus_embeddings_1, dtype=np.float32)
+    matrix_2 = np.asarray(corpus_embeddings_2, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(len(matrix_1), size=min(count, len(matrix_1)), replace=False)
+    queries_1 = matrix_1[ids] + rng.normal(scale=noise, size=(len(ids), matrix_1.shape[1])).astype(np.float32)
+    queries_2 = matrix_2[ids] + rng.normal(scale=noise, size=(len(ids), matrix_2.shape[1])).astype(np.float32)
+    if with_ids:
+        return queries_1, queries_2, ids
+    return queries_1, queries_2
+
+def sample_query_pairs(count: int, noise: float) -> List[Tuple[List[float], List[float]]]:
+    """(vector_1, vector_2) of each stand-in query, as passed to FusionRetriever.search_by_vectors"""
+    return list(zip(*(queries.tolist() for queries in sample_query_vectors(count, noise))))
+
+def add_qdrant_arguments(parser, url: str = None) -> None:
+    parser.add_argument("--qdrant-url", default=url or os.getenv("QDRANT_URL", ":memory:"))
+    parser.add_argument("--collection", default=os.getenv("QDRANT_COLLECTION_NAME", "benchmark"))
+
+def add_model_arguments(parser) -> None:
+    parser.add_argument("--model-1", default=MODEL_PATH_1)
+    parser.add_argument("--model-2", default=MODEL_PATH_2)
+
+def add_query_arguments(parser, queries: int, noise: bool = True, queries_help: str = None) -> None:
+    parser.add_argument("--queries", type=int, default=queries, help=queries_help)
+    if noise:
+        parser.add_argument("--noise", type=float, default=0.05, help="Perturbation of the corpus vectors used as queries")
+
+def run_benchmarks(parser) -> None:
+    args = parser.parse_args()
+    args.func(args)
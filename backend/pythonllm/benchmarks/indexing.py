@@ -0,0 +1,166 @@
+"""
+Indexing and corpus loading benchmarks: Qdrant upload and sync, embedding, document store and dataset loads.
+
+Run from the pythonllm directory:
+    python -m benchmarks.indexing upload --qdrant-url http://localhost:6333 --copies 100 --parallel 1 4 8
+    python -m benchmarks.indexing sync --law "BỘ LUẬT HÌNH SỰ"
+    python -m benchmarks.indexing load
+    python -m benchmarks.indexing docstore
+    python -m benchmarks.indexing dataset
+
+Correctness (streamed uploads, sync results, document store and Parquet contents) is checked by the
+tests; these only measure.
+"""
+import argparse
+import os
+import random
+import resource
+
+import numpy as np
+import pyarrow.dataset as ds
+import torch
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from handle_corpus import load_corpus_documents, point_id, CORPUS_EMBEDDINGS_PATH_1, CORPUS_EMBEDDINGS_NPY_PATH_1
+from handle_dataset import load_dataset, read_csv_table, QNC_LAW_NAMES, DATASET_SCHEMAS
+from handle_docstore import load_doc_store
+from handle_qdrant import get_qdrant_client, iter_corpus_points, stream_upload, sync_qdrant_collection
+from benchmarks.common import (
+    VECTOR_NAME_1,
+    VECTOR_NAME_2,
+    VECTOR_SIZE,
+    add_qdrant_arguments,
+    get_benchmark_qdrant_client,
+    percentile,
+    repeat_ms,
+    rss_mb,
+    run_benchmarks,
+    timed_ms,
+)
+
+def bench_upload(args):
+    client = QdrantClient(location=":memory:") if args.qdrant_url == ":memory:" else get_qdrant_client(args.qdrant_url, os.getenv("QDRANT_API_KEY"))
+    all_docs, all_doc_metas = load_corpus_documents()
+
+    def scaled_points():
+        # The corpus repeated `copies` times under fresh ids, generated lazily
+        for copy in range(args.copies):
+            for point in iter_corpus_points(all_docs, all_doc_metas, VECTOR_NAME_1, VECTOR_NAME_2):
+                if copy:
+                    point.id = point_id(f"{point.payload['corpus_id']}#{copy}")
+                yield point
+
+    total = args.copies * len(all_docs)
+    for parallel in args.parallel:
+        collection_name = f"{args.collection}_upload_{parallel}"
+        if client.collection_exists(collection_name):
+            client.delete_collection(collection_name)
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config={
+                VECTOR_NAME_1: VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
+                VECTOR_NAME_2: VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
+            }
+        )
+        _, elapsed_ms = timed_ms(
+            stream_upload, client, collection_name, scaled_points(), total=total, batch_size=args.batch_size, parallel=parallel
+        )
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"parallel={parallel}: {total} points, {total / elapsed_ms * 1000:.0f} points/s, peak RSS {peak_mb:.0f} MB")
+        client.delete_collection(collection_name)
+
+def bench_sync(args):
+    collection_name = f"{args.collection}_sync"
+    client = get_benchmark_qdrant_client(args.qdrant_url, collection_name)
+    all_docs, all_doc_metas = load_corpus_documents()
+    # Amend one law in place, drop the first chunk (no other point moves), then drop the last chunks
+    amended_docs = [
+        doc + " (sửa đổi)" if meta["law_name"] == args.law else doc
+        for doc, meta in zip(all_docs, all_doc_metas)
+    ]
+    steps = [
+        ("no change", all_docs, all_doc_metas),
+        (f"amend {args.law}", amended_docs, all_doc_metas),
+        ("drop first chunk", amended_docs[1:], all_doc_metas[1:]),
+        (f"drop last {args.drop} chunks", amended_docs[1:-args.drop], all_doc_metas[1:-args.drop]),
+    ]
+    for name, docs, metas in steps:
+        counts, elapsed_ms = timed_ms(sync_qdrant_collection, client, collection_name, VECTOR_NAME_1, VECTOR_NAME_2, docs, metas)
+        print(f"{name:<40} {elapsed_ms / 1000:>6.2f} s  {counts}")
+    client.delete_collection(collection_name)
+
+def bench_load(args):
+    def load_p50(load):
+        # touch the last row, so a memory-mapped load pays for the pages it reads
+        return percentile(repeat_ms(lambda: float(load()[-1].sum()), args.repeat), 50)
+
+    print(f"{'format':<28} {'load p50 (ms)':>14}")
+    print(f"{'torch.load (.pt)':<28} {load_p50(lambda: torch.load(CORPUS_EMBEDDINGS_PATH_1, weights_only=False)):>14.3f}")
+    print(f"{'np.load mmap (.npy)':<28} {load_p50(lambda: np.load(CORPUS_EMBEDDINGS_NPY_PATH_1, mmap_mode='r')):>14.3f}")
+
+def bench_docstore(args):
+    rng = random.Random(0)
+    before = rss_mb()
+    all_docs, all_doc_metas = load_corpus_documents()
+    json_mb = rss_mb() - before
+    ids = [rng.randrange(len(all_docs)) for _ in range(args.lookups)]
+    _, json_ms = timed_ms(lambda: [(all_docs[idx], all_doc_metas[idx]) for idx in ids])
+    del all_docs, all_doc_metas
+
+    before = rss_mb()
+    doc_store = load_doc_store()
+    store_mb = rss_mb() - before
+    _, store_ms = timed_ms(lambda: [(doc_store.text(idx), doc_store.meta(idx)) for idx in ids])
+
+    print(f"{'store':<22} {'RSS after load (MB)':>20} {'lookup (us)':>12}")
+    print(f"{'JSON lists':<22} {json_mb:>20.1f} {json_ms / len(ids) * 1000:>12.2f}")
+    print(f"{'DocStore (mmap)':<22} {store_mb:>20.1f} {store_ms / len(ids) * 1000:>12.2f}")
+
+def bench_dataset(args):
+    load_dataset("corpus")  # warm up the manifest cache
+    cases = {
+        "CSV, all tables": lambda: [read_csv_table(prefix, table) for prefix in QNC_LAW_NAMES for table in DATASET_SCHEMAS],
+        "Parquet, all tables": lambda: [load_dataset(table) for table in DATASET_SCHEMAS],
+        "Parquet, qnc ids": lambda: load_dataset("qnc", columns=["question_id", "corpus_id"]),
+        "Parquet, one law": lambda: [load_dataset(table, laws=[args.law]) for table in DATASET_SCHEMAS],
+        "Parquet, one article": lambda: load_dataset("corpus", columns=["corpus_id", "content"], laws=[args.law], filter=ds.field("article") == 1),
+    }
+    print(f"{'load':<24} {'p50 (ms)':>9}")
+    for name, load in cases.items():
+        print(f"{name:<24} {percentile(repeat_ms(load, args.repeat), 50):>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexing and corpus loading benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    upload = subparsers.add_parser("upload", help="Upload throughput of the corpus (repeated --copies times) per number of connections")
+    add_qdrant_arguments(upload)
+    upload.add_argument("--copies", type=int, default=10)
+    upload.add_argument("--batch-size", type=int, default=256)
+    upload.add_argument("--parallel", type=int, nargs="+", default=[1, 4])
+    upload.set_defaults(func=bench_upload)
+
+    sync = subparsers.add_parser("sync", help="Incremental sync time after amending one law and dropping chunks")
+    add_qdrant_arguments(sync)
+    sync.add_argument("--law", default="BỘ LUẬT HÌNH SỰ")
+    sync.add_argument("--drop", type=int, default=10)
+    sync.set_defaults(func=bench_sync)
+
+    load = subparsers.add_parser("load", help="Load time of the .pt embeddings vs. the memory-mapped .npy")
+    load.add_argument("--repeat", type=int, default=50)
+    load.set_defaults(func=bench_load)
+
+    docstore = subparsers.add_parser("docstore", help="Memory and lookup latency of the DocStore vs. the JSON lists")
+    docstore.add_argument("--lookups", type=int, default=10000)
+    docstore.set_defaults(func=bench_docstore)
+
+    dataset = subparsers.add_parser("dataset", help="Load time of the datasets from CSV vs. Parquet")
+    dataset.add_argument("--law", default="BỘ LUẬT DÂN SỰ")
+    dataset.add_argument("--repeat", type=int, default=5)
+    dataset.set_defaults(func=bench_dataset)
+
+    run_benchmarks(parser)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+LLM client benchmarks against local OpenAI-compatible stub endpoints (FakeChatServer).
+
+Run from the pythonllm directory:
+    python -m benchmarks.llm keypool --keys 1 2 4 --rpm 20 --period 2
+    python -m benchmarks.llm router --delays 0.05 0.2 --slow-delay 1 --slow-ratio 0.04
+
+The scheduling and routing logic itself is checked by tests/test_ratelimit.py and tests/test_router.py;
+these measure throughput and tail latency end to end.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from handle_ratelimit import KeyScheduler, KeyPoolRunnable
+from handle_router import LatencyRouter, RouterRunnable
+from benchmarks.common import latency_summary, run_benchmarks, timed_ms
+
+PROMPT = "Người lao động có thể đơn phương chấm dứt hợp đồng lao động không?"
+
+class FakeChatServer(ThreadingHTTPServer):
+    """
+    Local OpenAI-compatible /v1/chat/completions endpoint for LLM client benchmarks.
+
+    Each API key (the bearer token) gets `rpm` requests and `tpm` prompt tokens per sliding window of
+    `period` seconds; over quota it answers 429 with a Retry-After header, like the hosted APIs.
+    Accepted requests are answered after `delay` seconds, a `slow_ratio` fraction of them after
+    `slow_delay` seconds instead, and an `error_ratio` fraction fail with 500.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        period: float = 60.0,
+        delay: float = 0.0,
+        slow_delay: float = 0.0,
+        slow_ratio: float = 0.0,
+        error_ratio: float = 0.0,
+    ):
+        super().__init__(("127.0.0.1", 0), FakeChatHandler)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.period = period
+        self.delay = delay
+        self.slow_delay = slow_delay
+        self.slow_ratio = slow_ratio
+        self.error_ratio = error_ratio
+        self.windows = {}
+        self.served = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def admit(self, key: str, tokens: int) -> float:
+        """0 if the request fits the key's quota (and is counted), else seconds until it would"""
+        with self.lock:
+            now = time.monotonic()
+            window = self.windows.setdefault(key, [])
+            window[:] = [(sent, used) for sent, used in window if sent > now - self.period]
+            over_requests = self.rpm and len(window) + 1 > self.rpm
+            over_tokens = self.tpm and sum(used for _, used in window) + tokens > self.tpm
+            if over_requests or over_tokens:
+                self.rejected += 1
+                return window[0][0] + self.period - now if window else self.period
+            window.append((now, tokens))
+            self.served += 1
+            return 0.0
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        key = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        tokens = sum(len(str(message.get("content", ""))) for message in request["messages"]) // 3 + 1
+        retry_after = self.server.admit(key, tokens)
+        if retry_after:
+            self.reply(429, {"error": {"message": "Quota exceeded", "type": "rate_limit_error", "code": 429}},
+                       {"Retry-After": f"{retry_after:.3f}"})
+            return
+        if random.random() < self.server.error_ratio:
+            self.reply(500, {"error": {"message": "Injected failure", "type": "server_error", "code": 500}})
+            return
+        time.sleep(self.server.slow_delay if random.random() < self.server.slow_ratio else self.server.delay)
+        self.reply(200, {
+            "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": tokens, "completion_tokens": 1, "total_tokens": tokens + 1},
+        })
+
+def run_llm_load(llm, prompt: str, concurrency: int, duration: float) -> dict:
+    """Call `llm` from `concurrency` threads for `duration` seconds: completed calls, errors, latencies"""
+    deadline = time.perf_counter() + duration
+    latencies, errors = [], []
+
+    def worker():
+        while time.perf_counter() < deadline:
+            try:
+                latencies.append(timed_ms(llm.invoke, prompt)[1])
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return {"ok": len(latencies), "errors": len(errors), "latencies": latencies}
+
+def bench_keypool(args):
+    from langchain_openai import ChatOpenAI
+
+    print(f"quota per key: {args.rpm} requests / {args.period}s, {args.concurrency} callers for {args.duration}s")
+    print(f"{'keys':>4} {'mode':<10} {'ok/s':>7} {'ceiling':>8} {'errors':>7} {'429s':>6} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for num_keys in args.keys:
+        for mode in ("scheduler", "fallbacks"):
+            server = FakeChatServer(rpm=args.rpm, tpm=args.tpm, period=args.period, delay=args.delay)
+            llms = [
+                ChatOpenAI(model="fake", base_url=server.url, api_key=f"key-{idx}", max_retries=0)
+                for idx in range(num_keys)
+            ]
+            if mode == "scheduler":
+                scheduler = KeyScheduler(
+                    [f"key-{idx}" for idx in range(num_keys)], rpm=args.rpm, tpm=args.tpm,
+                    period=args.period, cooldown=args.period, max_wait=args.duration
+                )
+                llm = KeyPoolRunnable(scheduler, llms)
+            else:
+                llm = llms[0].with_fallbacks(llms[1:]) if num_keys > 1 else llms[0]
+            result = run_llm_load(llm, PROMPT, args.concurrency, args.duration)
+            server.shutdown()
+            latency = latency_summary(result["latencies"] or [0.0])
+            # the most a sliding-window quota admits in `duration` seconds
+            ceiling = num_keys * args.rpm * np.ceil(args.duration / args.period) / args.duration
+            print(f"{num_keys:>4} {mode:<10} {result['ok'] / args.duration:>7.2f} {ceiling:>8.2f} {result['errors']:>7} "
+                  f"{server.rejected:>6} {latency['p50']:>9.1f} {latency['p95']:>9.1f}")
+
+def bench_router(args):
+    from langchain_openai import ChatOpenAI
+
+    print(f"gemini stub: {args.delays[0] * 1000:.0f} ms, {args.slow_ratio:.0%} of calls {args.slow_delay * 1000:.0f} ms, "
+          f"{args.error_ratio:.0%} errors; vllm stub: {args.delays[1] * 1000:.0f} ms; {args.requests} calls x {args.concurrency}")
+    print(f"{'mode':<12} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'errors':>7} {'gemini':>7} {'vllm':>6} {'hedges':>7} {'won':>5}")
+    for mode in ("fallbacks", "router", "hedged"):
+        servers = {
+            "gemini": FakeChatServer(delay=args.delays[0], slow_delay=args.slow_delay, slow_ratio=args.slow_ratio, error_ratio=args.error_ratio),
+            "vllm": FakeChatServer(delay=args.delays[1]),
+        }
+        llms = {name: ChatOpenAI(model="fake", base_url=server.url, api_key="EMPTY", max_retries=0) for name, server in servers.items()}
+        router = LatencyRouter(list(llms), hedge_quantile=args.quantile if mode == "hedged" else None, min_samples=args.min_samples)
+        llm = llms["gemini"].with_fallbacks([llms["vllm"]]) if mode == "fallbacks" else RouterRunnable(router, llms)
+
+        latencies, errors = [], 0
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for future in [executor.submit(timed_ms, llm.invoke, PROMPT) for _ in range(args.requests)]:
+                try:
+                    latencies.append(future.result()[1])
+                except Exception:
+                    errors += 1
+        served = {name: server.served for name, server in servers.items()}
+        for server in servers.values():
+            server.shutdown()
+        latency = latency_summary(latencies)
+        print(f"{mode:<12} {latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} "
+              f"{errors:>7} {served['gemini']:>7} {served['vllm']:>6} {router.hedges:>7} {router.hedge_wins:>5}")
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM client benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    keypool = subparsers.add_parser("keypool", help="Throughput of KeyScheduler vs. with_fallbacks against a stub endpoint with quotas")
+    keypool.add_argument("--keys", type=int, nargs="+", default=[1, 2, 4])
+    keypool.add_argument("--rpm", type=int, default=20, help="Requests per key per --period")
+    keypool.add_argument("--tpm", type=int, default=0, help="Tokens per key per --period (0 = unlimited)")
+    keypool.add_argument("--period", type=float, default=2.0, help="Quota window in seconds, shortened from 60s to run quickly")
+    keypool.add_argument("--delay", type=float, default=0.02, help="Response delay of the endpoint in seconds")
+    keypool.add_argument("--concurrency", type=int, default=16)
+    keypool.add_argument("--duration", type=float, default=6.0)
+    keypool.set_defaults(func=bench_keypool)
+
+    router = subparsers.add_parser("router", help="Tail latency of with_fallbacks vs. LatencyRouter (with and without hedging) over two stub backends")
+    router.add_argument("--delays", type=float, nargs=2, default=[0.05, 0.2], help="Usual delay of the gemini and vllm stubs in seconds")
+    router.add_argument("--slow-delay", type=float, default=1.0, help="Delay of the slow gemini calls in seconds")
+    router.add_argument("--slow-ratio", type=float, default=0.04, help="Fraction of slow gemini calls")
+    router.add_argument("--error-ratio", type=float, default=0.0, help="Fraction of gemini calls failing with 500")
+    router.add_argument("--quantile", type=float, default=95.0, help="Hedge calls slower than this latency quantile")
+    router.add_argument("--min-samples", type=int, default=20)
+    router.add_argument("--requests", type=int, default=400)
+    router.add_argument("--concurrency", type=int, default=4)
+    router.set_defaults(func=bench_router)
+
+    run_benchmarks(parser)
+
+if __name__ == "__main__":
+    main()
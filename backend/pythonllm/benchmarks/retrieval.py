@@ -0,0 +1,489 @@
+"""
+Retrieval benchmarks: lookup, encoding and search latency, and ranking quality on the qnc datasets.
+
+Run from the pythonllm directory:
+    python -m benchmarks.retrieval law-index
+    python -m benchmarks.retrieval backends --qdrant-url :memory:
+    python -m benchmarks.retrieval encode
+    python -m benchmarks.retrieval batch --backend numpy
+    python -m benchmarks.retrieval fan-out --backend qdrant
+    python -m benchmarks.retrieval lexical
+    python -m benchmarks.retrieval async --qdrant-url http://localhost:6333 --concurrency 200
+    python -m benchmarks.retrieval quantization --modes int8 binary --oversampling 2 4 8
+    python -m benchmarks.retrieval matryoshka --dims 32 64 --funnel 20 50 100 200
+    python -m benchmarks.retrieval eval --systems numpy hybrid qdrant lexical law-index --output results.json
+
+Correctness (parity with Qdrant, batch and async results, fan-out coverage and latency) is checked
+by the tests; these only measure.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Set, Tuple
+
+import numpy as np
+import torch
+
+from handle_corpus import load_corpus_embeddings, point_id
+from handle_dataset import load_dataset
+from handle_docstore import load_doc_store
+from handle_lexical import load_lexical_index
+from handle_qdrant import get_async_qdrant_client
+from handle_retriever import LAW_FAMILIES, FusionRetriever, LawIndex, LawIndexRetriever
+from handle_vector_search import NumpySearchClient, get_numpy_search_client
+from benchmarks.common import (
+    VECTOR_NAME_1,
+    VECTOR_NAME_2,
+    add_model_arguments,
+    add_qdrant_arguments,
+    add_query_arguments,
+    get_benchmark_qdrant_client,
+    latencies_ms,
+    latency_summary,
+    load_embedding_models,
+    load_metas,
+    load_questions,
+    percentile,
+    run_benchmarks,
+    sample_query_pairs,
+    sample_query_vectors,
+    timed_ms,
+)
+
+def scale_metas(metas: List[dict], size: int) -> List[dict]:
+    """Copies of the metadata (law names renamed per copy) up to `size` chunks"""
+    scaled = []
+    copy = 0
+    while len(scaled) < size:
+        for meta in metas:
+            if len(scaled) >= size:
+                break
+            law_name = meta["law_name"] if copy == 0 else f"{meta['law_name']} #{copy}"
+            scaled.append({"law_name": law_name, "article": meta["article"]})
+        copy += 1
+    return scaled
+
+def linear_lookup(metas: List[dict], law_name: str, article: str) -> List[int]:
+    # How LawIndexRetriever used to look up a citation: a scan over all metadata
+    for i in range(len(metas)):
+        meta = metas[i]
+        if meta["law_name"] == law_name and meta["article"] == article:
+            return [i]
+    return []
+
+def get_search_client(args, doc_store):
+    if args.backend == "numpy":
+        return get_numpy_search_client(VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store)
+    return get_benchmark_qdrant_client(args.qdrant_url, args.collection)
+
+def bench_law_index(args):
+    metas = load_metas()
+    rng = random.Random(0)
+    print(f"{'chunks':>8} {'build (ms)':>11} {'index (us/query)':>17} {'linear (us/query)':>18}")
+    for size in args.sizes:
+        scaled = scale_metas(metas, size)
+        queries = [rng.choice(scaled) for _ in range(args.queries)]
+        citations = [[(q["law_name"], int(q["article"]), int(q["article"]))] for q in queries]
+
+        index, build_ms = timed_ms(LawIndex, scaled)
+        _, index_ms = timed_ms(lambda: [index.lookup_citations(citation) for citation in citations])
+        linear_queries = queries[:args.linear_queries]
+        _, linear_ms = timed_ms(lambda: [linear_lookup(scaled, q["law_name"], q["article"]) for q in linear_queries])
+
+        print(f"{size:>8} {build_ms:>11.1f} {index_ms / len(citations) * 1000:>17.2f} {linear_ms / len(linear_queries) * 1000:>18.1f}")
+
+def bench_backends(args):
+    # Qdrant stores no chunk texts: both backends read them from the same document store
+    doc_store = load_doc_store()
+    clients = {
+        "qdrant": get_benchmark_qdrant_client(args.qdrant_url, args.collection),
+        "numpy": get_numpy_search_client(VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store),
+    }
+    queries = sample_query_pairs(args.queries, args.noise)
+
+    print(f"{'backend':<8} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for name, client in clients.items():
+        retriever = FusionRetriever(client, None, None, args.collection, VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store)
+        latency = latency_summary(latencies_ms(retriever.search_by_vectors, queries))
+        print(f"{name:<8} {latency['p50']:>9.2f} {latency['p95']:>9.2f}")
+
+def bench_encode(args):
+    questions = load_questions(args.queries)
+    cpu_count = os.cpu_count() or 2
+    embeddings_1, embeddings_2 = load_embedding_models(args)
+
+    def run(retriever, num_threads):
+        torch.set_num_threads(num_threads)
+        retriever.encode(questions[0])  # warm-up
+        return latencies_ms(retriever.encode, [(question,) for question in questions])
+
+    sequential = FusionRetriever(None, embeddings_1, embeddings_2, "benchmark")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        concurrent = FusionRetriever(None, embeddings_1, embeddings_2, "benchmark", encode_executor=executor)
+        results = {
+            f"sequential ({cpu_count} threads)": run(sequential, cpu_count),
+            f"concurrent ({max(1, cpu_count // 2)} threads/model)": run(concurrent, max(1, cpu_count // 2)),
+        }
+
+    print(f"{'mode':<32} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for mode, latencies in results.items():
+        latency = latency_summary(latencies)
+        print(f"{mode:<32} {latency['p50']:>9.2f} {latency['p95']:>9.2f}")
+
+def bench_batch(args):
+    questions = load_questions(args.queries)
+    doc_store = load_doc_store()
+    embeddings_1, embeddings_2 = load_embedding_models(args)
+    retriever = FusionRetriever(
+        get_search_client(args, doc_store), embeddings_1, embeddings_2, args.collection, VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store
+    )
+
+    _, single_ms = timed_ms(lambda: [retriever.invoke(question) for question in questions])
+    _, batch_ms = timed_ms(retriever.batch_retrieve, questions, batch_size=args.batch_size)
+    print(f"questions: {len(questions)}")
+    print(f"invoke loop:    {single_ms / 1000:.2f} s ({len(questions) / single_ms * 1000:.1f} q/s)")
+    print(f"batch_retrieve: {batch_ms / 1000:.2f} s ({len(questions) / batch_ms * 1000:.1f} q/s)")
+
+def bench_fan_out(args):
+    doc_store = load_doc_store()
+    retriever = FusionRetriever(get_search_client(args, doc_store), None, None, args.collection, VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store)
+    queries = sample_query_pairs(args.queries, args.noise)
+    law_families = list(LAW_FAMILIES.values())
+
+    results = {
+        "single search": latencies_ms(retriever.search_by_vectors, queries),
+        f"fan-out ({len(law_families)} families)": latencies_ms(
+            lambda vector_1, vector_2: retriever.search_fan_out(vector_1, vector_2, law_families), queries
+        ),
+    }
+    print(f"{'mode':<24} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for mode, latencies in results.items():
+        latency = latency_summary(latencies)
+        print(f"{mode:<24} {latency['p50']:>9.2f} {latency['p95']:>9.2f}")
+
+def bench_lexical(args):
+    lexical_index = load_lexical_index()
+    questions = load_questions(args.queries)
+    latency = latency_summary(latencies_ms(lambda question: lexical_index.search(question, limit=20), [(q,) for q in questions]))
+    print(f"questions: {len(questions)}, vocabulary: {len(lexical_index.vocab)} terms")
+    print(f"lexical lane p50: {latency['p50']:.3f} ms, p95: {latency['p95']:.3f} ms")
+
+def bench_async(args):
+    client = get_benchmark_qdrant_client(args.qdrant_url, args.collection)
+    vectors = sample_query_pairs(args.queries, args.noise)
+    doc_store = load_doc_store()
+    retriever = FusionRetriever(client, None, None, args.collection, VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store)
+    _, sync_ms = timed_ms(lambda: [retriever.search_by_vectors(vector_1, vector_2) for vector_1, vector_2 in vectors])
+
+    async def run_async():
+        async_client = get_async_qdrant_client(args.qdrant_url, os.getenv("QDRANT_API_KEY"), prefer_grpc=args.grpc, pool_size=args.concurrency)
+        async_retriever = FusionRetriever(
+            client, None, None, args.collection, VECTOR_NAME_1, VECTOR_NAME_2, async_client=async_client, doc_store=doc_store
+        )
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def search(vector_1, vector_2):
+            async with semaphore:
+                return await async_retriever.asearch_by_vectors(vector_1, vector_2)
+
+        await search(*vectors[0])  # warm-up (opens the connection pool)
+        start = time.perf_counter()
+        await asyncio.gather(*(search(vector_1, vector_2) for vector_1, vector_2 in vectors))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        await async_client.close()
+        return elapsed_ms
+
+    async_ms = asyncio.run(run_async())
+    print(f"queries: {len(vectors)}")
+    print(f"sync, sequential:              {len(vectors) / sync_ms * 1000:>8.1f} q/s")
+    print(f"async, {args.concurrency:>4} in flight ({'grpc' if args.grpc else 'rest'}): {len(vectors) / async_ms * 1000:>8.1f} q/s")
+
+def load_qnc_relevance(metas: List[dict]) -> List[Tuple[str, str, Set[int]]]:
+    """
+    (law_name, question, relevant corpus positions) from the qnc pairs of every law.
+
+    Dataset corpus entries are mapped to backend chunks by (law, article), the article being the
+    last "Điều N" heading at or before the entry (see handle_dataset).
+    """
+    index = LawIndex(metas)
+    corpus = load_dataset("corpus", columns=["law", "corpus_id", "article"]).to_pydict()
+    articles = {(law_name, corpus_id): article for law_name, corpus_id, article in zip(corpus["law"], corpus["corpus_id"], corpus["article"])}
+    questions = load_dataset("questions", columns=["law", "question_id", "question"]).to_pydict()
+    qnc = load_dataset("qnc").to_pydict()
+
+    relevant = {}
+    for law_name, question_id, corpus_id in zip(qnc["law"], qnc["question_id"], qnc["corpus_id"]):
+        relevant.setdefault((law_name, question_id), set()).update(index.lookup(law_name, articles[(law_name, corpus_id)]))
+    return [
+        (law_name, question, relevant[(law_name, question_id)])
+        for law_name, question_id, question in zip(questions["law"], questions["question_id"], questions["question"])
+        if (law_name, question_id) in relevant
+    ]
+
+def load_eval_samples(args) -> List[tuple]:
+    """
+    (law_name, question, vector_1, vector_2, relevant corpus positions) per evaluation query.
+
+    Questions are a seeded sample of the qnc pairs (all of them with --queries 0), encoded in batch.
+    With --synthetic, perturbed corpus vectors stand in for them: no model is loaded and there is no
+    question text.
+    """
+    if args.synthetic:
+        metas = load_metas()
+        queries_1, queries_2, ids = sample_query_vectors(args.queries or len(metas), args.noise, with_ids=True)
+        return [
+            (metas[i]["law_name"], None, vector_1, vector_2, {int(i)})
+            for i, vector_1, vector_2 in zip(ids, queries_1.tolist(), queries_2.tolist())
+        ]
+
+    samples = load_qnc_relevance(load_metas())
+    if args.queries:
+        samples = random.Random(0).sample(samples, min(args.queries, len(samples)))
+    encoder = FusionRetriever(None, *load_embedding_models(args), "benchmark")
+    queries_1, queries_2 = encoder.encode_batch([question for _, question, _ in samples])
+    return [
+        (law_name, question, vector_1, vector_2, ids)
+        for (law_name, question, ids), vector_1, vector_2 in zip(samples, np.asarray(queries_1).tolist(), np.asarray(queries_2).tolist())
+    ]
+
+def compare_candidate_scans(args, configs):
+    """recall@k, overlap with the float top-k, latency and scan memory of each (name, quantization, oversampling, funnel) config"""
+    samples = load_eval_samples(args)
+    queries = [(vector_1, vector_2) for _, _, vector_1, vector_2, _ in samples]
+    relevant = [ids for *_, ids in samples]
+    corpus_embeddings_1, corpus_embeddings_2 = load_corpus_embeddings()
+    doc_store = load_doc_store()
+    vectors = {VECTOR_NAME_1: corpus_embeddings_1, VECTOR_NAME_2: corpus_embeddings_2}
+
+    baseline = None
+    print(f"queries: {len(queries)} ({'synthetic' if args.synthetic else 'qnc'})")
+    print(f"{'config':<22} {f'recall@{args.k}':>9} {f'float top-{args.k}':>12} {'p50 (ms)':>9} {'scan (KB)':>10}")
+    for name, quantization, oversampling, funnel_size in [("float", None, 1.0, None)] + configs:
+        client = NumpySearchClient(vectors, doc_store, quantization=quantization, oversampling=oversampling, funnel_size=funnel_size)
+        retriever = FusionRetriever(client, None, None, "benchmark", VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store)
+        results, latencies = [], []
+        for vector_1, vector_2 in queries:
+            response, elapsed_ms = timed_ms(client.query_points, "benchmark", **retriever._build_query(vector_1, vector_2, limit=args.k))
+            latencies.append(elapsed_ms)
+            results.append([point.id for point in response.points])
+        if baseline is None:
+            baseline = results
+        recall = np.mean([len(set(result) & ids) / len(ids) for result, ids in zip(results, relevant)])
+        agreement = np.mean([len(set(result) & set(expected)) / args.k for result, expected in zip(results, baseline)])
+        if client.coarse:
+            size_kb = sum(coarse.nbytes for coarse in client.coarse.values()) / 1024
+        else:
+            size_kb = sum(matrix.nbytes for matrix in client.vectors.values()) / 1024
+        print(f"{name:<22} {recall:>9.4f} {agreement:>12.4f} {percentile(latencies, 50):>9.3f} {size_kb:>10.0f}")
+
+def bench_quantization(args):
+    compare_candidate_scans(args, [
+        (f"{mode} x{oversampling:g}", {VECTOR_NAME_1: mode, VECTOR_NAME_2: mode}, oversampling, None)
+        for mode in args.modes
+        for oversampling in args.oversampling
+    ])
+
+def bench_matryoshka(args):
+    compare_candidate_scans(args, [
+        (f"{dims} dims, top-{funnel_size}", {VECTOR_NAME_1: f"matryoshka-{dims}", VECTOR_NAME_2: f"matryoshka-{dims}"}, 1.0, funnel_size)
+        for dims in args.dims
+        for funnel_size in args.funnel
+    ])
+
+def ranking_metrics(ranking: List[int], relevant: Set[int], ks: List[int]) -> dict:
+    """recall@k, MRR@k and nDCG@k (binary relevance) of one ranked id list"""
+    metrics = {}
+    for k in ks:
+        top = ranking[:k]
+        hits = [int(point_id in relevant) for point_id in top]
+        first = hits.index(1) + 1 if 1 in hits else None
+        dcg = sum(hit / np.log2(rank + 2) for rank, hit in enumerate(hits))
+        ideal = sum(1 / np.log2(rank + 2) for rank in range(min(len(relevant), k)))
+        metrics[f"recall@{k}"] = sum(hits) / len(relevant)
+        metrics[f"mrr@{k}"] = 1 / first if first else 0.0
+        metrics[f"ndcg@{k}"] = dcg / ideal
+    return metrics
+
+def document_positions(doc_store, documents) -> List[int]:
+    return [doc_store.position(point_id(doc.metadata["corpus_id"])) for doc in documents]
+
+def get_eval_systems(args, depth: int) -> dict:
+    """
+    Retrieval systems under evaluation, each a function (question, vector_1, vector_2) -> ranked corpus positions.
+
+    Every system returns documents through the same path as the chatbot (DocStore lookup included),
+    only with `depth` results instead of the production limit. Text-based systems are skipped with
+    --synthetic since there is no question text.
+    """
+    doc_store = load_doc_store()
+    systems = {}
+
+    def dense(retriever):
+        def run(question, vector_1, vector_2):
+            query = retriever._build_query(vector_1, vector_2, limit=depth)
+            return document_positions(doc_store, retriever._to_documents(retriever.client.query_points(retriever.collection_name, **query).points))
+        return run
+
+    def hybrid(retriever):
+        def run(question, vector_1, vector_2):
+            rankings = retriever._hybrid_rankings([(question, vector_1, vector_2, None)], limit=depth)
+            return document_positions(doc_store, retriever._fetch_documents(rankings)[0])
+        return run
+
+    if "numpy" in args.systems or "hybrid" in args.systems:
+        client = get_numpy_search_client(VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store)
+        if "numpy" in args.systems:
+            systems["numpy"] = dense(FusionRetriever(client, None, None, "benchmark", VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store))
+        if "hybrid" in args.systems and not args.synthetic:
+            retriever = FusionRetriever(
+                client, None, None, "benchmark", VECTOR_NAME_1, VECTOR_NAME_2,
+                lexical_index=load_lexical_index(), doc_store=doc_store,
+            )
+            systems["hybrid"] = hybrid(retriever)
+    if "qdrant" in args.systems:
+        client = get_benchmark_qdrant_client(args.qdrant_url, args.collection)
+        systems["qdrant"] = dense(FusionRetriever(client, None, None, args.collection, VECTOR_NAME_1, VECTOR_NAME_2, doc_store=doc_store))
+    if "lexical" in args.systems and not args.synthetic:
+        lexical_index = load_lexical_index()
+        systems["lexical"] = lambda question, vector_1, vector_2: [
+            doc_store.position(hit) for hit in lexical_index.search(question, limit=depth)
+        ]
+    if "law-index" in args.systems and not args.synthetic:
+        law_index_retriever = LawIndexRetriever(doc_store, max_documents=depth)
+        systems["law-index"] = lambda question, vector_1, vector_2: document_positions(doc_store, law_index_retriever.invoke(question))
+    return systems
+
+def summarize_metrics(rows: List[dict]) -> dict:
+    return {name: float(np.mean([row[name] for row in rows])) for name in rows[0]}
+
+def bench_eval(args):
+    samples = load_eval_samples(args)
+    systems = get_eval_systems(args, max(args.k))
+    laws = sorted({law_name for law_name, *_ in samples})
+    results = {
+        "config": {
+            "queries": len(samples),
+            "source": "synthetic" if args.synthetic else "qnc",
+            "k": args.k,
+            "qdrant_url": args.qdrant_url if "qdrant" in args.systems else None,
+        },
+        "systems": {},
+    }
+
+    depth = max(args.k)
+    headline = [f"recall@{depth}", f"mrr@{depth}", f"ndcg@{depth}"]
+    print(f"queries: {len(samples)} ({results['config']['source']}), laws: {len(laws)}")
+    print(f"{'system':<10} {'law':<48} {headline[0]:>10} {headline[1]:>8} {headline[2]:>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'q/s':>8}")
+    for name, system in systems.items():
+        system(*samples[0][1:4])  # warm-up
+        metrics_by_law = {law_name: [] for law_name in laws}
+        latencies = []
+        start = time.perf_counter()
+        for law_name, question, vector_1, vector_2, relevant in samples:
+            ranking, elapsed_ms = timed_ms(system, question, vector_1, vector_2)
+            latencies.append(elapsed_ms)
+            metrics_by_law[law_name].append(ranking_metrics(ranking, relevant, args.k))
+        elapsed = time.perf_counter() - start
+
+        overall = summarize_metrics([row for rows in metrics_by_law.values() for row in rows])
+        latency = latency_summary(latencies)
+        results["systems"][name] = {
+            "overall": overall,
+            "laws": {law_name: {"queries": len(rows), **summarize_metrics(rows)} for law_name, rows in metrics_by_law.items()},
+            "latency_ms": latency,
+            "throughput_qps": len(samples) / elapsed,
+        }
+        print(
+            f"{name:<10} {'(all)':<48} {overall[headline[0]]:>10.4f} {overall[headline[1]]:>8.4f} {overall[headline[2]]:>8.4f} "
+            f"{latency['p50']:>9.3f} {latency['p95']:>9.3f} {latency['p99']:>9.3f} {len(samples) / elapsed:>8.1f}"
+        )
+        for law_name, metrics in results["systems"][name]["laws"].items():
+            print(f"{'':<10} {law_name[:48]:<48} {metrics[headline[0]]:>10.4f} {metrics[headline[1]]:>8.4f} {metrics[headline[2]]:>8.4f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"results written to {args.output}")
+
+def add_candidate_scan_arguments(parser) -> None:
+    parser.add_argument("--k", type=int, default=3)
+    add_query_arguments(parser, 2000)
+    add_model_arguments(parser)
+    parser.add_argument("--synthetic", action="store_true", help="Perturbed corpus vectors instead of encoded qnc questions")
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    law_index = subparsers.add_parser("law-index", help="LawIndex lookups vs. a linear scan as the corpus grows")
+    law_index.add_argument("--sizes", type=int, nargs="+", default=[2000, 10000, 100000])
+    law_index.add_argument("--queries", type=int, default=10000)
+    law_index.add_argument("--linear-queries", type=int, default=200)
+    law_index.set_defaults(func=bench_law_index)
+
+    backends = subparsers.add_parser("backends", help="Search latency of Qdrant vs. NumpySearchClient")
+    add_qdrant_arguments(backends)
+    add_query_arguments(backends, 200)
+    backends.set_defaults(func=bench_backends)
+
+    encode = subparsers.add_parser("encode", help="Encode latency of the two models, sequential vs. concurrent")
+    add_model_arguments(encode)
+    add_query_arguments(encode, 200, noise=False)
+    encode.set_defaults(func=bench_encode)
+
+    batch = subparsers.add_parser("batch", help="Throughput of an invoke loop vs. batch_retrieve")
+    batch.add_argument("--backend", choices=["qdrant", "numpy"], default="numpy")
+    add_qdrant_arguments(batch)
+    add_model_arguments(batch)
+    add_query_arguments(batch, 1000, noise=False)
+    batch.add_argument("--batch-size", type=int, default=64)
+    batch.set_defaults(func=bench_batch)
+
+    fan_out = subparsers.add_parser("fan-out", help="Latency of one search vs. a fan-out over the law families")
+    fan_out.add_argument("--backend", choices=["qdrant", "numpy"], default="qdrant")
+    add_qdrant_arguments(fan_out)
+    add_query_arguments(fan_out, 200)
+    fan_out.set_defaults(func=bench_fan_out)
+
+    lexical = subparsers.add_parser("lexical", help="Latency of the BM25 lane")
+    add_query_arguments(lexical, 2000, noise=False)
+    lexical.set_defaults(func=bench_lexical)
+
+    async_parser = subparsers.add_parser("async", help="Throughput of sequential sync vs. concurrent AsyncQdrantClient searches")
+    add_qdrant_arguments(async_parser, url=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    add_query_arguments(async_parser, 2000)
+    async_parser.add_argument("--concurrency", type=int, default=200)
+    async_parser.add_argument("--grpc", action="store_true")
+    async_parser.set_defaults(func=bench_async)
+
+    quantization = subparsers.add_parser("quantization", help="recall@k and latency of quantized scans with rescoring vs. float")
+    quantization.add_argument("--modes", nargs="+", choices=["int8", "binary"], default=["int8", "binary"])
+    quantization.add_argument("--oversampling", type=float, nargs="+", default=[2, 4, 8])
+    add_candidate_scan_arguments(quantization)
+    quantization.set_defaults(func=bench_quantization)
+
+    matryoshka = subparsers.add_parser("matryoshka", help="recall@k and latency of a 32/64-dim scan reranked with 128 dims")
+    matryoshka.add_argument("--dims", type=int, nargs="+", default=[32, 64])
+    matryoshka.add_argument("--funnel", type=int, nargs="+", default=[20, 50, 100, 200])
+    add_candidate_scan_arguments(matryoshka)
+    matryoshka.set_defaults(func=bench_matryoshka)
+
+    eval_parser = subparsers.add_parser("eval", help="recall@k, MRR and nDCG per law and p50/p95/p99 latency on the qnc pairs")
+    eval_parser.add_argument("--systems", nargs="+", default=["numpy", "hybrid", "lexical", "law-index"],
+                             choices=["numpy", "hybrid", "qdrant", "lexical", "law-index"])
+    eval_parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    add_query_arguments(eval_parser, 2000, queries_help="0 = every question")
+    add_qdrant_arguments(eval_parser, url=":memory:")
+    add_model_arguments(eval_parser)
+    eval_parser.add_argument("--synthetic", action="store_true", help="Perturbed corpus vectors instead of encoded qnc questions")
+    eval_parser.add_argument("--output", help="Write the results as JSON, to diff between releases")
+    eval_parser.set_defaults(func=bench_eval)
+
+    run_benchmarks(parser)
+
+if __name__ == "__main__":
+    main()
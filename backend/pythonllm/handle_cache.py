@@ -0,0 +1,91 @@
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+
+def normalize_query(text: str) -> str:
+    """Cache key of a query: NFC unicode, trimmed, whitespace collapsed"""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+class EmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of query embeddings (one vector per embedding model).
+
+    An optional SQLite file acts as a second tier: entries evicted from memory, or computed by
+    another worker process, are still found on disk and promoted back into the LRU. Disk rows are
+    keyed by `model_id` too (e.g. model fingerprints and truncate_dim), so vectors of a retrained
+    or differently truncated model are never served.
+    """
+
+    def __init__(self, maxsize: int = 1024, disk_path: Optional[str] = None, model_id: str = ""):
+        self.maxsize = maxsize
+        self.model_id = model_id
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            # Rows of the former table have no model identity and cannot be trusted
+            self._db.execute("DROP TABLE IF EXISTS embeddings")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(model TEXT, key TEXT, dim INTEGER, vectors BLOB, PRIMARY KEY (model, key))"
+            )
+            self._db.commit()
+
+    def get(self, query: str) -> Optional[Tuple[np.ndarray, ...]]:
+        key = normalize_query(query)
+        with self._lock:
+            vectors = self._entries.get(key)
+            if vectors is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vectors
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT dim, vectors FROM query_embeddings WHERE model = ? AND key = ?", (self.model_id, key)
+                ).fetchone()
+                if row is not None:
+                    dim, blob = row
+                    vectors = tuple(np.frombuffer(blob, dtype=np.float32).reshape(-1, dim))
+                    self._put_memory(key, vectors)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vectors
+            self.misses += 1
+            return None
+
+    def put(self, query: str, vectors: Tuple[np.ndarray, ...]) -> None:
+        key = normalize_query(query)
+        vectors = tuple(np.asarray(vector, dtype=np.float32) for vector in vectors)
+        with self._lock:
+            self._put_memory(key, vectors)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, key, dim, vectors) VALUES (?, ?, ?, ?)",
+                    (self.model_id, key, vectors[0].shape[-1], np.stack(vectors).tobytes()),
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, vectors: Tuple[np.ndarray, ...]) -> None:
+        self._entries[key] = vectors
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
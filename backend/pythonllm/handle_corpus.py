@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+import uuid
+from typing import Iterable, List, Optional, Tuple, Any
+import numpy as np
+import torch
+# Get the absolute path of the project root directory
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CORPUS_EMBEDDINGS_PATH_1 = os.path.join(BACKEND_ROOT, "embedding/corpus_embeddings_v1.pt")
+CORPUS_EMBEDDINGS_PATH_2 = os.path.join(BACKEND_ROOT, "embedding/corpus_embeddings_v2.pt")
+# Raw float32 copies of the .pt files (see export_corpus_embeddings), opened memory-mapped
+CORPUS_EMBEDDINGS_NPY_PATH_1 = os.path.join(BACKEND_ROOT, "embedding/corpus_embeddings_v1.npy")
+CORPUS_EMBEDDINGS_NPY_PATH_2 = os.path.join(BACKEND_ROOT, "embedding/corpus_embeddings_v2.npy")
+CORPUS_MANIFEST_PATH = os.path.join(BACKEND_ROOT, "embedding/corpus_manifest.json")
+DOCS_PATH = os.path.join(BACKEND_ROOT, "data/all_docs.json")
+METAS_PATH = os.path.join(BACKEND_ROOT, "data/all_doc_metas.json")
+# Namespace of the Qdrant point ids, which are uuid5 of the corpus ids
+POINT_ID_NAMESPACE = uuid.UUID("3b0c5f8e-6d1a-4e8b-9c2f-7a41d5e0b963")
+
+def load_corpus_embeddings(mmap: bool = False) -> Tuple[Any, Any]:
+    """
+    Load corpus embeddings of both models.
+
+    The exported .npy files are preferred: they are opened read-only memory-mapped, so nothing is
+    deserialized and every process shares the same pages. They are only used while their manifest
+    matches the corpus (see load_exported_embeddings); otherwise the .pt files are unpickled, with
+    `mmap` their tensors are paged in from disk on access.
+    """
+    all_docs, all_doc_metas = load_corpus_documents()
+    try:
+        return load_exported_embeddings(all_docs, all_doc_metas)
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        print(f"Not using the exported embeddings: {e}")
+    corpus_embeddings_1 = torch.load(CORPUS_EMBEDDINGS_PATH_1, weights_only=False, mmap=mmap)
+    corpus_embeddings_2 = torch.load(CORPUS_EMBEDDINGS_PATH_2, weights_only=False, mmap=mmap)
+    for path, corpus_embeddings in ((CORPUS_EMBEDDINGS_PATH_1, corpus_embeddings_1), (CORPUS_EMBEDDINGS_PATH_2, corpus_embeddings_2)):
+        if len(corpus_embeddings) != len(all_docs):
+            raise ValueError(f"{path} has {len(corpus_embeddings)} rows but the corpus has {len(all_docs)} chunks")
+    return corpus_embeddings_1, corpus_embeddings_2
+
+def load_exported_embeddings(
+    all_docs: List[str],
+    all_doc_metas: List[dict],
+    npy_paths: Tuple[str, str] = (CORPUS_EMBEDDINGS_NPY_PATH_1, CORPUS_EMBEDDINGS_NPY_PATH_2),
+    manifest_path: str = CORPUS_MANIFEST_PATH
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Open the exported .npy embeddings memory-mapped, checked against their id manifest: row i must
+    still be the chunk (all_docs[i], all_doc_metas[i]). Raises FileNotFoundError when not exported,
+    ValueError when the files were exported from another corpus or do not match the manifest.
+    """
+    if not all(os.path.exists(path) for path in (*npy_paths, manifest_path)):
+        raise FileNotFoundError(f"No exported embeddings at {', '.join(npy_paths)}")
+    manifest = load_corpus_manifest(manifest_path)
+    if [file["path"] for file in manifest["files"]] != [os.path.basename(path) for path in npy_paths]:
+        raise ValueError(f"{manifest_path} describes {[file['path'] for file in manifest['files']]}, not {list(npy_paths)}")
+    matrices = tuple(np.load(path, mmap_mode="r") for path in npy_paths)
+    for path, matrix, file in zip(npy_paths, matrices, manifest["files"]):
+        if matrix.shape != (manifest["count"], file["dim"]):
+            raise ValueError(f"{path} has shape {matrix.shape}, its manifest says ({manifest['count']}, {file['dim']})")
+    if (
+        manifest["count"] != len(all_docs)
+        or manifest["corpus_ids"] != chunk_corpus_ids(all_doc_metas)
+        or manifest["content_hashes"] != [content_hash(doc, meta) for doc, meta in zip(all_docs, all_doc_metas)]
+    ):
+        raise ValueError(
+            f"{manifest_path} was exported from another corpus, "
+            "re-export with `python reindex.py export-embeddings` or `python reindex.py embed`"
+        )
+    return matrices
+
+def load_corpus_manifest(path: str = CORPUS_MANIFEST_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def export_corpus_embeddings() -> dict:
+    """
+    Export the .pt embeddings to raw .npy files plus an id manifest.
+
+    Rows are L2-normalized float32 (cosine search needs no further copy), and row i is the chunk at
+    corpus position i. The manifest records, per row, the corpus id and content hash of the chunk it
+    was computed from, so consumers can check the vectors still line up with the documents.
+    """
+    all_docs, all_doc_metas = load_corpus_documents()
+    paths = [(CORPUS_EMBEDDINGS_PATH_1, CORPUS_EMBEDDINGS_NPY_PATH_1), (CORPUS_EMBEDDINGS_PATH_2, CORPUS_EMBEDDINGS_NPY_PATH_2)]
+    dims = []
+    for pt_path, npy_path in paths:
+        matrix = np.asarray(torch.load(pt_path, weights_only=False), dtype=np.float32)
+        if len(matrix) != len(all_docs):
+            raise ValueError(f"{pt_path} has {len(matrix)} rows but the corpus has {len(all_docs)} chunks")
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        np.save(npy_path, np.ascontiguousarray(matrix / norms))
+        dims.append(matrix.shape[1])
+
+    files = [
+        {"path": os.path.basename(npy_path), "source": os.path.basename(pt_path), "dim": dim}
+        for (pt_path, npy_path), dim in zip(paths, dims)
+    ]
+    return write_corpus_manifest(all_docs, all_doc_metas, files)
+
+def write_corpus_manifest(
+    all_docs: List[str],
+    all_doc_metas: List[dict],
+    files: List[dict],
+    corpus_ids: Optional[List[str]] = None,
+    path: str = CORPUS_MANIFEST_PATH,
+    **extra
+) -> dict:
+    """Manifest of normalized float32 embedding files whose row i is the chunk (all_docs[i], all_doc_metas[i])"""
+    manifest = {
+        "dtype": "float32",
+        "normalized": True,
+        "count": len(all_docs),
+        "files": files,
+        **extra,
+        "corpus_ids": corpus_ids or chunk_corpus_ids(all_doc_metas),
+        "content_hashes": [content_hash(doc, meta) for doc, meta in zip(all_docs, all_doc_metas)],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    return manifest
+
+def load_corpus_documents() -> Tuple[List[str], List[dict]]:
+    """Load chunk texts and their metadata"""
+    with open(DOCS_PATH, "r", encoding="utf-8") as f:
+        all_docs = json.load(f)
+    with open(METAS_PATH, "r", encoding="utf-8") as f:
+        all_doc_metas = json.load(f)
+    return all_docs, all_doc_metas
+
+def corpus_hash() -> str:
+    """Content hash of the corpus files, used to detect stale derived artifacts"""
+    sha = hashlib.sha1()
+    for path in (DOCS_PATH, METAS_PATH):
+        with open(path, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+def content_hash(doc: str, meta: dict) -> str:
+    """Hash of a chunk's text and metadata, stored in its payload to detect changed chunks"""
+    return hashlib.sha1(json.dumps([doc, meta], ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+def chunk_corpus_ids(metas: Iterable[dict]) -> List[str]:
+    """
+    Stable corpus ids of article chunks, `<law_name>:<article>` (`~2`, `~3`, ... for an article seen
+    again, as in consolidated texts), the same as dataset/preprocess.py --export-chunks. Unlike corpus
+    positions they do not move when chunks are inserted or removed elsewhere in the corpus.
+    """
+    seen = {}
+    corpus_ids = []
+    for meta in metas:
+        key = f"{meta['law_name']}:{meta['article']}"
+        seen[key] = seen.get(key, 0) + 1
+        corpus_ids.append(key if seen[key] == 1 else f"{key}~{seen[key]}")
+    return corpus_ids
+
+def point_id(corpus_id: str) -> str:
+    """Qdrant point id of a chunk: a UUID derived from its corpus id"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, corpus_id))
+
+def build_payload(corpus_id: str, doc: str, meta: dict, with_text: bool = True) -> dict:
+    """
+    Payload of a corpus point, shared by every vector backend. Qdrant points are stored without
+    `chunk_text` (`with_text=False`): texts are served by the DocStore, Qdrant only returns ids.
+    """
+    payload = {"corpus_id": corpus_id, "content_hash": content_hash(doc, meta), **meta}
+    return {"chunk_text": doc, **payload} if with_text else payload
@@ -0,0 +1,139 @@
+import os
+import csv
+import json
+import hashlib
+import re
+from functools import lru_cache
+from typing import List, Optional
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Not handle_corpus.BACKEND_ROOT: dataset/preprocess.py imports this module and should not load torch
+DATASET_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../dataset/processed_data"))
+PARQUET_DIR = os.path.join(DATASET_DIR, "parquet")
+PARQUET_MANIFEST_PATH = os.path.join(PARQUET_DIR, "manifest.json")
+
+# Tiền tố file trong dataset/processed_data -> law_name trong metadata của corpus backend
+QNC_LAW_NAMES = {
+    "dan-su": "BỘ LUẬT DÂN SỰ",
+    "hien-phap": "HIẾN PHÁP NƯỚC CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM",
+    "hinh-su": "BỘ LUẬT HÌNH SỰ",
+    "lao-dong": "BỘ LUẬT LAO ĐỘNG",
+    "luat-an-toan-ve-sinh-lao-dong": "LUẬT AN TOÀN, VỆ SINH LAO ĐỘNG",
+    "luat-bao-hiem-xa-hoi": "LUẬT BẢO HIỂM XÃ HỘI",
+    "luat-bao-ve-quyen-loi-nguoi-tieu-dung": "LUẬT BẢO VỆ QUYỀN LỢI NGƯỜI TIÊU DÙNG",
+    "luat-cong-doan": "LUẬT CÔNG ĐOÀN",
+    "luat-hon-nhan-va-gia-dinh": "LUẬT HÔN NHÂN VÀ GIA ĐÌNH",
+    "luat-viec-lam": "LUẬT VIỆC LÀM",
+}
+ARTICLE_HEADING = re.compile(r"\s*Điều\s+(\d+)")
+
+# Ids repeat across the qnc pairs and the law name within a file, so they are dictionary-encoded
+LAW = pa.field("law", pa.dictionary(pa.int32(), pa.string()), nullable=False)
+CORPUS_ID = pa.field("corpus_id", pa.dictionary(pa.int32(), pa.string()), nullable=False)
+QUESTION_ID = pa.field("question_id", pa.dictionary(pa.int32(), pa.string()), nullable=False)
+DATASET_SCHEMAS = {
+    # article: the last "Điều N" heading at or before the entry (summaries follow the article they summarize)
+    "corpus": pa.schema([LAW, CORPUS_ID, pa.field("article", pa.int32()), pa.field("content", pa.string(), nullable=False)]),
+    "questions": pa.schema([LAW, QUESTION_ID, pa.field("question", pa.string(), nullable=False)]),
+    "qnc": pa.schema([LAW, QUESTION_ID, CORPUS_ID]),
+}
+
+def csv_path(prefix: str, table: str) -> str:
+    return os.path.join(DATASET_DIR, f"{prefix}-{table}.csv")
+
+def dataset_hash() -> str:
+    """Content hash of the source CSVs, stored in the Parquet manifest to detect a stale export"""
+    sha = hashlib.sha1()
+    for prefix in QNC_LAW_NAMES:
+        for table in DATASET_SCHEMAS:
+            with open(csv_path(prefix, table), "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+def read_csv_table(prefix: str, table: str) -> pa.Table:
+    law_name = QNC_LAW_NAMES[prefix]
+    with open(csv_path(prefix, table), "r", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    columns = {"law": [law_name] * len(rows)}
+    if table == "corpus":
+        articles = []
+        article = None
+        for row in rows:
+            match = ARTICLE_HEADING.match(row["content"])
+            if match:
+                article = int(match.group(1))
+            articles.append(article)
+        columns.update(corpus_id=[row["corpus_id"] for row in rows], article=articles, content=[row["content"] for row in rows])
+    elif table == "questions":
+        columns.update(question_id=[row["question_id"] for row in rows], question=[row["question"] for row in rows])
+    else:
+        columns.update(question_id=[row["question_id"] for row in rows], corpus_id=[row["corpus_id"] for row in rows])
+    return pa.Table.from_pydict(columns, schema=DATASET_SCHEMAS[table])
+
+def export_parquet_datasets(output_dir: str = PARQUET_DIR) -> dict:
+    """
+    Convert the *-corpus/questions/qnc.csv files to Parquet: `<output_dir>/<table>/<prefix>.parquet`
+    (one file per law) plus a manifest of files, row counts and the source hash.
+    """
+    manifest = {"source_hash": dataset_hash(), "laws": {}}
+    for prefix, law_name in QNC_LAW_NAMES.items():
+        entry = {"law_name": law_name, "files": {}, "rows": {}}
+        for table in DATASET_SCHEMAS:
+            path = os.path.join(output_dir, table, f"{prefix}.parquet")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = read_csv_table(prefix, table)
+            pq.write_table(data, path, compression="zstd", row_group_size=16384)
+            entry["files"][table] = os.path.relpath(path, output_dir)
+            entry["rows"][table] = data.num_rows
+        manifest["laws"][prefix] = entry
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+def parquet_export_is_stale(path: str = PARQUET_MANIFEST_PATH) -> bool:
+    """Whether the Parquet export is missing or was made from other CSVs (reads every CSV)"""
+    if not os.path.exists(path):
+        return True
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("source_hash") != dataset_hash()
+
+def export_parquet_datasets_if_stale(output_dir: str = PARQUET_DIR, force: bool = False) -> Optional[dict]:
+    """Export the datasets unless the manifest in `output_dir` matches the CSVs; returns the new manifest, if any"""
+    if not force and not parquet_export_is_stale(os.path.join(output_dir, "manifest.json")):
+        return None
+    return export_parquet_datasets(output_dir)
+
+@lru_cache(maxsize=None)
+def load_parquet_manifest(path: str = PARQUET_MANIFEST_PATH) -> dict:
+    """
+    Load the Parquet manifest. Readers never hash the CSVs nor export: the export is refreshed by
+    dataset/preprocess.py after the CSVs change, or by `python reindex.py export-datasets`.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No Parquet datasets at {os.path.dirname(path)}, export them with `python reindex.py export-datasets`")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_dataset(
+    table: str,
+    columns: Optional[List[str]] = None,
+    laws: Optional[List[str]] = None,
+    filter: Optional[ds.Expression] = None
+) -> pa.Table:
+    """
+    Read one dataset table ("corpus", "questions" or "qnc").
+
+    Only the requested `columns` are decoded. `laws` (law_name values) selects whole files through
+    the manifest, and `filter` (e.g. `ds.field("article") == 5`) is pushed down to the row-group
+    statistics, so unrelated laws and row groups are never read.
+    """
+    manifest = load_parquet_manifest()
+    root = os.path.dirname(PARQUET_MANIFEST_PATH)
+    paths = [
+        os.path.join(root, entry["files"][table])
+        for entry in manifest["laws"].values()
+        if not laws or entry["law_name"] in laws
+    ]
+    return ds.dataset(paths, schema=DATASET_SCHEMAS[table], format="parquet").to_table(columns=columns, filter=filter)
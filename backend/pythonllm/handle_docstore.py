@@ -0,0 +1,133 @@
+import os
+import json
+import mmap
+from typing import Iterator, List, Optional
+import numpy as np
+from handle_corpus import BACKEND_ROOT, load_corpus_documents, corpus_hash, content_hash, chunk_corpus_ids, point_id
+
+DOC_STORE_PATH = os.path.join(BACKEND_ROOT, "data/doc_store.bin")
+# Parts stored per chunk in the blob, in order; a store written with other parts is rebuilt
+DOC_STORE_FIELDS = ["text", "meta", "corpus_id", "content_hash"]
+# Point ids (see handle_corpus.point_id) sorted, with the corpus position of each
+POINT_ID_DTYPE = np.dtype([("point_id", "S36"), ("position", "<i8")])
+
+class DocStore:
+    """
+    Read-only, memory-mapped store of chunk texts and metadata.
+
+    `<path>` holds every chunk as its UTF-8 text, its compact JSON metadata, its corpus id and its
+    content hash (computed once at build time); `<path>.offsets.npy` holds the 4N+1 byte offsets
+    between them, and `<path>.ids.npy` the sorted point ids with their corpus positions. All are
+    mapped read-only, so worker processes share the same page-cache pages: a lookup by corpus
+    position is a few slices of the blob, one by point id a binary search first.
+    """
+
+    def __init__(self, path: str = DOC_STORE_PATH):
+        self.path = path
+        # Plain ndarray view of the mapping: indexing a np.memmap subclass is ~3x slower
+        self.offsets = np.asarray(np.load(offsets_path(path), mmap_mode="r"))
+        with open(path, "rb") as f:
+            # mmap of an empty file is not allowed
+            self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        self.point_ids = np.asarray(np.load(ids_path(path), mmap_mode="r"))
+        with open(header_path(path), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.source_hash = header["source_hash"]
+        self.fields = header.get("fields")
+
+    def __len__(self) -> int:
+        return (len(self.offsets) - 1) // len(DOC_STORE_FIELDS)
+
+    def _part(self, idx: int, field: int) -> bytes:
+        start = len(DOC_STORE_FIELDS) * idx + field
+        return self.blob[int(self.offsets[start]):int(self.offsets[start + 1])]
+
+    def text(self, idx: int) -> str:
+        return self._part(idx, 0).decode("utf-8")
+
+    def meta(self, idx: int) -> dict:
+        return json.loads(self._part(idx, 1))
+
+    def corpus_id(self, idx: int) -> str:
+        return self._part(idx, 2).decode("utf-8")
+
+    def content_hash(self, idx: int) -> str:
+        return self._part(idx, 3).decode("ascii")
+
+    def point_id(self, idx: int) -> str:
+        return point_id(self.corpus_id(idx))
+
+    def position(self, point_id: str) -> int:
+        """Corpus position of a point id (as returned by Qdrant or NumpySearchClient)"""
+        key = str(point_id).encode("ascii")
+        i = int(np.searchsorted(self.point_ids["point_id"], key))
+        if i == len(self.point_ids) or self.point_ids["point_id"][i] != key:
+            raise KeyError(point_id)
+        return int(self.point_ids["position"][i])
+
+    def metas(self) -> Iterator[dict]:
+        for idx in range(len(self)):
+            yield self.meta(idx)
+
+    def __getitem__(self, idx: int) -> dict:
+        return self.payload(idx)
+
+    def __iter__(self) -> Iterator[dict]:
+        for idx in range(len(self)):
+            yield self.payload(idx)
+
+    def payload(self, idx: int) -> dict:
+        """Same payload as build_payload; the chunk text is never stored in or returned by Qdrant"""
+        return {"chunk_text": self.text(idx), "corpus_id": self.corpus_id(idx), "content_hash": self.content_hash(idx), **self.meta(idx)}
+
+    @staticmethod
+    def build(docs: List[str], metas: List[dict], path: str = DOC_STORE_PATH, source_hash: str = "", corpus_ids: Optional[List[str]] = None) -> None:
+        # Written to temporary files and renamed, so concurrently starting workers never read a partial store
+        corpus_ids = corpus_ids or chunk_corpus_ids(metas)
+        offsets = [0]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            for doc, meta, corpus_id in zip(docs, metas, corpus_ids):
+                for part in (
+                    doc.encode("utf-8"),
+                    json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+                    corpus_id.encode("utf-8"),
+                    content_hash(doc, meta).encode("ascii"),
+                ):
+                    f.write(part)
+                    offsets.append(offsets[-1] + len(part))
+        tmp_offsets = f"{path}.{os.getpid()}.offsets.tmp.npy"
+        np.save(tmp_offsets, np.asarray(offsets, dtype=np.int64))
+        point_ids = np.empty(len(corpus_ids), dtype=POINT_ID_DTYPE)
+        point_ids["point_id"] = [point_id(corpus_id) for corpus_id in corpus_ids]
+        point_ids["position"] = np.arange(len(corpus_ids))
+        tmp_ids = f"{path}.{os.getpid()}.ids.tmp.npy"
+        np.save(tmp_ids, np.sort(point_ids, order="point_id"))
+        tmp_header = f"{path}.{os.getpid()}.header.tmp"
+        with open(tmp_header, "w", encoding="utf-8") as f:
+            json.dump({"count": len(docs), "source_hash": source_hash, "fields": DOC_STORE_FIELDS}, f)
+        os.replace(tmp_path, path)
+        os.replace(tmp_offsets, offsets_path(path))
+        os.replace(tmp_ids, ids_path(path))
+        os.replace(tmp_header, header_path(path))
+
+def offsets_path(path: str) -> str:
+    return f"{path}.offsets.npy"
+
+def ids_path(path: str) -> str:
+    return f"{path}.ids.npy"
+
+def header_path(path: str) -> str:
+    return f"{path}.json"
+
+def load_doc_store(path: str = DOC_STORE_PATH) -> DocStore:
+    """Open the document store, (re)building it from the corpus JSON files when missing or stale"""
+    source_hash = corpus_hash()
+    if all(os.path.exists(p) for p in (path, offsets_path(path), ids_path(path), header_path(path))):
+        doc_store = DocStore(path)
+        if doc_store.source_hash == source_hash and doc_store.fields == DOC_STORE_FIELDS:
+            return doc_store
+    all_docs, all_doc_metas = load_corpus_documents()
+    DocStore.build(all_docs, all_doc_metas, path, source_hash)
+    print(f"Built document store: {path}")
+    return DocStore(path)
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+import torch
+from tqdm import tqdm
+from handle_corpus import BACKEND_ROOT, write_corpus_manifest
+
+EMBEDDING_MODEL_PATH_1 = os.path.join(BACKEND_ROOT, "embedding/output_v1")
+EMBEDDING_MODEL_PATH_2 = os.path.join(BACKEND_ROOT, "embedding/output_v2")
+EMBEDDING_BUILD_DIR = os.path.join(BACKEND_ROOT, "embedding/.build")
+EMBEDDING_DIM = 128
+# Rows normalized per step when finalizing, so the output never has to fit in memory at once
+NORMALIZE_BLOCK_ROWS = 65536
+
+# Model of the current worker process, loaded once by the pool initializer
+_worker_model = None
+
+def _init_worker(model_path: str, dim: int, num_threads: int) -> None:
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(num_threads)
+    _worker_model = SentenceTransformer(model_path, truncate_dim=dim, device="cpu")
+
+def _encode_batch(texts: List[str], rows: List[int], partial_path: str, batch_size: int) -> int:
+    """Encode one batch and write its rows straight into the shared memory-mapped output"""
+    vectors = _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    output = np.load(partial_path, mmap_mode="r+")
+    output[rows] = vectors
+    output.flush()
+    return len(rows)
+
+def iter_chunk_records(path: str) -> Iterator[dict]:
+    """Chunks exported as JSONL by `dataset/preprocess.py --export-chunks` ("-" reads stdin)"""
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def model_fingerprint(model_path: str) -> str:
+    """Hash of the model directory listing (relative path, size, mtime): changes whenever the model is retrained"""
+    sha = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(model_path)):
+        for file in sorted(files):
+            stat = os.stat(os.path.join(root, file))
+            sha.update(f"{os.path.relpath(os.path.join(root, file), model_path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return sha.hexdigest()
+
+def length_sorted_batches(docs: List[str], batch_size: int) -> List[List[int]]:
+    """Row indices grouped into batches of similar length, longest first (less padding, better load balancing)"""
+    order = sorted(range(len(docs)), key=lambda i: len(docs[i]), reverse=True)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+def normalize_rows(path: str) -> None:
+    matrix = np.load(path, mmap_mode="r+")
+    for start in range(0, len(matrix), NORMALIZE_BLOCK_ROWS):
+        block = matrix[start:start + NORMALIZE_BLOCK_ROWS]
+        norms = np.linalg.norm(block, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        block /= norms
+    matrix.flush()
+
+def build_corpus_embeddings(
+    docs: List[str],
+    metas: List[dict],
+    output_paths: Tuple[str, ...],
+    manifest_path: str,
+    model_paths: Tuple[str, ...] = (EMBEDDING_MODEL_PATH_1, EMBEDDING_MODEL_PATH_2),
+    corpus_ids: Optional[List[str]] = None,
+    dim: int = EMBEDDING_DIM,
+    batch_size: int = 256,
+    workers: Optional[int] = None,
+    build_dir: str = EMBEDDING_BUILD_DIR,
+) -> dict:
+    """
+    Encode the corpus with every model into memory-mappable .npy files plus a manifest.
+
+    Chunks are encoded in length-sorted batches by a process pool (one model copy per worker, the
+    cores split between them); each finished batch is written into a `<name>.partial.npy` memmap
+    and recorded in `build_dir/state.json`. An interrupted build resumes from the finished batches
+    as long as the texts, models, dim and batch size are unchanged. Rows are L2-normalized, and the
+    outputs are moved into place only once every model is complete.
+    """
+    workers = workers or min(4, os.cpu_count() or 1)
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    batches = length_sorted_batches(docs, batch_size)
+
+    sha = hashlib.sha1(json.dumps([dim, batch_size, [model_fingerprint(path) for path in model_paths]]).encode("utf-8"))
+    for doc in docs:
+        sha.update(doc.encode("utf-8"))
+        sha.update(b"\0")
+    build_key = sha.hexdigest()
+
+    os.makedirs(build_dir, exist_ok=True)
+    state_path = os.path.join(build_dir, "state.json")
+    state = None
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state["key"] != build_key:
+            print("Corpus or models changed since the interrupted build, starting over")
+            state = None
+    if state is None:
+        state = {"key": build_key, "done": [[] for _ in model_paths]}
+
+    def save_state():
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    save_state()
+    partial_paths = [os.path.join(build_dir, f"{os.path.splitext(os.path.basename(path))[0]}.partial.npy") for path in output_paths]
+    for m, (model_path, partial_path) in enumerate(zip(model_paths, partial_paths)):
+        done = set(state["done"][m])
+        if not done or not os.path.exists(partial_path):
+            done = set()
+            np.lib.format.open_memmap(partial_path, mode="w+", dtype=np.float32, shape=(len(docs), dim)).flush()
+        todo = [b for b in range(len(batches)) if b not in done]
+        if not todo:
+            continue
+
+        print(f"Encoding {len(docs)} chunks with {model_path}: {len(todo)}/{len(batches)} batches left, {workers} workers x {num_threads} threads")
+        # spawn: forked workers would inherit the parent's torch thread pool state
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(model_path, dim, num_threads)) as executor, \
+                tqdm(total=len(docs), initial=sum(len(batches[b]) for b in done), unit="chunks") as progress:
+            futures = {
+                executor.submit(_encode_batch, [docs[i] for i in batches[b]], batches[b], partial_path, batch_size): b
+                for b in todo
+            }
+            for future in as_completed(futures):
+                progress.update(future.result())
+                done.add(futures[future])
+                state["done"][m] = sorted(done)
+                save_state()
+
+    for partial_path, output_path in zip(partial_paths, output_paths):
+        normalize_rows(partial_path)
+        os.replace(partial_path, output_path)
+    manifest = write_corpus_manifest(
+        docs,
+        metas,
+        files=[
+            {"path": os.path.basename(output_path), "model": os.path.relpath(model_path, BACKEND_ROOT), "dim": dim}
+            for model_path, output_path in zip(model_paths, output_paths)
+        ],
+        corpus_ids=corpus_ids,
+        path=manifest_path,
+        models=[model_fingerprint(path) for path in model_paths],
+    )
+    os.remove(state_path)
+    return manifest
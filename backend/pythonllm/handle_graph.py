@@ -1,20 +1,39 @@
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Tuple
 from qdrant_client.models import Distance
+import torch
 from sentence_transformers import SentenceTransformer
 from typing_extensions import TypedDict
 from langgraph.graph import START, END, StateGraph
 from pprint import pprint
 
-from handle_qdrant import get_qdrant_client, initialize_qdrant_collection
-from handle_retriever import FusionRetriever, LawIndexRetriever
+from handle_qdrant import get_qdrant_client, get_async_qdrant_client
+from handle_retriever import FusionRetriever, LawIndexRetriever, get_law_family, get_law_fan_out
+from handle_vector_search import get_numpy_search_client
+from handle_cache import EmbeddingCache
+from handle_embeddings import model_fingerprint
+from handle_lexical import load_lexical_index
+from handle_docstore import load_doc_store
+from handle_ratelimit import KeyScheduler
+from handle_router import LatencyRouter
 from handle_llm import get_legal_question_classifier, get_retrieval_grader, get_question_rewriter, get_rag_chain, get_hallucination_grader, get_answer_grader, get_summary_history
 
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
+# "qdrant" or "numpy" (in-process search over the corpus embeddings, no Qdrant round-trip)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "100"))  # keep-alive connections of the async client
+# numpy backend only: per-lane "none" | "int8" | "binary" | "matryoshka-32" | "matryoshka-64" candidate scan,
+# rescored exactly on the float vectors (limit * oversampling candidates, or a fixed funnel size when set)
+VECTOR_QUANTIZATION_1 = os.getenv("VECTOR_QUANTIZATION_1", "none")
+VECTOR_QUANTIZATION_2 = os.getenv("VECTOR_QUANTIZATION_2", "none")
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", "4"))
+QUANTIZATION_FUNNEL_SIZE = int(os.getenv("QUANTIZATION_FUNNEL_SIZE", "0")) or None
 
 VLLM_BASE_URL_1 = os.getenv("VLLM_BASE_URL_1")
 VLLM_MODEL_NAME_1 = "AITeamVN/GRPO-VI-Qwen2-7B-RAG"
@@ -29,9 +48,23 @@ GOOGLE_API_KEY_3 = os.getenv("GOOGLE_API_KEY_3")
 GOOGLE_API_KEY_4 = os.getenv("GOOGLE_API_KEY_4")
 GOOGLE_API_KEY_5 = os.getenv("GOOGLE_API_KEY_5")
 GOOGLE_API_KEY_6 = os.getenv("GOOGLE_API_KEY_6")
-# LIST_GOOGLE_API_KEY = [GOOGLE_API_KEY_1, GOOGLE_API_KEY_2, GOOGLE_API_KEY_3, GOOGLE_API_KEY_4, GOOGLE_API_KEY_5, GOOGLE_API_KEY_6]
-LIST_GOOGLE_API_KEY = [GOOGLE_API_KEY]
+# Every configured key (duplicates removed); requests are spread over them by the key scheduler
+LIST_GOOGLE_API_KEY = list(dict.fromkeys(
+    key for key in [GOOGLE_API_KEY, GOOGLE_API_KEY_1, GOOGLE_API_KEY_2, GOOGLE_API_KEY_3, GOOGLE_API_KEY_4, GOOGLE_API_KEY_5, GOOGLE_API_KEY_6] if key
+))
 GEMINI_MODEL_NAME = "gemini-2.0-flash"
+# Per-key quota of GEMINI_MODEL_NAME (defaults: free tier); a 429 cools the key down for GEMINI_COOLDOWN seconds
+# unless the server says otherwise, and calls waiting longer than GEMINI_MAX_WAIT go to the vLLM fallback
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_COOLDOWN = float(os.getenv("GEMINI_COOLDOWN", "60"))
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", "30"))
+# With VLLM_BASE_URL_1 set, each call goes to the backend (gemini/vllm) with the lowest latency and error rate,
+# and is duplicated to the other one when it is slower than this percentile of its recent latencies (0 = no hedging)
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "95")) or None
+LLM_ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", "32"))
+# Hedge deadline (seconds) for a chain until its backends have enough measured latencies; 0 disables
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "10")) or None
 
 # Get the absolute path of the project root directory
 # PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
@@ -45,67 +78,126 @@ VECTOR_NAME_2 = "vn-law-embedding_2"
 VECTOR_SIZE = 128
 VECTOR_DISTANCE = Distance.COSINE
 MAX_RETRIES_COUNT = 3
-
-# qdrant
-client = get_qdrant_client(QDRANT_URL, QDRANT_API_KEY)
-initialize_qdrant_collection(client, QDRANT_COLLECTION_NAME, VECTOR_NAME_1, VECTOR_NAME_2, VECTOR_SIZE, VECTOR_DISTANCE)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # optional SQLite file shared by workers
+# Encode with both models concurrently; each model gets half of the cores so they don't oversubscribe
+ENCODE_CONCURRENTLY = os.getenv("ENCODE_CONCURRENTLY", "true").lower() == "true"
+# BM25 lane over chunk text + metadata keywords, fused with both dense lanes by RRF
+LEXICAL_LANE = os.getenv("LEXICAL_LANE", "true").lower() == "true"
+CPU_COUNT = os.cpu_count() or 2
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", max(1, CPU_COUNT // 2) if ENCODE_CONCURRENTLY else CPU_COUNT))
+
+# chunk texts and metadata, memory-mapped and shared by all workers
+doc_store = load_doc_store()
+
+# vector backend
+if VECTOR_BACKEND == "numpy":
+    client = get_numpy_search_client(
+        VECTOR_NAME_1,
+        VECTOR_NAME_2,
+        doc_store,
+        quantization={VECTOR_NAME_1: VECTOR_QUANTIZATION_1, VECTOR_NAME_2: VECTOR_QUANTIZATION_2},
+        oversampling=QUANTIZATION_OVERSAMPLING,
+        funnel_size=QUANTIZATION_FUNNEL_SIZE
+    )
+    async_client = None
+else:
+    client = get_qdrant_client(QDRANT_URL, QDRANT_API_KEY, prefer_grpc=QDRANT_PREFER_GRPC)
+    async_client = get_async_qdrant_client(QDRANT_URL, QDRANT_API_KEY, prefer_grpc=QDRANT_PREFER_GRPC, pool_size=QDRANT_POOL_SIZE)
+    # QDRANT_COLLECTION_NAME is an alias onto a versioned collection. Workers only read it: building,
+    # syncing and swapping go through reindex.py (the first build runs once in the gunicorn master,
+    # see gunicorn_config.on_starting), so concurrently starting workers never race on it
+    if not client.collection_exists(QDRANT_COLLECTION_NAME):
+        raise RuntimeError(f"Qdrant collection {QDRANT_COLLECTION_NAME} does not exist, build it with `python reindex.py init`")
 
 # retriever
+torch.set_num_threads(TORCH_NUM_THREADS)
 embeddings_1 = SentenceTransformer(EMBEDDINGS_MODEL_NAME_OR_PATH_1, truncate_dim = 128)
 embeddings_2 = SentenceTransformer(EMBEDDINGS_MODEL_NAME_OR_PATH_2, truncate_dim = 128)
+# disk cache rows are only valid for these exact models and truncation
+embedding_model_id = ";".join(
+    f"{path}@{model_fingerprint(path)}:{model.truncate_dim}"
+    for path, model in ((EMBEDDINGS_MODEL_NAME_OR_PATH_1, embeddings_1), (EMBEDDINGS_MODEL_NAME_OR_PATH_2, embeddings_2))
+)
+embedding_cache = EmbeddingCache(maxsize=EMBEDDING_CACHE_SIZE, disk_path=EMBEDDING_CACHE_PATH, model_id=embedding_model_id)
+encode_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="encode") if ENCODE_CONCURRENTLY else None
+lexical_index = load_lexical_index() if LEXICAL_LANE else None
 fusion_retriever = FusionRetriever(
     client=client,
     embeddings_1=embeddings_1,
     embeddings_2=embeddings_2,
     collection_name=QDRANT_COLLECTION_NAME,
     vector_name_1=VECTOR_NAME_1,
-    vector_name_2=VECTOR_NAME_2
-)
-index_retriever = LawIndexRetriever(
-    doc_path=os.path.join(BACKEND_ROOT, "data/all_docs.json"),
-    meta_path=os.path.join(BACKEND_ROOT, "data/all_doc_metas.json")
+    vector_name_2=VECTOR_NAME_2,
+    embedding_cache=embedding_cache,
+    encode_executor=encode_executor,
+    lexical_index=lexical_index,
+    async_client=async_client,
+    doc_store=doc_store
 )
+index_retriever = LawIndexRetriever(doc_store)
 init_question = "Tội trộm cắp tài sản dưới 2 triệu đồng bị xử lý như thế nào?"
 # Retrieval
 fusion_retriever.invoke(init_question)
 index_retriever.invoke(init_question)
 
 # llm
+gemini_key_scheduler = KeyScheduler(
+    LIST_GOOGLE_API_KEY, rpm=GEMINI_RPM, tpm=GEMINI_TPM, cooldown=GEMINI_COOLDOWN, max_wait=GEMINI_MAX_WAIT
+) if LIST_GOOGLE_API_KEY else None
+llm_router = LatencyRouter(
+    ["gemini", "vllm"],
+    hedge_quantile=LLM_HEDGE_QUANTILE,
+    default_hedge_delay=LLM_HEDGE_DEFAULT_DELAY,
+    max_workers=LLM_ROUTER_WORKERS,
+)
 hallucination_grader = get_hallucination_grader(
     gemini_model_name=GEMINI_MODEL_NAME,
     vllm_model_name=VLLM_MODEL_NAME_1,
     gemini_api_keys=LIST_GOOGLE_API_KEY,
     vllm_base_url=VLLM_BASE_URL_1,
+    key_scheduler=gemini_key_scheduler,
+    router=llm_router,
 )
 answer_grader = get_answer_grader(
     gemini_model_name=GEMINI_MODEL_NAME,
     vllm_model_name=VLLM_MODEL_NAME_1,
     gemini_api_keys=LIST_GOOGLE_API_KEY,
     vllm_base_url=VLLM_BASE_URL_1,
+    key_scheduler=gemini_key_scheduler,
+    router=llm_router,
 )
 summary_history = get_summary_history(
     gemini_model_name=GEMINI_MODEL_NAME,
     vllm_model_name=VLLM_MODEL_NAME_1,
     gemini_api_keys=LIST_GOOGLE_API_KEY,
     vllm_base_url=VLLM_BASE_URL_1,
+    key_scheduler=gemini_key_scheduler,
+    router=llm_router,
 )
 legal_question_classifier = get_legal_question_classifier(
     gemini_model_name=GEMINI_MODEL_NAME,
     vllm_model_name=VLLM_MODEL_NAME_1,
     gemini_api_keys=LIST_GOOGLE_API_KEY,
     vllm_base_url=VLLM_BASE_URL_1,
+    key_scheduler=gemini_key_scheduler,
+    router=llm_router,
 )
 retrieval_grader = get_retrieval_grader(
     gemini_model_name=GEMINI_MODEL_NAME,
     vllm_model_name=VLLM_MODEL_NAME_1,
     gemini_api_keys=LIST_GOOGLE_API_KEY,
     vllm_base_url=VLLM_BASE_URL_1,
+    key_scheduler=gemini_key_scheduler,
+    router=llm_router,
 )
 question_rewriter = get_question_rewriter(
     gemini_model_name=GEMINI_MODEL_NAME,
     vllm_model_name=VLLM_MODEL_NAME_1,
     gemini_api_keys=LIST_GOOGLE_API_KEY,
     vllm_base_url=VLLM_BASE_URL_1,
+    key_scheduler=gemini_key_scheduler,
+    router=llm_router,
 )
 
 rag_chain = get_rag_chain(
@@ -113,6 +205,8 @@ rag_chain = get_rag_chain(
     vllm_model_name=VLLM_MODEL_NAME_1,
     gemini_api_keys=LIST_GOOGLE_API_KEY,
     vllm_base_url=VLLM_BASE_URL_1,
+    key_scheduler=gemini_key_scheduler,
+    router=llm_router,
 )
 
 class GraphState(TypedDict):
@@ -127,6 +221,7 @@ class GraphState(TypedDict):
         summary: list of summaries
         retry_generate_count: number of generation attempts
         need_grade_docs: boolean to check if need to grade documents
+        question_type: classification of the question (loại 1-7)
     """
     question : str
     generation : str
@@ -138,6 +233,7 @@ class GraphState(TypedDict):
     node_start: List[str]
     this_node: List[Dict]
     need_grade_docs: bool
+    question_type: str
 ### Node ###
 
 def retrieve(state):
@@ -152,10 +248,13 @@ def retrieve(state):
     """
     print("---RETRIEVE---")
     question = state["question"]
+    # Restrict to the classified law family, or fan out over all families for multi-domain questions
+    law_names = get_law_family(state.get("question_type"))
+    law_families = get_law_fan_out(state.get("question_type"))
 
     # Retrieval
     documents_1 = index_retriever.invoke(question)
-    documents_2 = fusion_retriever.invoke(question)
+    documents_2 = fusion_retriever.invoke(question, law_names=law_names, law_families=law_families)
     documents = documents_1 + documents_2
     documents = [doc.page_content for doc in documents]
     print("documents: ")
@@ -302,7 +401,7 @@ def classify_question(state):
             need_grade_docs = False
         else:
             documents = history_documents
-        return {"documents": documents, "question": question, "generation": "", "need_grade_docs": need_grade_docs}
+        return {"documents": documents, "question": question, "generation": "", "need_grade_docs": need_grade_docs, "question_type": str(classification.loai)}
 
 def update_memory(state):
     """
@@ -0,0 +1,186 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from handle_corpus import BACKEND_ROOT, load_corpus_documents, corpus_hash, chunk_corpus_ids, point_id
+from handle_vector_search import top_k
+
+LEXICAL_INDEX_PATH = os.path.join(BACKEND_ROOT, "data/lexical_index.npz")
+METADATA_FIELDS = ["keywords", "topics", "related_concepts"]
+# Longest compound word (in syllables) tried when matching a query against the vocabulary
+MAX_NGRAM = 4
+
+def segment_vietnamese(text: str) -> List[str]:
+    """Word-segment Vietnamese text with underthesea; compound words are joined by '_'"""
+    from underthesea import word_tokenize
+    return [token for token in word_tokenize(text, format="text").lower().split() if re.search(r"\w", token)]
+
+def document_tokens(doc: str, meta: dict, tokenize: Callable[[str], List[str]]) -> List[str]:
+    """Tokens of a chunk: its segmented text plus the (already segmented) metadata keywords"""
+    tokens = tokenize(doc)
+    for field in METADATA_FIELDS:
+        for phrase in meta.get(field, []):
+            tokens.extend(phrase.lower().split())
+    return tokens
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text and metadata.
+
+    Postings are stored CSR-style (term offsets, doc ids, precomputed BM25 weights), so a query
+    is a handful of vectorized scatter-adds over a dense score array. Queries are matched against
+    the vocabulary by greedy longest match on syllables instead of running the segmenter.
+    Search results are the point ids of the chunks (`ids`), or their positions without them.
+    """
+
+    def __init__(
+        self,
+        vocab: List[str],
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        weights: np.ndarray,
+        law_names: np.ndarray,
+        source_hash: str = "",
+        ids: Optional[np.ndarray] = None,
+    ):
+        self.source_hash = source_hash
+        self.ids = ids
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+        self.law_names = law_names
+        self._biases: Dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def build(
+        cls,
+        docs: List[str],
+        metas: List[dict],
+        tokenize: Optional[Callable[[str], List[str]]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        ids: Optional[List[str]] = None,
+    ) -> "LexicalIndex":
+        tokenize = tokenize or segment_vietnamese
+        term_freqs = []
+        vocab: Dict[str, int] = {}
+        for doc, meta in zip(docs, metas):
+            freqs: Dict[int, int] = {}
+            for token in document_tokens(doc, meta, tokenize):
+                term_id = vocab.setdefault(token, len(vocab))
+                freqs[term_id] = freqs.get(term_id, 0) + 1
+            term_freqs.append(freqs)
+
+        doc_lengths = np.array([sum(freqs.values()) for freqs in term_freqs], dtype=np.float32)
+        avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        num_docs = len(term_freqs)
+
+        postings_by_term: List[List[tuple]] = [[] for _ in vocab]
+        for doc_id, freqs in enumerate(term_freqs):
+            for term_id, tf in freqs.items():
+                postings_by_term[term_id].append((doc_id, tf))
+
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        postings, weights = [], []
+        for term_id, term_postings in enumerate(postings_by_term):
+            df = len(term_postings)
+            idf = np.log((num_docs - df + 0.5) / (df + 0.5) + 1.0)
+            for doc_id, tf in term_postings:
+                norm = k1 * (1 - b + b * doc_lengths[doc_id] / avg_length)
+                postings.append(doc_id)
+                weights.append(idf * tf * (k1 + 1) / (tf + norm))
+            offsets[term_id + 1] = offsets[term_id] + df
+
+        return cls(
+            vocab=list(vocab),
+            offsets=offsets,
+            postings=np.asarray(postings, dtype=np.int32),
+            weights=np.asarray(weights, dtype=np.float32),
+            law_names=np.asarray([meta["law_name"] for meta in metas]),
+            ids=np.asarray(ids) if ids is not None else None,
+        )
+
+    def save(self, path: str) -> None:
+        """Write to a temporary file and rename it, so readers never open a partial index"""
+        arrays = dict(
+            vocab=np.asarray(list(self.vocab)),
+            offsets=self.offsets,
+            postings=self.postings,
+            weights=self.weights,
+            law_names=self.law_names,
+            source_hash=np.asarray(self.source_hash),
+        )
+        if self.ids is not None:
+            arrays["ids"] = self.ids
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        data = np.load(path)
+        return cls(
+            vocab=data["vocab"].tolist(),
+            offsets=data["offsets"],
+            postings=data["postings"],
+            weights=data["weights"],
+            law_names=data["law_names"],
+            source_hash=str(data["source_hash"]),
+            ids=data["ids"] if "ids" in data else None,
+        )
+
+    def query_terms(self, query: str) -> List[int]:
+        """Greedy longest match of the query syllables against the vocabulary"""
+        syllables = re.sub(r"[^\w\s]", " ", query.lower()).split()
+        terms = []
+        i = 0
+        while i < len(syllables):
+            for n in range(min(MAX_NGRAM, len(syllables) - i), 0, -1):
+                term_id = self.vocab.get("_".join(syllables[i:i + n]))
+                if term_id is not None:
+                    terms.append(term_id)
+                    i += n
+                    break
+            else:
+                i += 1
+        return terms
+
+    def _get_bias(self, law_names: List[str]) -> np.ndarray:
+        key = tuple(law_names)
+        if key not in self._biases:
+            self._biases[key] = np.where(np.isin(self.law_names, law_names), 0.0, -np.inf).astype(np.float32)
+        return self._biases[key]
+
+    def search(self, query: str, limit: int = 20, law_names: Optional[List[str]] = None) -> list:
+        """Ids of the `limit` best BM25 matches, best first (only chunks sharing a term with the query)"""
+        scores = np.zeros(len(self.law_names), dtype=np.float32)
+        for term_id in self.query_terms(query):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.postings[start:end]] += self.weights[start:end]
+        if law_names:
+            scores += self._get_bias(law_names)
+        rows = [int(i) for i in top_k(scores, limit) if scores[i] > 0]
+        return [str(self.ids[i]) for i in rows] if self.ids is not None else rows
+
+def build_lexical_index(path: str = LEXICAL_INDEX_PATH) -> LexicalIndex:
+    """Build the lexical index of the current corpus and save it to `path` (run by `reindex.py lexical`)"""
+    all_docs, all_doc_metas = load_corpus_documents()
+    lexical_index = LexicalIndex.build(all_docs, all_doc_metas, ids=[point_id(corpus_id) for corpus_id in chunk_corpus_ids(all_doc_metas)])
+    lexical_index.source_hash = corpus_hash()
+    lexical_index.save(path)
+    return lexical_index
+
+def load_lexical_index(path: str = LEXICAL_INDEX_PATH) -> LexicalIndex:
+    """
+    Load the precomputed lexical index. Serving processes never build it (every worker would segment
+    the whole corpus and write the same file): a missing or stale index is an error, fixed by
+    `python reindex.py lexical`.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No lexical index at {path}, build it with `python reindex.py lexical`")
+    lexical_index = LexicalIndex.load(path)
+    if lexical_index.source_hash != corpus_hash() or lexical_index.ids is None:
+        raise RuntimeError(f"Lexical index {path} was built from another corpus, rebuild it with `python reindex.py lexical`")
+    return lexical_index
@@ -1,31 +1,52 @@
-from typing import Literal, List
+from functools import lru_cache
+from typing import Literal, List, Optional
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.language_models.chat_models import BaseChatModel
 from pydantic import BaseModel, Field
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import ChatOpenAI
-
-def get_llm(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", temperature: float = 0, top_p: float = 0.95, top_k: int = 10, max_output_tokens: int = 1000):
-    llm_list = []
+from handle_ratelimit import KeyScheduler, KeyPoolRunnable
+from handle_router import LatencyRouter, RouterRunnable
+
+@lru_cache(maxsize=None)
+def get_chat_client(backend: Literal["gemini", "vllm"], model_name: str, credential: str) -> BaseChatModel:
+    """
+    The chat model for one (backend, model, API key or base URL), built once per process.
+
+    Building a client sets up its transport (a gRPC/REST channel for Gemini, an httpx connection
+    pool for the OpenAI-compatible vLLM endpoint), so every chain shares these instances and only
+    differs in its sampling parameters (see get_llm).
+    """
+    if backend == "gemini":
+        return ChatGoogleGenerativeAI(model=model_name, google_api_key=credential)
+    return ChatOpenAI(model=model_name, base_url=credential, api_key="EMPTY")
+
+def get_llm(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None, temperature: float = 0, top_p: float = 0.95, top_k: int = 10, max_output_tokens: int = 1000):
+    # model_copy is shallow: the copies carry their own sampling parameters but keep the shared client's transport
+    gemini_llms = []
     for api_key in gemini_api_keys:
-        llm_list.append(ChatGoogleGenerativeAI(
-            model=gemini_model_name,
-            google_api_key=api_key,
+        gemini_llms.append(get_chat_client("gemini", gemini_model_name, api_key).model_copy(update=dict(
             temperature=temperature,
             top_p=top_p,
             top_k=top_k,
             max_output_tokens=max_output_tokens,
-        ))
+            # with a scheduler, a 429 moves the call to another key instead of backing off on this one
+            **(dict(max_retries=1) if key_scheduler else {}),
+        )))
+    # key_scheduler tracks the quotas of gemini_api_keys (same keys, same order), shared by every chain
+    llm_list = [KeyPoolRunnable(key_scheduler, gemini_llms)] if key_scheduler and gemini_llms else gemini_llms
     if vllm_base_url:
-        llm_list.append(ChatOpenAI(
-            model=vllm_model_name,
-            base_url=vllm_base_url,
-            api_key="EMPTY",
+        llm_list.append(get_chat_client("vllm", vllm_model_name, vllm_base_url).model_copy(update=dict(
             temperature=temperature,
             top_p=top_p,
             max_tokens=max_output_tokens,
-        ))
-    if len(llm_list) > 1:
+        )))
+    if router and gemini_llms and vllm_base_url:
+        # Gemini (its keys still tried in order without a scheduler) and vLLM are routed by latency and hedged
+        gemini_llm = llm_list[0].with_fallbacks(llm_list[1:-1]) if len(llm_list) > 2 else llm_list[0]
+        llm = RouterRunnable(router, {"gemini": gemini_llm, "vllm": llm_list[-1]})
+    elif len(llm_list) > 1:
         llm = llm_list[0].with_fallbacks(llm_list[1:])
     else:
         llm = llm_list[0]
@@ -45,8 +66,8 @@ class LegalClassification(BaseModel):
     #     ..., description="Giải thích ngắn gọn lý do phân loại."
     # )
 
-def get_legal_question_classifier(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = ""):
-    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url)
+def get_legal_question_classifier(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None):
+    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, key_scheduler, router)
     structured_legal_classifier = llm.with_structured_output(LegalClassification)
     # Prompt
     system_prompt = """Bạn là một chuyên gia pháp lý có nhiệm vụ phân loại câu hỏi theo lĩnh vực pháp luật. 
@@ -82,8 +103,8 @@ class GradeDocuments(BaseModel):
 
     binary_score: Literal["yes", "no"] = Field(description="Tài liệu có liên quan đến câu hỏi không, 'yes' hoặc 'no'")
 
-def get_retrieval_grader(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = ""):
-    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url)
+def get_retrieval_grader(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None):
+    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, key_scheduler, router)
     structured_llm_grader = llm.with_structured_output(GradeDocuments)
     # Prompt 
     system = """Bạn là một chuyên gia pháp luật, có nhiệm vụ đánh giá mức độ liên quan giữa một tài liệu truy xuất và ngữ cảnh hội thoại của người dùng. \n 
@@ -100,8 +121,8 @@ Chỉ trả lời một từ duy nhất cho trường 'binary_score': 'yes' ho
     retrieval_grader = grade_prompt | structured_llm_grader
     return retrieval_grader
 
-def get_question_rewriter(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = ""):
-    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url)
+def get_question_rewriter(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None):
+    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, key_scheduler, router)
     # Prompt 
     system = """Bạn là một chuyên gia pháp lý, có nhiệm vụ cải biên câu hỏi đầu vào để tối ưu hóa việc truy xuất thông tin trong kho dữ liệu văn bản pháp luật. \n 
 Hãy đọc kỹ câu hỏi và viết lại nó sao cho rõ ràng hơn, mang tính pháp lý chính xác hơn, thể hiện đúng mục đích và bản chất pháp lý của người dùng. \n
@@ -129,8 +150,8 @@ class SafeStrOutputParser(StrOutputParser):
                 return content
             # raise e
 
-def get_rag_chain(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = ""):
-    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, 0.3, 0.9, 10, 1500)
+def get_rag_chain(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None):
+    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, key_scheduler, router, 0.3, 0.9, 10, 1500)
     # Prompt
     system = """Bạn là trợ lý pháp lý AI chuyên về pháp luật Việt Nam. Nhiệm vụ của bạn là phân tích câu hỏi của người dùng và các điều luật được cung cấp để đưa ra câu trả lời chính xác, rõ ràng, kèm tham chiếu pháp lý cụ thể.
 
@@ -173,8 +194,8 @@ class GradeHallucinations(BaseModel):
 
     binary_score: Literal["yes", "no"] = Field(description="Câu trả lời có dựa vào tài liệu được cung cấp không, 'yes' hoặc 'no'")
 
-def get_hallucination_grader(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = ""):
-    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url)
+def get_hallucination_grader(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None):
+    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, key_scheduler, router)
     structured_llm_grader = llm.with_structured_output(GradeHallucinations)
     # Prompt 
     system = """Bạn là một chuyên gia pháp lý, có nhiệm vụ đánh giá xem câu trả lời của mô hình LLM có dựa vào nội dung trong các tài liệu pháp luật được truy xuất hay không. \n 
@@ -196,8 +217,8 @@ class GradeAnswer(BaseModel):
 
     binary_score: Literal["yes", "no"] = Field(description="Câu trả lời có giải quyết đúng câu hỏi không, 'yes' hoặc 'no'")
 
-def get_answer_grader(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = ""):
-    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url)
+def get_answer_grader(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None):
+    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, key_scheduler, router)
     structured_llm_grader = llm.with_structured_output(GradeAnswer)
     # Prompt 
     system = """Bạn là một chuyên gia pháp luật. Nhiệm vụ của bạn là đánh giá xem câu trả lời từ mô hình LLM có giải quyết đầy đủ và đúng trọng tâm câu hỏi pháp lý của người dùng hay không. \n 
@@ -213,8 +234,8 @@ Chỉ trả lời một từ duy nhất cho trường 'binary_score': 'yes' ho
     answer_grader = answer_prompt | structured_llm_grader
     return answer_grader
 
-def get_summary_history(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = ""):
-    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, 0.3, 0.9, 10, 1000)
+def get_summary_history(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None):
+    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, key_scheduler, router, 0.3, 0.9, 10, 1000)
     # Prompt
     system = """Bạn là một hệ thống hỗ trợ pháp luật. Hãy đọc đoạn hội thoại giữa người dùng và AI dưới đây và tóm tắt lại nội dung chính đã được thảo luận. Tóm tắt cần ngắn gọn, rõ ràng và đầy đủ các điểm quan trọng.
 
@@ -241,8 +262,8 @@ class Judge(BaseModel):
     legal_factuality_score: Literal["1", "2", "3", "4", "5"] = Field(description="Đánh giá độ chính xác pháp lý của câu trả lời, từ 1 đến 5")
     reasoning_clarity_score: Literal["1", "2", "3", "4", "5"] = Field(description="Đánh giá tính hợp lý và dễ hiểu của câu trả lời, từ 1 đến 5")
 
-def get_llm_as_a_judge(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = ""):
-    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, 0, 0.95, 10, 2000)
+def get_llm_as_a_judge(gemini_model_name: str, vllm_model_name: str, gemini_api_keys: List[str],  vllm_base_url: str = "", key_scheduler: Optional[KeyScheduler] = None, router: Optional[LatencyRouter] = None):
+    llm = get_llm(gemini_model_name, vllm_model_name, gemini_api_keys, vllm_base_url, key_scheduler, router, 0, 0.95, 10, 2000)
     structured_llm_judge = llm.with_structured_output(Judge)
     # Prompt
     system = """Bạn là một chuyên gia pháp lý có khả năng đánh giá chất lượng câu trả lời của một hệ thống AI tư vấn pháp luật.
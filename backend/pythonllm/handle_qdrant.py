@@ -1,21 +1,203 @@
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
-import json
-import torch
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+import httpx
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    VectorParams,
+    Distance,
+    PointStruct,
+    PayloadSchemaType,
+    PointIdsList,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+)
 from tqdm import tqdm
+from handle_corpus import load_corpus_embeddings, load_corpus_documents, build_payload, content_hash, chunk_corpus_ids, point_id
 # Get the absolute path of the project root directory
 # PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
-def get_qdrant_client(url: str, api_key: str) -> QdrantClient:
+UPLOAD_BATCH_SIZE = 256
+UPLOAD_PARALLEL = 4
+UPLOAD_MAX_RETRIES = 3
+
+def get_qdrant_client(url: str, api_key: str, prefer_grpc: bool = False) -> QdrantClient:
     return QdrantClient(
         url=url,
         api_key=api_key,
-        prefer_grpc=False
+        prefer_grpc=prefer_grpc
+    )
+
+def get_async_qdrant_client(url: str, api_key: str, prefer_grpc: bool = False, pool_size: int = 100) -> AsyncQdrantClient:
+    """
+    Async client for the serving path.
+
+    Over REST, requests share a keep-alive pool of up to `pool_size` connections (HTTP/2 would be
+    multiplexed but needs the h2 extra). With `prefer_grpc`, every request is a stream on a single
+    multiplexed gRPC channel instead.
+    """
+    return AsyncQdrantClient(
+        url=url,
+        api_key=api_key,
+        prefer_grpc=prefer_grpc,
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
     )
 
-def initialize_qdrant_collection(client: QdrantClient, collection_name: str, vector_name_1: str, vector_name_2: str, vector_size: int, vector_distance: Distance) -> None:
+def iter_corpus_points(
+    all_docs: List[str],
+    all_doc_metas: List[dict],
+    vector_name_1: str,
+    vector_name_2: str,
+    positions: Optional[Iterable[int]] = None
+) -> Iterator[PointStruct]:
+    """
+    Build corpus points (all of them, or only those at `positions`) lazily; the embeddings are
+    memory-mapped rather than read into RAM. Point ids are derived from the stable corpus ids, and
+    payloads hold metadata only: chunk texts are served by the DocStore.
+    """
+    corpus_embeddings_1, corpus_embeddings_2 = load_corpus_embeddings(mmap=True)
+    corpus_ids = chunk_corpus_ids(all_doc_metas)
+    for idx in (range(len(all_docs)) if positions is None else positions):
+        yield PointStruct(
+            id=point_id(corpus_ids[idx]),
+            vector={
+                vector_name_1: corpus_embeddings_1[idx].tolist(),
+                vector_name_2: corpus_embeddings_2[idx].tolist(),
+            },
+            payload=build_payload(corpus_ids[idx], all_docs[idx], all_doc_metas[idx], with_text=False)
+        )
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+def is_local_client(client: QdrantClient) -> bool:
+    """Local mode (":memory:" or an on-disk path) has no server behind it and is not thread-safe"""
+    options = client.init_options
+    return options.get("location") == ":memory:" or options.get("path") is not None
+
+def upsert_with_retry(client: QdrantClient, collection_name: str, points: List[PointStruct], max_retries: int = UPLOAD_MAX_RETRIES) -> int:
+    """Upsert one batch, retrying with exponential backoff; returns the number of points written"""
+    for attempt in range(max_retries + 1):
+        try:
+            client.upsert(collection_name=collection_name, points=points)
+            return len(points)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = 2 ** attempt
+            print(f"Upsert of {len(points)} points failed ({e}), retrying in {delay}s")
+            time.sleep(delay)
+
+def stream_upload(
+    client: QdrantClient,
+    collection_name: str,
+    points: Iterable[PointStruct],
+    total: Optional[int] = None,
+    batch_size: int = UPLOAD_BATCH_SIZE,
+    parallel: int = UPLOAD_PARALLEL,
+    max_retries: int = UPLOAD_MAX_RETRIES
+) -> int:
+    """
+    Upload a stream of points in batches over `parallel` concurrent connections.
+
+    At most 2 * `parallel` batches are built ahead of the uploads, so memory stays flat however
+    large the corpus is. Prints the throughput and returns the number of points uploaded.
+    """
+    if is_local_client(client):
+        parallel = 1
+    uploaded = 0
+    start = time.perf_counter()
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="upload") as executor, tqdm(total=total, unit="points") as progress:
+        for batch in iter_batches(points, batch_size):
+            if len(in_flight) >= 2 * parallel:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    count = future.result()
+                    uploaded += count
+                    progress.update(count)
+            in_flight.add(executor.submit(upsert_with_retry, client, collection_name, batch, max_retries))
+        for future in in_flight:
+            count = future.result()
+            uploaded += count
+            progress.update(count)
+    elapsed = time.perf_counter() - start
+    print(f"Uploaded {uploaded} points in {elapsed:.1f}s ({uploaded / max(elapsed, 1e-9):.0f} points/s over {parallel} connections)")
+    return uploaded
+
+def get_stored_hashes(client: QdrantClient, collection_name: str) -> Dict[Union[int, str], Optional[str]]:
+    """Content hash of every point in the collection (None for points uploaded without one)"""
+    stored = {}
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False
+        )
+        stored.update({record.id: (record.payload or {}).get("content_hash") for record in records})
+        if offset is None:
+            return stored
+
+def sync_qdrant_collection(
+    client: QdrantClient,
+    collection_name: str,
+    vector_name_1: str,
+    vector_name_2: str,
+    all_docs: Optional[List[str]] = None,
+    all_doc_metas: Optional[List[dict]] = None
+) -> Dict[str, int]:
+    """
+    Bring an existing collection in line with the corpus, touching only what changed.
+
+    Point ids are derived from the stable corpus ids (see point_id), so inserting or removing a chunk
+    does not touch the others: a chunk is uploaded when its point is missing or the content hash in
+    its payload differs from the corpus, and points of chunks no longer in the corpus are deleted.
+
+    Returns:
+        Counts of upserted, deleted and unchanged points
+    """
+    if all_docs is None or all_doc_metas is None:
+        all_docs, all_doc_metas = load_corpus_documents()
+    stored = get_stored_hashes(client, collection_name)
+
+    expected = [point_id(corpus_id) for corpus_id in chunk_corpus_ids(all_doc_metas)]
+
+    changed = [
+        idx for idx, expected_id in enumerate(expected)
+        if stored.get(expected_id) != content_hash(all_docs[idx], all_doc_metas[idx])
+    ]
+    # includes the positional ids of collections built before point ids were stable
+    removed = list(set(stored) - set(expected))
+
+    if changed:
+        points = iter_corpus_points(all_docs, all_doc_metas, vector_name_1, vector_name_2, positions=changed)
+        stream_upload(client, collection_name, points, total=len(changed))
+    if removed:
+        client.delete(collection_name=collection_name, points_selector=PointIdsList(points=removed))
+
+    counts = {"upserted": len(changed), "deleted": len(removed), "unchanged": len(all_docs) - len(changed)}
+    print(f"Synced collection {collection_name}: {counts}")
+    return counts
+
+def initialize_qdrant_collection(
+    client: QdrantClient,
+    collection_name: str,
+    vector_name_1: str,
+    vector_name_2: str,
+    vector_size: int,
+    vector_distance: Distance,
+    sync: bool = False
+) -> None:
     """
     Initialize Qdrant collection and load corpus embeddings if collection doesn't exist.
     
@@ -26,6 +208,7 @@ def initialize_qdrant_collection(client: QdrantClient, collection_name: str, vec
         vector_name_2: str
         vector_size: int
         vector_distance: Distance
+        sync: if the collection already exists, re-index the chunks that changed in the corpus
     """
     # Create collection if it doesn't exist
     if not client.collection_exists(collection_name):
@@ -46,34 +229,23 @@ def initialize_qdrant_collection(client: QdrantClient, collection_name: str, vec
         
         # Load corpus embeddings
         try:
-            corpus_embeddings_1 = torch.load(os.path.join(BACKEND_ROOT, "embedding/corpus_embeddings_v1.pt"), weights_only=False)
-            corpus_embeddings_2 = torch.load(os.path.join(BACKEND_ROOT, "embedding/corpus_embeddings_v2.pt"), weights_only=False)
-            with open(os.path.join(BACKEND_ROOT, "data/all_docs.json"), "r", encoding="utf-8") as f:
-                all_docs = json.load(f)
-            with open(os.path.join(BACKEND_ROOT, "data/all_doc_metas.json"), 'r', encoding='utf-8') as f:
-                all_doc_metas = json.load(f)
-            batch_size = 1000
-            points = [
-                PointStruct(
-                    id=idx,
-                    vector={
-                        vector_name_1: corpus_embeddings_1[idx],
-                        vector_name_2: corpus_embeddings_2[idx],
-                    },
-                    payload={"chunk_text": all_docs[idx], "corpus_id": f"corpus_{idx}", **all_doc_metas[idx]}
-                )
-                for idx in range(len(all_docs))
-            ]
-            for i in tqdm(range(0, len(points), batch_size)):
-                batch = points[i:i+batch_size]
-                client.upsert(
-                    collection_name=collection_name,
-                    points=batch
-                )
-            
+            all_docs, all_doc_metas = load_corpus_documents()
+            points = iter_corpus_points(all_docs, all_doc_metas, vector_name_1, vector_name_2)
+            stream_upload(client, collection_name, points, total=len(all_docs))
             print("Loaded corpus embeddings successfully")
         except Exception as e:
             print(f"Error loading corpus embeddings: {e}")
+    elif sync:
+        sync_qdrant_collection(client, collection_name, vector_name_1, vector_name_2)
+
+    # Keyword index on law_name, used by law-family filtering in FusionRetriever
+    if "law_name" not in client.get_collection(collection_name).payload_schema:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name="law_name",
+            field_schema=PayloadSchemaType.KEYWORD
+        )
+        print(f"Created payload index on law_name for collection: {collection_name}")
 
 def delete_qdrant_collection(client: QdrantClient, collection_name: str) -> None:
     """
@@ -84,4 +256,101 @@ def delete_qdrant_collection(client: QdrantClient, collection_name: str) -> None
         collection_name: str
     """
     if client.collection_exists(collection_name):
-        client.delete_collection(collection_name=collection_name)
\ No newline at end of file
+        client.delete_collection(collection_name=collection_name)
+
+def get_alias_target(client: QdrantClient, alias_name: str) -> Optional[str]:
+    """Collection the alias currently points to, None if there is no such alias"""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == alias_name:
+            return alias.collection_name
+    return None
+
+def list_collection_versions(client: QdrantClient, alias_name: str) -> List[str]:
+    """Versioned collections built for the alias, oldest first"""
+    prefix = f"{alias_name}_v"
+    return sorted(
+        collection.name for collection in client.get_collections().collections
+        if collection.name.startswith(prefix) and collection.name[len(prefix):].isdigit()
+    )
+
+def smoke_check(client: QdrantClient, collection_name: str, expected_count: int, vector_name_1: str, vector_name_2: str) -> None:
+    """Raise if a freshly built collection is incomplete or does not find a corpus chunk by its own vectors"""
+    count = client.count(collection_name=collection_name, exact=True).count
+    if count != expected_count:
+        raise RuntimeError(f"Collection {collection_name} has {count} points, expected {expected_count}")
+    corpus_embeddings_1, corpus_embeddings_2 = load_corpus_embeddings(mmap=True)
+    for vector_name, corpus_embeddings in ((vector_name_1, corpus_embeddings_1), (vector_name_2, corpus_embeddings_2)):
+        points = client.query_points(collection_name, query=corpus_embeddings[0].tolist(), using=vector_name, limit=1).points
+        if not points or points[0].score < 0.99:
+            raise RuntimeError(f"Smoke query on {collection_name} ({vector_name}) did not find the expected chunk")
+
+def swap_alias(client: QdrantClient, alias_name: str, collection_name: str) -> None:
+    """Atomically repoint the alias to `collection_name`"""
+    current = get_alias_target(client, alias_name)
+    if current is None and client.collection_exists(alias_name):
+        # One-time migration from a plain collection named like the alias: the new version is
+        # already loaded, so the name is missing only between these two calls
+        client.delete_collection(collection_name=alias_name)
+    operations = []
+    if current is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias_name)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=alias_name)))
+    # Both operations are applied in one request, so queries never see the alias missing
+    client.update_collection_aliases(change_aliases_operations=operations)
+
+def rebuild_qdrant_collection(
+    client: QdrantClient,
+    alias_name: str,
+    vector_name_1: str,
+    vector_name_2: str,
+    vector_size: int,
+    vector_distance: Distance,
+    keep_previous: int = 0
+) -> str:
+    """
+    Blue/green rebuild behind an alias.
+
+    The corpus is loaded into a new versioned collection `<alias>_v<epoch ms>`, smoke-tested, and
+    the alias is swapped to it atomically; older versions (but the `keep_previous` most recent) are
+    then deleted. Readers querying the alias never see an empty or partially loaded collection.
+    Versions newer than this one (another rebuild running concurrently) are left alone.
+
+    Returns:
+        Name of the new collection
+    """
+    collection_name = f"{alias_name}_v{int(time.time() * 1000)}"
+    initialize_qdrant_collection(client, collection_name, vector_name_1, vector_name_2, vector_size, vector_distance)
+    all_docs, _ = load_corpus_documents()
+    try:
+        smoke_check(client, collection_name, len(all_docs), vector_name_1, vector_name_2)
+    except Exception:
+        delete_qdrant_collection(client, collection_name)
+        raise
+    swap_alias(client, alias_name, collection_name)
+    print(f"Alias {alias_name} -> {collection_name}")
+
+    old_versions = [name for name in list_collection_versions(client, alias_name) if name < collection_name]
+    for name in old_versions[:max(0, len(old_versions) - keep_previous)]:
+        delete_qdrant_collection(client, name)
+        print(f"Deleted old collection: {name}")
+    return collection_name
+
+def ensure_qdrant_collection(
+    client: QdrantClient,
+    alias_name: str,
+    vector_name_1: str,
+    vector_name_2: str,
+    vector_size: int,
+    vector_distance: Distance
+) -> Optional[str]:
+    """
+    First build behind the alias: when neither the alias (or a plain collection of that name) nor
+    any versioned collection exists, run rebuild_qdrant_collection. An existing or half-built
+    collection is left to `reindex.py rebuild` / `sync`, so this is safe to run on every start.
+
+    Returns:
+        Name of the new collection, None if there was one already
+    """
+    if client.collection_exists(alias_name) or list_collection_versions(client, alias_name):
+        return None
+    return rebuild_qdrant_collection(client, alias_name, vector_name_1, vector_name_2, vector_size, vector_distance)
@@ -0,0 +1,221 @@
+import time
+import asyncio
+import threading
+import typing
+from functools import wraps
+from typing import Any, Callable, List, Optional, Tuple
+from langchain_core.runnables import Runnable, RunnableConfig
+
+class RateLimitExceeded(Exception):
+    """No API key can take the request within the scheduler's max_wait"""
+
+class TokenBucket:
+    """
+    Reservation-based token bucket for a quota of `limit` units per `period` seconds.
+
+    The bucket refills at the quota's sustained rate, `limit / period`, and holds at most
+    `burst * limit` units, so a key left idle can send a short burst on top of the steady rate.
+    `take` may drive the level negative: the caller has reserved future capacity and must wait
+    `available_at - now` before sending.
+    """
+
+    def __init__(self, limit: float, period: float = 60.0, burst: float = 0.25, now: Optional[float] = None):
+        self.capacity = max(1.0, burst * limit)
+        self.rate = limit / period
+        self.level = self.capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def available_at(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        # a reservation for later has already refilled the bucket up to `updated`
+        start = max(now, self.updated)
+        return start if self.level >= amount else start + (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+class KeyScheduler:
+    """
+    Spreads requests over several API keys of one model, each with its own RPM/TPM quota.
+
+    Every key has a request bucket and a token bucket (see TokenBucket). A request goes to the key
+    that can send it soonest, ties (usually: several keys ready now) broken by fewest requests in
+    flight, then by the most request budget left, so load is spread evenly and throughput grows
+    with the number of keys. A key answering 429 is put in cooldown (the server's retry delay when
+    it gives one) and its buckets are drained. Thread-safe; shared by every chain using the keys.
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        rpm: int,
+        tpm: int = 0,
+        period: float = 60.0,
+        burst: float = 0.25,
+        cooldown: float = 60.0,
+        max_wait: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not keys:
+            raise ValueError("KeyScheduler needs at least one API key")
+        self.clock = clock
+        now = clock()
+        self.keys = list(keys)
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self._requests = [TokenBucket(rpm, period, burst, now) for _ in self.keys]
+        self._tokens = [TokenBucket(tpm, period, burst, now) if tpm else None for _ in self.keys]
+        self._cooldown_until = [0.0] * len(self.keys)
+        self._in_flight = [0] * len(self.keys)
+        self.sent = [0] * len(self.keys)
+        self.rate_limited = [0] * len(self.keys)
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> Tuple[int, float]:
+        """Pick a key for a request of about `tokens` tokens: returns (key index, seconds to wait before sending)"""
+        with self._lock:
+            now = self.clock()
+            best = None
+            for idx in range(len(self.keys)):
+                ready = max(now, self._cooldown_until[idx], self._requests[idx].available_at(1, now))
+                if self._tokens[idx] is not None:
+                    ready = max(ready, self._tokens[idx].available_at(tokens, now))
+                rank = (ready, self._in_flight[idx], -self._requests[idx].level)
+                if best is None or rank < best[0]:
+                    best = (rank, idx)
+            (ready, _, _), idx = best
+            if ready - now > self.max_wait:
+                raise RateLimitExceeded(f"All {len(self.keys)} API keys are rate limited for the next {ready - now:.1f}s")
+            self._requests[idx].take(1, ready)
+            if self._tokens[idx] is not None:
+                self._tokens[idx].take(tokens, ready)
+            self._in_flight[idx] += 1
+            self.sent[idx] += 1
+            return idx, ready - now
+
+    def release(self, idx: int) -> None:
+        with self._lock:
+            self._in_flight[idx] -= 1
+
+    def penalize(self, idx: int, retry_after: Optional[float] = None) -> None:
+        """Key `idx` answered 429: skip it until its quota window has passed"""
+        with self._lock:
+            now = self.clock()
+            self._cooldown_until[idx] = max(self._cooldown_until[idx], now + (retry_after or self.cooldown))
+            self._requests[idx].drain(now)
+            if self._tokens[idx] is not None:
+                self._tokens[idx].drain(now)
+            self.rate_limited[idx] += 1
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """429 from either backend: google.api_core ResourceExhausted (code) or openai RateLimitError (status_code)"""
+    return getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry delay suggested by the server, if any"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after:
+        return float(retry_after)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except ValueError:
+        return None
+
+def estimate_tokens(input: Any) -> int:
+    """Rough prompt size for the TPM budget (about 3 characters per token for Vietnamese text)"""
+    text = input.to_string() if hasattr(input, "to_string") else str(input)
+    return len(text) // 3 + 1
+
+def returns_runnable(attr: Any) -> bool:
+    if not callable(attr):
+        return False
+    try:
+        return_type = typing.get_type_hints(attr).get("return")
+    except Exception:
+        return False
+    origin = typing.get_origin(return_type) or return_type
+    return isinstance(origin, type) and issubclass(origin, Runnable)
+
+class KeyPoolRunnable(Runnable):
+    """
+    One runnable per API key (same model and parameters) behind a KeyScheduler.
+
+    Each call waits for the key the scheduler picks; a 429 puts that key in cooldown and the call
+    is retried on the next key, at most once per key. When every key is exhausted the error
+    propagates, so a `with_fallbacks` backend (e.g. vLLM) still takes over. Methods returning a new
+    runnable, such as `with_structured_output`, are applied to every key's runnable.
+    """
+
+    def __init__(self, scheduler: KeyScheduler, runnables: List[Runnable]):
+        if len(runnables) != len(scheduler.keys):
+            raise ValueError(f"{len(runnables)} runnables for {len(scheduler.keys)} scheduled keys")
+        self.scheduler = scheduler
+        self.runnables = runnables
+
+    @property
+    def InputType(self):
+        return self.runnables[0].InputType
+
+    @property
+    def OutputType(self):
+        return self.runnables[0].OutputType
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        tokens = estimate_tokens(input)
+        for attempt in range(len(self.runnables)):
+            idx, delay = self.scheduler.reserve(tokens)
+            try:
+                if delay > 0:
+                    time.sleep(delay)
+                return self.runnables[idx].invoke(input, config, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                self.scheduler.penalize(idx, retry_after_seconds(e))
+                if attempt == len(self.runnables) - 1:
+                    raise
+            finally:
+                self.scheduler.release(idx)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        tokens = estimate_tokens(input)
+        for attempt in range(len(self.runnables)):
+            idx, delay = self.scheduler.reserve(tokens)
+            try:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                return await self.runnables[idx].ainvoke(input, config, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                self.scheduler.penalize(idx, retry_after_seconds(e))
+                if attempt == len(self.runnables) - 1:
+                    raise
+            finally:
+                self.scheduler.release(idx)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or name in ("scheduler", "runnables"):
+            raise AttributeError(name)
+        attr = getattr(self.runnables[0], name)
+        if returns_runnable(attr):
+
+            @wraps(attr)
+            def wrapped(*args: Any, **kwargs: Any) -> Any:
+                return KeyPoolRunnable(self.scheduler, [getattr(runnable, name)(*args, **kwargs) for runnable in self.runnables])
+
+            return wrapped
+        return attr
@@ -1,10 +1,46 @@
 from langchain_core.retrievers import BaseRetriever
-from typing import List, Any
+from typing import List, Any, Dict, Tuple, Optional
+import asyncio
+from functools import partial
+from bisect import bisect_left, bisect_right
 from langchain.schema import Document
 from qdrant_client import models
-import json
 from pydantic import Field
 import re
+from handle_vector_search import rrf_fusion
+
+# Nhóm luật theo kết quả phân loại câu hỏi (loại 2-5 của get_legal_question_classifier)
+LAW_FAMILIES = {
+    "2": ["HIẾN PHÁP NƯỚC CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM"],
+    "3": [
+        "BỘ LUẬT LAO ĐỘNG",
+        "LUẬT AN TOÀN, VỆ SINH LAO ĐỘNG",
+        "LUẬT BẢO HIỂM XÃ HỘI",
+        "LUẬT CÔNG ĐOÀN",
+        "LUẬT VIỆC LÀM",
+    ],
+    "4": [
+        "BỘ LUẬT DÂN SỰ",
+        "LUẬT HÔN NHÂN VÀ GIA ĐÌNH",
+        "LUẬT BẢO VỆ QUYỀN LỢI NGƯỜI TIÊU DÙNG",
+    ],
+    "5": ["BỘ LUẬT HÌNH SỰ"],
+}
+
+def get_law_family(question_type) -> Optional[List[str]]:
+    """Danh sách tên luật ứng với loại câu hỏi, None nếu không giới hạn"""
+    return LAW_FAMILIES.get(str(question_type)) if question_type is not None else None
+
+def get_law_fan_out(question_type) -> Optional[List[List[str]]]:
+    """Các nhóm luật cần tìm song song cho câu hỏi liên quan nhiều lĩnh vực (loại 6)"""
+    if question_type is not None and str(question_type) == "6":
+        return list(LAW_FAMILIES.values())
+    return None
+
+def build_law_filter(law_names: Optional[List[str]]) -> Optional[models.Filter]:
+    if not law_names:
+        return None
+    return models.Filter(must=[models.FieldCondition(key="law_name", match=models.MatchAny(any=law_names))])
 
 class FusionRetriever(BaseRetriever):
     client: Any = Field(...)
@@ -13,6 +49,12 @@ class FusionRetriever(BaseRetriever):
     collection_name: str = Field(...)
     vector_name_1: str = Field(default="vn-law-embedding_1")
     vector_name_2: str = Field(default="vn-law-embedding_2")
+    embedding_cache: Any = Field(default=None)
+    encode_executor: Any = Field(default=None)
+    fan_out_limit: int = Field(default=4)
+    lexical_index: Any = Field(default=None)
+    async_client: Any = Field(default=None)
+    doc_store: Any = Field(default=None)
 
     def __init__(
         self, 
@@ -21,7 +63,13 @@ class FusionRetriever(BaseRetriever):
         embeddings_2,
         collection_name,
         vector_name_1="vn-law-embedding_1",
-        vector_name_2="vn-law-embedding_2"
+        vector_name_2="vn-law-embedding_2",
+        embedding_cache=None,
+        encode_executor=None,
+        fan_out_limit=4,
+        lexical_index=None,
+        async_client=None,
+        doc_store=None
     ):
         super().__init__(
             client=client,
@@ -29,108 +77,449 @@ class FusionRetriever(BaseRetriever):
             embeddings_2=embeddings_2,
             collection_name=collection_name,
             vector_name_1=vector_name_1,
-            vector_name_2=vector_name_2
+            vector_name_2=vector_name_2,
+            embedding_cache=embedding_cache,
+            encode_executor=encode_executor,
+            fan_out_limit=fan_out_limit,
+            lexical_index=lexical_index,
+            async_client=async_client,
+            doc_store=doc_store
         )
 
-    def _get_relevant_documents(self, query: str) -> List[Document]:
-        # Generate embeddings using both models
-        vector_1 = self.embeddings_1.encode(query).tolist()
-        vector_2 = self.embeddings_2.encode(query).tolist()
-        
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        law_names: Optional[List[str]] = None,
+        law_families: Optional[List[List[str]]] = None
+    ) -> List[Document]:
+        vector_1, vector_2 = self.encode(query)
+        return self._search(query, vector_1, vector_2, law_names, law_families)
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        law_names: Optional[List[str]] = None,
+        law_families: Optional[List[List[str]]] = None
+    ) -> List[Document]:
+        vector_1, vector_2 = await self.aencode(query)
+        if self.async_client is None:
+            # No async backend (e.g. NumpySearchClient): run the sync search off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, partial(self._search, query, vector_1, vector_2, law_names, law_families))
+        if law_families:
+            return await self.asearch_fan_out(vector_1, vector_2, law_families, query)
+        return await self.asearch_by_vectors(vector_1, vector_2, law_names, query)
+
+    def _search(
+        self,
+        query: str,
+        vector_1: List[float],
+        vector_2: List[float],
+        law_names: Optional[List[str]] = None,
+        law_families: Optional[List[List[str]]] = None
+    ) -> List[Document]:
+        if law_families:
+            return self.search_fan_out(vector_1, vector_2, law_families, query)
+        return self.search_by_vectors(vector_1, vector_2, law_names, query)
+
+    def encode(self, query: str) -> Tuple[List[float], List[float]]:
+        vectors_1, vectors_2 = self.encode_batch([query])
+        return vectors_1[0], vectors_2[0]
+
+    def encode_batch(self, queries: List[str], batch_size: int = 64) -> Tuple[List[List[float]], List[List[float]]]:
+        """Encode many queries with one batched `encode` call per model, skipping cached ones"""
+        vectors_1 = [None] * len(queries)
+        vectors_2 = [None] * len(queries)
+        missing = []
+        for i, query in enumerate(queries):
+            cached = self.embedding_cache.get(query) if self.embedding_cache is not None else None
+            if cached is not None:
+                vectors_1[i], vectors_2[i] = cached[0].tolist(), cached[1].tolist()
+            else:
+                missing.append(i)
+        if not missing:
+            return vectors_1, vectors_2
+
+        # A single query is encoded as a string, so the model returns one vector
+        texts = [queries[i] for i in missing]
+        inputs = texts[0] if len(texts) == 1 else texts
+
+        # Generate embeddings using both models, concurrently when an executor is given
+        # (torch releases the GIL inside the forward pass)
+        if self.encode_executor is not None:
+            future_2 = self.encode_executor.submit(self.embeddings_2.encode, inputs, batch_size=batch_size)
+            encoded_1 = self.embeddings_1.encode(inputs, batch_size=batch_size)
+            encoded_2 = future_2.result()
+        else:
+            encoded_1 = self.embeddings_1.encode(inputs, batch_size=batch_size)
+            encoded_2 = self.embeddings_2.encode(inputs, batch_size=batch_size)
+        if len(texts) == 1:
+            encoded_1, encoded_2 = [encoded_1], [encoded_2]
+
+        for i, query, vector_1, vector_2 in zip(missing, texts, encoded_1, encoded_2):
+            if self.embedding_cache is not None:
+                self.embedding_cache.put(query, (vector_1, vector_2))
+            vectors_1[i], vectors_2[i] = vector_1.tolist(), vector_2.tolist()
+        return vectors_1, vectors_2
+
+    async def aencode(self, query: str) -> Tuple[List[float], List[float]]:
+        """
+        Encode without blocking the event loop: both models run on `encode_executor`
+        (the loop's default executor when None) and are awaited together.
+        """
+        cached = self.embedding_cache.get(query) if self.embedding_cache is not None else None
+        if cached is not None:
+            return cached[0].tolist(), cached[1].tolist()
+        loop = asyncio.get_running_loop()
+        vector_1, vector_2 = await asyncio.gather(
+            loop.run_in_executor(self.encode_executor, self.embeddings_1.encode, query),
+            loop.run_in_executor(self.encode_executor, self.embeddings_2.encode, query),
+        )
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(query, (vector_1, vector_2))
+        return vector_1.tolist(), vector_2.tolist()
+
+    def _build_query(self, vector_1: List[float], vector_2: List[float], law_names: Optional[List[str]] = None, limit: int = 3) -> dict:
+        # Restrict the search to the given laws (payload index on law_name)
+        law_filter = build_law_filter(law_names)
+
         # Set up prefetch queries for both vectors
         prefetch = [
             models.Prefetch(
                 query=vector_1,
                 using=self.vector_name_1,
+                filter=law_filter,
                 limit=20,
             ),
             models.Prefetch(
                 query=vector_2,
                 using=self.vector_name_2,
+                filter=law_filter,
                 limit=20,
             ),
         ]
         
         # Query with RRF fusion
-        results = self.client.query_points(
-            self.collection_name,
+        return dict(
             prefetch=prefetch,
             query=models.FusionQuery(
                 fusion=models.Fusion.RRF,
             ),
-            with_payload=True,
-            limit=3,
+            # With a document store, Qdrant only returns ids (Qdrant payloads never hold chunk texts)
+            with_payload=self.doc_store is None,
+            limit=limit,
         )
 
-        return [
-            Document(
-                page_content=point.payload.get("chunk_text", ""),
-                metadata={k:v for k, v in point.payload.items() if k != "chunk_text"}
+    def _to_document(self, payload: dict) -> Document:
+        return Document(
+            page_content=payload.get("chunk_text", ""),
+            metadata={k:v for k, v in payload.items() if k != "chunk_text"}
+        )
+
+    def _to_documents(self, points) -> List[Document]:
+        if self.doc_store is not None:
+            return self._ids_to_documents([point.id for point in points])
+        return [self._to_document(point.payload) for point in points]
+
+    def _ids_to_documents(self, ids: List[str]) -> List[Document]:
+        """Documents read from the document store by point id"""
+        return [self._to_document(self.doc_store.payload(self.doc_store.position(point_id))) for point_id in ids]
+
+    def _hybrid_requests(self, searches: List[tuple]) -> List[models.QueryRequest]:
+        """Both dense lanes of every search as id-only requests, sent in one `query_batch_points` call"""
+        requests = []
+        for _, vector_1, vector_2, law_names in searches:
+            law_filter = build_law_filter(law_names)
+            requests.append(models.QueryRequest(query=vector_1, using=self.vector_name_1, filter=law_filter, limit=20, with_payload=False))
+            requests.append(models.QueryRequest(query=vector_2, using=self.vector_name_2, filter=law_filter, limit=20, with_payload=False))
+        return requests
+
+    def _hybrid_rankings(self, searches: List[tuple], limit: int) -> List[List[str]]:
+        """
+        Three-lane search: both dense lanes (ids only, all searches in one `query_batch_points` call)
+        and the BM25 lexical lane, fused locally with RRF.
+
+        Args:
+            searches: list of (query text, vector_1, vector_2, law_names)
+            limit: number of fused ids to keep per search
+        """
+        responses = self.client.query_batch_points(self.collection_name, requests=self._hybrid_requests(searches))
+        return self._fuse_hybrid(searches, responses, limit)
+
+    async def _ahybrid_rankings(self, searches: List[tuple], limit: int) -> List[List[str]]:
+        responses = await self.async_client.query_batch_points(self.collection_name, requests=self._hybrid_requests(searches))
+        return self._fuse_hybrid(searches, responses, limit)
+
+    def _fuse_hybrid(self, searches: List[tuple], responses: list, limit: int) -> List[List[str]]:
+        rankings = []
+        for i, (query, _, _, law_names) in enumerate(searches):
+            dense_1 = [point.id for point in responses[2 * i].points]
+            dense_2 = [point.id for point in responses[2 * i + 1].points]
+            lexical = self.lexical_index.search(query, limit=20, law_names=law_names)
+            rankings.append([point_id for point_id, _ in rrf_fusion([dense_1, dense_2, lexical], limit)])
+        return rankings
+
+    def _fetch_documents(self, rankings: List[List[str]]) -> List[List[Document]]:
+        """Fetch the payloads of all ranked ids in one call and rebuild each ranking's documents"""
+        if self.doc_store is not None:
+            return [self._ids_to_documents(ranking) for ranking in rankings]
+        ids = list({point_id for ranking in rankings for point_id in ranking})
+        records = self.client.retrieve(self.collection_name, ids=ids, with_payload=True) if ids else []
+        return self._rankings_to_documents(rankings, records)
+
+    async def _afetch_documents(self, rankings: List[List[str]]) -> List[List[Document]]:
+        if self.doc_store is not None:
+            return [self._ids_to_documents(ranking) for ranking in rankings]
+        ids = list({point_id for ranking in rankings for point_id in ranking})
+        records = await self.async_client.retrieve(self.collection_name, ids=ids, with_payload=True) if ids else []
+        return self._rankings_to_documents(rankings, records)
+
+    def _rankings_to_documents(self, rankings: List[List[str]], records: list) -> List[List[Document]]:
+        by_id = {record.id: record for record in records}
+        return [self._to_documents([by_id[point_id] for point_id in ranking]) for ranking in rankings]
+
+    def search_by_vectors(
+        self,
+        vector_1: List[float],
+        vector_2: List[float],
+        law_names: Optional[List[str]] = None,
+        query: Optional[str] = None
+    ) -> List[Document]:
+        if self.lexical_index is not None and query:
+            rankings = self._hybrid_rankings([(query, vector_1, vector_2, law_names)], limit=3)
+            return self._fetch_documents(rankings)[0]
+        results = self.client.query_points(self.collection_name, **self._build_query(vector_1, vector_2, law_names))
+        return self._to_documents(results.points)
+
+    async def asearch_by_vectors(
+        self,
+        vector_1: List[float],
+        vector_2: List[float],
+        law_names: Optional[List[str]] = None,
+        query: Optional[str] = None
+    ) -> List[Document]:
+        """`search_by_vectors` on `async_client`"""
+        if self.lexical_index is not None and query:
+            rankings = await self._ahybrid_rankings([(query, vector_1, vector_2, law_names)], limit=3)
+            return (await self._afetch_documents(rankings))[0]
+        results = await self.async_client.query_points(self.collection_name, **self._build_query(vector_1, vector_2, law_names))
+        return self._to_documents(results.points)
+
+    def search_fan_out(
+        self,
+        vector_1: List[float],
+        vector_2: List[float],
+        law_families: List[List[str]],
+        query: Optional[str] = None
+    ) -> List[Document]:
+        """
+        One filtered search per law family, sent together in a single `query_batch_points` round-trip,
+        then merged with RRF under a total budget of `fan_out_limit` documents.
+        """
+        if self.lexical_index is not None and query:
+            rankings = self._hybrid_rankings(
+                [(query, vector_1, vector_2, law_names) for law_names in law_families],
+                limit=self.fan_out_limit
             )
-            for point in results.points
+            fused = rrf_fusion(rankings, self.fan_out_limit)
+            return self._fetch_documents([[point_id for point_id, _ in fused]])[0]
+
+        responses = self.client.query_batch_points(self.collection_name, requests=self._fan_out_requests(vector_1, vector_2, law_families))
+        return self._merge_fan_out(responses)
+
+    async def asearch_fan_out(
+        self,
+        vector_1: List[float],
+        vector_2: List[float],
+        law_families: List[List[str]],
+        query: Optional[str] = None
+    ) -> List[Document]:
+        """`search_fan_out` on `async_client`"""
+        if self.lexical_index is not None and query:
+            rankings = await self._ahybrid_rankings(
+                [(query, vector_1, vector_2, law_names) for law_names in law_families],
+                limit=self.fan_out_limit
+            )
+            fused = rrf_fusion(rankings, self.fan_out_limit)
+            return (await self._afetch_documents([[point_id for point_id, _ in fused]]))[0]
+        responses = await self.async_client.query_batch_points(self.collection_name, requests=self._fan_out_requests(vector_1, vector_2, law_families))
+        return self._merge_fan_out(responses)
+
+    def _fan_out_requests(self, vector_1: List[float], vector_2: List[float], law_families: List[List[str]]) -> List[models.QueryRequest]:
+        return [
+            models.QueryRequest(**self._build_query(vector_1, vector_2, law_names, limit=self.fan_out_limit))
+            for law_names in law_families
         ]
 
-def remove_special_chars(text):
-    # Giữ lại chữ cái (cả có dấu Unicode), số và khoảng trắng
-    cleaned = re.sub(r"[^\w\s]", " ", text, flags=re.UNICODE)
-    # Chuẩn hóa khoảng trắng
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-    return cleaned
-
-def extract_law_name_and_article(text: str) -> str:
-    """Trích xuất tên luật và số điều từ văn bản"""
-    text = text.lower()
-    text = remove_special_chars(text)
-    match = re.search(r"điều\s+(\d+)", text, re.IGNORECASE)
-    article_num = None
-    law_name = None
-
-    if match:
-        article_num = match.group(1)
-        if "hiến pháp" in text:
-            law_name = "HIẾN PHÁP NƯỚC CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM"
-        elif "luật dân sự" in text:
-            law_name = "BỘ LUẬT DÂN SỰ"
-        elif "luật lao động" in text:
-            law_name = "BỘ LUẬT LAO ĐỘNG"
-        elif "luật hình sự" in text:
-            law_name = "BỘ LUẬT HÌNH SỰ"
-        elif "luật an toàn vệ sinh lao động" in text:
-            law_name = "LUẬT AN TOÀN, VỆ SINH LAO ĐỘNG"
-        elif "luật bảo hiểm xã hội" in text:
-            law_name = "LUẬT BẢO HIỂM XÃ HỘI"
-        elif "luật bảo vệ quyền lợi người tiêu dùng" in text:
-            law_name = "LUẬT BẢO VỆ QUYỀN LỢI NGƯỜI TIÊU DÙNG"
-        elif "luật công đoàn" in text:
-            law_name = "LUẬT CÔNG ĐOÀN"
-        elif "luật hôn nhân và gia đình" in text:
-            law_name = "LUẬT HÔN NHÂN VÀ GIA ĐÌNH"
-        elif "luật việc làm" in text:
-            law_name = "LUẬT VIỆC LÀM"
-            
-    return law_name, article_num
+    def _merge_fan_out(self, responses: list) -> List[Document]:
+        points = {}
+        for response in responses:
+            for point in response.points:
+                points.setdefault(point.id, point)
+        fused = rrf_fusion([[point.id for point in response.points] for response in responses], self.fan_out_limit)
+        return self._to_documents([points[point_id] for point_id, _ in fused])
+
+    def batch_retrieve(self, questions: List[str], batch_size: int = 64, law_names: Optional[List[str]] = None) -> List[List[Document]]:
+        """
+        Retrieve documents for many questions at once.
+
+        Questions are encoded in batches and sent with one `query_batch_points` request per batch;
+        results come back in the same order as `questions`. `law_names` restricts every search.
+        """
+        results = []
+        for i in range(0, len(questions), batch_size):
+            batch = questions[i:i + batch_size]
+            vectors_1, vectors_2 = self.encode_batch(batch, batch_size=batch_size)
+            if self.lexical_index is not None:
+                rankings = self._hybrid_rankings(
+                    [(question, vector_1, vector_2, law_names) for question, vector_1, vector_2 in zip(batch, vectors_1, vectors_2)],
+                    limit=3
+                )
+                results.extend(self._fetch_documents(rankings))
+                continue
+            requests = [
+                models.QueryRequest(**self._build_query(vector_1, vector_2, law_names))
+                for vector_1, vector_2 in zip(vectors_1, vectors_2)
+            ]
+            responses = self.client.query_batch_points(self.collection_name, requests=requests)
+            results.extend(self._to_documents(response.points) for response in responses)
+        return results
+
+# (alias viết thường, tên luật trong metadata) - thứ tự ưu tiên khi so khớp
+LAW_NAME_ALIASES = [
+    ("hiến pháp", "HIẾN PHÁP NƯỚC CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM"),
+    ("luật dân sự", "BỘ LUẬT DÂN SỰ"),
+    ("luật lao động", "BỘ LUẬT LAO ĐỘNG"),
+    ("luật hình sự", "BỘ LUẬT HÌNH SỰ"),
+    ("luật an toàn vệ sinh lao động", "LUẬT AN TOÀN, VỆ SINH LAO ĐỘNG"),
+    ("luật bảo hiểm xã hội", "LUẬT BẢO HIỂM XÃ HỘI"),
+    ("luật bảo vệ quyền lợi người tiêu dùng", "LUẬT BẢO VỆ QUYỀN LỢI NGƯỜI TIÊU DÙNG"),
+    ("luật công đoàn", "LUẬT CÔNG ĐOÀN"),
+    ("luật hôn nhân và gia đình", "LUẬT HÔN NHÂN VÀ GIA ĐÌNH"),
+    ("luật việc làm", "LUẬT VIỆC LÀM"),
+]
+
+# "điều 35", "điều 35, 36 và điều 37", "điều 35 đến điều 40", "điều 35-40"
+# Một số đứng sau dấu phẩy/"và"/"hoặc" mà không có chữ "điều" chỉ thuộc danh sách điều khi nó có tối đa
+# 3 chữ số (không luật nào quá 999 điều, còn năm ban hành thì có 4) và sau nó là dấu nối tiếp theo, tên
+# luật hoặc hết câu ("điều 5, 2 người ..." hay "điều 35, 2019 bộ luật lao động" chỉ trích dẫn một điều)
+ARTICLE_LIST_END = r"(?=\s*(?:,|và|hoặc|đến|tới|-|(?:của\s+)?(?:bộ\s+)?luật|hiến\s+pháp|$))"
+ARTICLE_GROUP_PATTERN = re.compile(
+    r"điều\s+\d+(?:\s*(?:(?:,|và|hoặc)\s*(?:điều\s+\d+|\d{1,3}" + ARTICLE_LIST_END + r")|(?:đến|tới|-)\s*(?:điều\s+)?\d+))*"
+)
+ARTICLE_RANGE_PATTERN = re.compile(r"(\d+)\s*(?:đến|tới|-)\s*(?:điều\s+)?(\d+)")
+LAW_MENTION_PATTERN = re.compile(
+    "|".join("(" + alias.replace(" ", r"[\s,]+") + ")" for alias, _ in LAW_NAME_ALIASES)
+)
+
+def extract_law_citations(text: str) -> List[Tuple[str, int, int]]:
+    """Trích xuất tất cả trích dẫn (tên luật, điều bắt đầu, điều kết thúc) từ văn bản.
+
+    Mỗi nhóm điều được gán cho tên luật đứng ngay sau nó (trước nhóm điều kế tiếp),
+    nếu không có thì lấy tên luật gần nhất đứng trước, sau cùng là tên luật bất kỳ phía sau.
+    """
+    text = re.sub(r"[^\w\s,\-]", " ", text.lower(), flags=re.UNICODE)
+    text = re.sub(r"\s+", " ", text)
+
+    groups = list(ARTICLE_GROUP_PATTERN.finditer(text))
+    if not groups:
+        return []
+    mentions = [
+        (m.start(), LAW_NAME_ALIASES[m.lastindex - 1][1])
+        for m in LAW_MENTION_PATTERN.finditer(text)
+    ]
+    if not mentions:
+        return []
+
+    citations = []
+    for i, group in enumerate(groups):
+        next_start = groups[i + 1].start() if i + 1 < len(groups) else len(text)
+        after = [name for pos, name in mentions if group.end() <= pos]
+        before = [name for pos, name in mentions if pos < group.start()]
+        following = [name for pos, name in mentions if group.end() <= pos < next_start]
+        if following:
+            law_name = following[0]
+        elif before:
+            law_name = before[-1]
+        else:
+            law_name = after[0]
+
+        group_text = group.group(0)
+        ranges = list(ARTICLE_RANGE_PATTERN.finditer(group_text))
+        for m in ranges:
+            start, end = int(m.group(1)), int(m.group(2))
+            citations.append((law_name, min(start, end), max(start, end)))
+        # Các số điều đơn lẻ không thuộc khoảng nào
+        singles = ARTICLE_RANGE_PATTERN.sub(" ", group_text)
+        for num in re.findall(r"\d+", singles):
+            citations.append((law_name, int(num), int(num)))
+
+    return citations
+
+class LawIndex:
+    """Chỉ mục băm cho metadata: (law_name, article) -> vị trí chunk, xây dựng một lần.
+
+    Kèm chỉ mục phụ theo từng luật (danh sách số điều đã sắp xếp) để tra cứu khoảng điều.
+    """
+
+    def __init__(self, metas: List[dict]):
+        self.by_key: Dict[Tuple[str, str], List[int]] = {}
+        for idx, meta in enumerate(metas):
+            self.by_key.setdefault((meta["law_name"], meta["article"]), []).append(idx)
+
+        by_law: Dict[str, set] = {}
+        for law_name, article in self.by_key:
+            if article.isdigit():
+                by_law.setdefault(law_name, set()).add(int(article))
+        self.by_law: Dict[str, List[int]] = {law: sorted(nums) for law, nums in by_law.items()}
+
+    def lookup(self, law_name: str, article: str) -> List[int]:
+        return self.by_key.get((law_name, str(article)), [])
+
+    def lookup_range(self, law_name: str, start: int, end: int) -> List[int]:
+        articles = self.by_law.get(law_name, [])
+        lo = bisect_left(articles, start)
+        hi = bisect_right(articles, end)
+        indices = []
+        for article in articles[lo:hi]:
+            indices.extend(self.by_key[(law_name, str(article))])
+        return indices
+
+    def lookup_citations(self, citations: List[Tuple[str, int, int]]) -> List[int]:
+        """Tra cứu nhiều trích dẫn trong một lần, giữ thứ tự và loại bỏ trùng lặp"""
+        seen = set()
+        indices = []
+        for law_name, start, end in citations:
+            if start == end:
+                found = self.lookup(law_name, start)
+            else:
+                found = self.lookup_range(law_name, start, end)
+            for idx in found:
+                if idx not in seen:
+                    seen.add(idx)
+                    indices.append(idx)
+        return indices
 
 class LawIndexRetriever(BaseRetriever):
-    docs: Any = Field(...)
-    metas: Any = Field(...)
+    doc_store: Any = Field(...)
+    index: Any = Field(...)
+    max_documents: int = Field(default=10)
 
-    def __init__(self, doc_path: str, meta_path: str):
-        with open(doc_path, "r", encoding="utf-8") as f:
-            docs = json.load(f)
-        with open(meta_path, "r", encoding="utf-8") as f:
-            metas = json.load(f)
-        super().__init__(docs = docs, metas = metas)
+    def __init__(self, doc_store, max_documents: int = 10):
+        # Chỉ giữ chỉ mục (luật, điều); nội dung đọc từ DocStore khi cần
+        index = LawIndex([{"law_name": meta["law_name"], "article": meta["article"]} for meta in doc_store.metas()])
+        super().__init__(doc_store=doc_store, index=index, max_documents=max_documents)
 
     def _get_relevant_documents(self, query: str) -> List[Document]:
-        law_name, article_num = extract_law_name_and_article(query)
-        # print(law_name, article_num)
-        if not law_name or not article_num:
+        citations = extract_law_citations(query)
+        # print(citations)
+        if not citations:
             return []  # Không tìm thấy thông tin đầy đủ
 
-        for i in range(len(self.metas)):
-            meta = self.metas[i]
-            if meta["law_name"] == law_name and meta["article"] == article_num:
-                content = self.docs[i]
-                return [Document(page_content=content, metadata={"corpus_id": f"corpus_{i}", **meta})]
-
-        return []  # Không tìm thấy tài liệu phù hợp
+        indices = self.index.lookup_citations(citations)[:self.max_documents]
+        return [
+            Document(page_content=self.doc_store.text(i), metadata={"corpus_id": self.doc_store.corpus_id(i), **self.doc_store.meta(i)})
+            for i in indices
+        ]
@@ -0,0 +1,260 @@
+import time
+import asyncio
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from langchain_core.runnables import Runnable, RunnableConfig
+from handle_ratelimit import returns_runnable
+
+class LatencyStats:
+    """Latency of one backend for one chain: EWMA plus a window of recent samples for the hedge deadline"""
+
+    def __init__(self, alpha: float = 0.1, window: int = 200, clock: Callable[[], float] = time.monotonic):
+        self.alpha = alpha
+        self.ewma = None
+        self.samples = deque(maxlen=window)
+        self.clock = clock
+        # last sample (or probe), see LatencyRouter.order
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+            self.samples.append(seconds)
+            self.updated = self.clock()
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            return float(np.percentile(self.samples, q))
+
+class LatencyRouter:
+    """
+    Shared state of latency-aware routing between LLM backends (e.g. "gemini", "vllm").
+
+    Tracks a time-decayed error rate per backend: a backend failing more than `error_threshold` of
+    its recent calls is unhealthy and only tried after the healthy ones; with no new failures the
+    rate halves every `error_half_life` seconds, so it gets traffic again. Healthy backends are ranked
+    by expected time to a successful reply, EWMA latency / (1 - error rate). A backend, healthy or
+    not, that has not answered for `probe_interval` seconds gets the next call, so neither one slow
+    reply nor a burst of errors locks it out for long.
+
+    Latencies are tracked per chain by RouterRunnable, since a one-word grader and a 1500-token
+    answer differ by far more than the backends do. Calls run on a shared thread pool so a slow one
+    can be hedged. Until a backend has `min_samples` latencies for a chain, its hedge deadline is
+    that of another backend with enough samples, else `default_hedge_delay`, so a backend hanging
+    on its first calls or on a probe is still hedged.
+    """
+
+    def __init__(
+        self,
+        backends: List[str],
+        hedge_quantile: float = 95.0,
+        min_samples: int = 20,
+        default_hedge_delay: Optional[float] = 10.0,
+        alpha: float = 0.1,
+        error_threshold: float = 0.5,
+        error_half_life: float = 30.0,
+        probe_interval: float = 10.0,
+        max_workers: int = 32,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backends = list(backends)
+        # None disables hedging
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.default_hedge_delay = default_hedge_delay
+        self.alpha = alpha
+        self.error_threshold = error_threshold
+        self.error_half_life = error_half_life
+        self.probe_interval = probe_interval
+        self.clock = clock
+        self._errors = {backend: (0.0, clock()) for backend in self.backends}
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.calls = {backend: 0 for backend in self.backends}
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def error_rate(self, backend: str, now: Optional[float] = None) -> float:
+        rate, updated = self._errors[backend]
+        now = self.clock() if now is None else now
+        return rate * 0.5 ** ((now - updated) / self.error_half_life)
+
+    def record(self, backend: str, failed: bool) -> None:
+        with self._lock:
+            now = self.clock()
+            rate = self.alpha * float(failed) + (1 - self.alpha) * self.error_rate(backend, now)
+            self._errors[backend] = (rate, now)
+            self.calls[backend] += 1
+
+    def record_hedge(self, won: bool = False) -> None:
+        """A call was duplicated to a second backend (`won`: and that backend answered first)"""
+        with self._lock:
+            if won:
+                self.hedge_wins += 1
+            else:
+                self.hedges += 1
+
+    def order(self, latencies: Dict[str, LatencyStats]) -> List[str]:
+        """Backends to try for one call, best first (backends not measured yet rank first, so they get measured)"""
+        now = self.clock()
+        errors = {backend: self.error_rate(backend, now) for backend in latencies}
+        order = sorted(
+            latencies,
+            key=lambda backend: (
+                errors[backend] > self.error_threshold,
+                # never answered, only failed: after the measured backends
+                latencies[backend].ewma is None and errors[backend] > 0,
+                (latencies[backend].ewma or 0.0) / max(1.0 - errors[backend], 0.05),
+            ),
+        )
+        with self._lock:
+            for backend in order[1:]:
+                if now - latencies[backend].updated > self.probe_interval:
+                    latencies[backend].updated = now
+                    order.remove(backend)
+                    return [backend] + order
+        return order
+
+    def hedge_delay(self, latencies: Dict[str, LatencyStats], backend: str) -> Optional[float]:
+        """Seconds to wait for `backend` before hedging the call (None: never hedge)"""
+        if self.hedge_quantile is None:
+            return None
+        if len(latencies[backend].samples) >= self.min_samples:
+            return latencies[backend].percentile(self.hedge_quantile)
+        measured = [
+            stats.percentile(self.hedge_quantile)
+            for other, stats in latencies.items()
+            if other != backend and len(stats.samples) >= self.min_samples
+        ]
+        return min(measured) if measured else self.default_hedge_delay
+
+class RouterRunnable(Runnable):
+    """
+    The same chain on several backends, each call sent to the fastest healthy one.
+
+    If that backend has not answered by its `hedge_quantile` latency (for this chain), the call is
+    duplicated to the next backend and the first reply wins; the slower call finishes in the
+    background and still updates the statistics. A failure moves the call to the next backend, as
+    `with_fallbacks` did. Methods returning a new runnable, such as `with_structured_output`, are
+    applied to every backend and keep this chain's statistics.
+    """
+
+    def __init__(self, router: LatencyRouter, backends: Dict[str, Runnable], latencies: Optional[Dict[str, LatencyStats]] = None):
+        self.router = router
+        self.backends = backends
+        self.latencies = latencies or {backend: LatencyStats(router.alpha, clock=router.clock) for backend in backends}
+
+    @property
+    def InputType(self):
+        return next(iter(self.backends.values())).InputType
+
+    @property
+    def OutputType(self):
+        return next(iter(self.backends.values())).OutputType
+
+    def _call(self, backend: str, input: Any, config: Optional[RunnableConfig], kwargs: dict) -> Any:
+        start = time.perf_counter()
+        try:
+            result = self.backends[backend].invoke(input, config, **kwargs)
+        except Exception:
+            self.router.record(backend, failed=True)
+            raise
+        self.latencies[backend].record(time.perf_counter() - start)
+        self.router.record(backend, failed=False)
+        return result
+
+    async def _acall(self, backend: str, input: Any, config: Optional[RunnableConfig], kwargs: dict) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await self.backends[backend].ainvoke(input, config, **kwargs)
+        except Exception:
+            self.router.record(backend, failed=True)
+            raise
+        self.latencies[backend].record(time.perf_counter() - start)
+        self.router.record(backend, failed=False)
+        return result
+
+    def _submit(self, backend: str, input: Any, config: Optional[RunnableConfig], kwargs: dict) -> Future:
+        # in a copy of the caller's context, as RunnableParallel does, so callbacks and tracing follow the call
+        return self.router.executor.submit(contextvars.copy_context().run, self._call, backend, input, config, kwargs)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        order = self.router.order(self.latencies)
+        primary = order.pop(0)
+        pending = {self._submit(primary, input, config, kwargs): primary}
+        hedge_delay = self.router.hedge_delay(self.latencies, primary) if order else None
+        hedged = False
+        first_error = None
+        while pending:
+            done, _ = wait(pending, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # the primary is past its usual latency: duplicate the call, the first reply wins
+                hedge_delay, hedged = None, True
+                self.router.record_hedge()
+                backend = order.pop(0)
+                pending[self._submit(backend, input, config, kwargs)] = backend
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                if future.exception() is None:
+                    if hedged and backend != primary:
+                        self.router.record_hedge(won=True)
+                    return future.result()
+                first_error = first_error or future.exception()
+            if not pending and order:
+                # after a failure the remaining backends are plain fallbacks
+                hedge_delay = None
+                backend = order.pop(0)
+                pending[self._submit(backend, input, config, kwargs)] = backend
+        raise first_error
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        order = self.router.order(self.latencies)
+        primary = order.pop(0)
+        pending = {asyncio.ensure_future(self._acall(primary, input, config, kwargs)): primary}
+        hedge_delay = self.router.hedge_delay(self.latencies, primary) if order else None
+        hedged = False
+        first_error = None
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedge_delay, hedged = None, True
+                self.router.record_hedge()
+                backend = order.pop(0)
+                pending[asyncio.ensure_future(self._acall(backend, input, config, kwargs))] = backend
+                continue
+            for task in done:
+                backend = pending.pop(task)
+                if task.exception() is None:
+                    if hedged and backend != primary:
+                        self.router.record_hedge(won=True)
+                    return task.result()
+                first_error = first_error or task.exception()
+            if not pending and order:
+                hedge_delay = None
+                backend = order.pop(0)
+                pending[asyncio.ensure_future(self._acall(backend, input, config, kwargs))] = backend
+        raise first_error
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or name in ("router", "backends", "latencies"):
+            raise AttributeError(name)
+        attr = getattr(next(iter(self.backends.values())), name)
+        if returns_runnable(attr):
+
+            @wraps(attr)
+            def wrapped(*args: Any, **kwargs: Any) -> Any:
+                return RouterRunnable(
+                    self.router,
+                    {backend: getattr(runnable, name)(*args, **kwargs) for backend, runnable in self.backends.items()},
+                    self.latencies,
+                )
+
+            return wrapped
+        return attr
@@ -0,0 +1,368 @@
+from typing import Dict, List, Tuple, Any, Optional
+import numpy as np
+from qdrant_client import models
+from qdrant_client.http.models import QueryResponse, ScoredPoint, Record
+from handle_corpus import load_corpus_embeddings, load_corpus_documents, build_payload, chunk_corpus_ids, point_id
+
+# Same constant as Qdrant's RRF: score = 1 / (RRF_K + position)
+RRF_K = 2
+# Candidate-scan modes of a vector lane; "matryoshka-<dims>" (e.g. matryoshka-32) scans a dims prefix
+QUANTIZATION_MODES = ("none", "int8", "binary", "matryoshka-32", "matryoshka-64")
+# Rows of int8 codes widened to float32 at a time during a scan
+INT8_BLOCK_ROWS = 16384
+
+def rrf_fusion(rankings: List[List[int]], limit: int) -> List[Tuple[int, float]]:
+    """
+    Reciprocal rank fusion of several ranked id lists, matching Qdrant's RRF scoring and tie order.
+
+    Args:
+        rankings: list of ranked point ids, best first
+        limit: number of fused results to keep
+
+    Returns:
+        List of (point id, fused score), best first
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for pos, point_id in enumerate(ranking):
+            scores[point_id] = scores.get(point_id, 0.0) + 1 / (RRF_K + pos)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+def top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the `limit` highest scores along the last axis, best first"""
+    limit = min(limit, scores.shape[-1])
+    candidates = np.argpartition(-scores, limit - 1, axis=-1)[..., :limit]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def is_normalized(vectors: np.ndarray) -> bool:
+    return bool(np.allclose(np.linalg.norm(vectors, axis=-1), 1.0, atol=1e-5))
+
+def popcount64(x: np.ndarray) -> np.ndarray:
+    """Set bits of each uint64 (SWAR bit counting, for numpy < 2.0 which has no bitwise_count)"""
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+def pack_bits(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits of each vector packed into uint64 words (zero-padded), shape (n, words)"""
+    packed = np.packbits(vectors > 0, axis=-1)
+    padding = -packed.shape[-1] % 8
+    if padding:
+        packed = np.pad(packed, [(0, 0)] * (packed.ndim - 1) + [(0, padding)])
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+def hamming_distances(columns: np.ndarray, query_words: np.ndarray) -> np.ndarray:
+    """Hamming distance between one packed query and every row of column-major codes (words, n)"""
+    distances = np.zeros(columns.shape[1], dtype=np.int32)
+    for column, word in zip(columns, query_words):
+        diff = np.bitwise_xor(column, word)
+        distances += np.bitwise_count(diff) if hasattr(np, "bitwise_count") else popcount64(diff).astype(np.int32)
+    return distances
+
+class QuantizedVectors:
+    """
+    Compressed copy of a normalized vector matrix, used only to pick candidates.
+
+    int8: per-dimension symmetric scalar quantization (4x smaller), scores are approximate dot products.
+    binary: one sign bit per dimension (32x smaller), scores are negated Hamming distances.
+    """
+
+    def __init__(self, matrix: np.ndarray, mode: str):
+        if mode not in ("int8", "binary"):
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.mode = mode
+        if mode == "int8":
+            self.scale = (np.abs(matrix).max(axis=0) / 127).astype(np.float32)
+            self.scale[self.scale == 0] = 1.0
+            self.codes = np.round(matrix / self.scale).astype(np.int8)
+        else:
+            # Column-major words: each XOR/popcount pass runs over one contiguous array
+            self.codes = np.ascontiguousarray(pack_bits(matrix).T)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Approximate scores of each query against every row, higher is better"""
+        if self.mode == "int8":
+            scores = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+            scaled = queries * self.scale
+            for start in range(0, len(self.codes), INT8_BLOCK_ROWS):
+                block = self.codes[start:start + INT8_BLOCK_ROWS].astype(np.float32)
+                scores[:, start:start + len(block)] = scaled @ block.T
+        else:
+            scores = np.empty((len(queries), self.codes.shape[1]), dtype=np.float32)
+            for row, query_words in enumerate(pack_bits(queries)):
+                scores[row] = -hamming_distances(self.codes, query_words)
+        return scores
+
+class TruncatedVectors:
+    """
+    Matryoshka prefix of a normalized vector matrix: the first `dims` dimensions, re-normalized.
+    Embeddings trained with a Matryoshka objective keep most of their ranking quality in the prefix,
+    so a 32/64-dim scan is a cheap first stage before rescoring on the full vectors.
+    """
+
+    def __init__(self, matrix: np.ndarray, dims: int):
+        if not 0 < dims < matrix.shape[1]:
+            raise ValueError(f"Matryoshka prefix of {dims} dims for {matrix.shape[1]}-dim vectors")
+        self.mode = f"matryoshka-{dims}"
+        self.dims = dims
+        self.codes = np.ascontiguousarray(normalize(np.asarray(matrix[:, :dims], dtype=np.float32)))
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        return normalize(queries[:, :self.dims]) @ self.codes.T
+
+def build_coarse_vectors(matrix: np.ndarray, mode: str):
+    """Candidate-scan copy of a vector lane for one of QUANTIZATION_MODES"""
+    if mode.startswith("matryoshka-"):
+        return TruncatedVectors(matrix, int(mode.split("-", 1)[1]))
+    return QuantizedVectors(matrix, mode)
+
+def merge_filters(parent: Optional[models.Filter], child: Optional[models.Filter]) -> Optional[models.Filter]:
+    """A prefetch is restricted by its own filter and by the filter of the query containing it"""
+    if parent is None:
+        return child
+    if child is None:
+        return parent
+    return models.Filter(must=[parent, child])
+
+def filter_key(query_filter: Optional[models.Filter]) -> str:
+    return query_filter.model_dump_json() if query_filter is not None else ""
+
+class NumpySearchClient:
+    """
+    In-process drop-in for the subset of QdrantClient used by FusionRetriever.
+
+    Every named vector is held as one contiguous, L2-normalized float32 matrix, so cosine
+    search is a single matmul and RRF fusion runs locally without a network round-trip.
+    Already normalized float32 matrices (e.g. the memory-mapped .npy exports) are used as-is.
+    Results carry the point id of each row, `ids[row]` (the row index when `ids` is None); with
+    the corpus point ids they match the Qdrant collection built by initialize_qdrant_collection.
+
+    A lane listed in `quantization` ("int8", "binary" or "matryoshka-<dims>") is scanned on its
+    compressed copy instead: the best `limit * oversampling` candidates (or a fixed `funnel_size`)
+    are then rescored exactly on the float matrix, which for a memory-mapped export is only read
+    for those rows.
+    """
+
+    def __init__(
+        self,
+        vectors: Dict[str, Any],
+        payloads: List[dict],
+        quantization: Optional[Dict[str, str]] = None,
+        oversampling: float = 4.0,
+        funnel_size: Optional[int] = None,
+        ids: Optional[List[Any]] = None
+    ):
+        self.vectors = {}
+        for name, matrix in vectors.items():
+            matrix = np.asarray(matrix, dtype=np.float32)
+            self.vectors[name] = np.ascontiguousarray(matrix if is_normalized(matrix) else normalize(matrix))
+        self.coarse = {
+            name: build_coarse_vectors(self.vectors[name], mode)
+            for name, mode in (quantization or {}).items()
+            if mode != "none"
+        }
+        self.oversampling = oversampling
+        self.funnel_size = funnel_size
+        self.payloads = payloads
+        self.ids = ids
+        self._rows = {point_id: row for row, point_id in enumerate(ids)} if ids is not None else None
+        self._payload_columns: Dict[str, np.ndarray] = {}
+        self._biases: Dict[str, np.ndarray] = {}
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return True
+
+    def _payload_column(self, key: str) -> np.ndarray:
+        if key not in self._payload_columns:
+            column = np.empty(len(self.payloads), dtype=object)
+            column[:] = [payload.get(key) for payload in self.payloads]
+            self._payload_columns[key] = column
+        return self._payload_columns[key]
+
+    def _condition_mask(self, condition: Any) -> np.ndarray:
+        if isinstance(condition, models.Filter):
+            return self._filter_mask(condition)
+        if isinstance(condition, models.FieldCondition) and condition.match is not None:
+            column = self._payload_column(condition.key)
+            if isinstance(condition.match, models.MatchValue):
+                return column == condition.match.value
+            if isinstance(condition.match, models.MatchAny):
+                return np.isin(column, condition.match.any)
+        raise NotImplementedError(f"Unsupported condition for NumpySearchClient: {condition!r}")
+
+    def _filter_mask(self, query_filter: models.Filter) -> np.ndarray:
+        mask = np.ones(len(self.payloads), dtype=bool)
+        for condition in query_filter.must or []:
+            mask &= self._condition_mask(condition)
+        if query_filter.should:
+            mask &= np.logical_or.reduce([self._condition_mask(c) for c in query_filter.should])
+        for condition in query_filter.must_not or []:
+            mask &= ~self._condition_mask(condition)
+        return mask
+
+    def _get_bias(self, key: str, query_filter: models.Filter) -> np.ndarray:
+        """0 for points matching the filter and -inf otherwise, cached per distinct filter"""
+        if key not in self._biases:
+            self._biases[key] = np.where(self._filter_mask(query_filter), 0.0, -np.inf).astype(np.float32)
+        return self._biases[key]
+
+    def _plan(self, query: Any, using: Optional[str], prefetch: Any, limit: int, query_filter: Optional[models.Filter], leaves: list) -> tuple:
+        """Flatten a (nested) query into plain vector searches appended to `leaves`"""
+        if prefetch is None:
+            leaves.append((using, query, limit, query_filter))
+            return ("search", len(leaves) - 1, limit)
+
+        prefetches = prefetch if isinstance(prefetch, list) else [prefetch]
+        children = [
+            self._plan(p.query, p.using, p.prefetch, p.limit, merge_filters(query_filter, p.filter), leaves)
+            for p in prefetches
+        ]
+        if isinstance(query, models.FusionQuery) and query.fusion == models.Fusion.RRF:
+            return ("rrf", children, limit)
+        raise NotImplementedError(f"Unsupported query for NumpySearchClient: {query!r}")
+
+    def _search_leaves(self, leaves: list) -> List[List[Tuple[int, float]]]:
+        """Run all plain vector searches, scanning each named vector once with a single matmul"""
+        results = [None] * len(leaves)
+        by_vector: Dict[str, List[int]] = {}
+        for i, (using, _, _, _) in enumerate(leaves):
+            by_vector.setdefault(using, []).append(i)
+
+        keys: Dict[int, str] = {}
+        for using, rows in by_vector.items():
+            query_matrix = normalize(np.asarray([leaves[i][1] for i in rows], dtype=np.float32))
+            coarse = self.coarse.get(using)
+            scores = coarse.scores(query_matrix) if coarse is not None else query_matrix @ self.vectors[using].T
+            for row, i in enumerate(rows):
+                query_filter = leaves[i][3]
+                if query_filter is not None:
+                    if id(query_filter) not in keys:
+                        keys[id(query_filter)] = filter_key(query_filter)
+                    scores[row] += self._get_bias(keys[id(query_filter)], query_filter)
+
+            limit = max(leaves[i][2] for i in rows)
+            if coarse is not None:
+                ids, top_scores = self._rescore(using, query_matrix, scores, limit)
+            else:
+                ids = top_k(scores, limit)
+                top_scores = np.take_along_axis(scores, ids, axis=-1)
+            for row, i in enumerate(rows):
+                limit = leaves[i][2]
+                results[i] = [
+                    (point_id, score)
+                    for point_id, score in zip(ids[row, :limit].tolist(), top_scores[row, :limit].tolist())
+                    if score != -np.inf
+                ]
+        return results
+
+    def _rescore(self, using: str, query_matrix: np.ndarray, approximate: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact float scores for the candidates of the coarse scan, best `limit` first"""
+        funnel = self.funnel_size if self.funnel_size else int(limit * self.oversampling)
+        candidates = top_k(approximate, max(limit, funnel))
+        exact = np.einsum("qd,qkd->qk", query_matrix, self.vectors[using][candidates])
+        # Candidates excluded by a filter keep their -inf
+        exact[np.take_along_axis(approximate, candidates, axis=-1) == -np.inf] = -np.inf
+        order = top_k(exact, limit)
+        return np.take_along_axis(candidates, order, axis=-1), np.take_along_axis(exact, order, axis=-1)
+
+    def _evaluate(self, node: tuple, leaf_results: List[List[Tuple[int, float]]]) -> List[Tuple[int, float]]:
+        if node[0] == "search":
+            return leaf_results[node[1]]
+        _, children, limit = node
+        rankings = [[point_id for point_id, _ in self._evaluate(child, leaf_results)] for child in children]
+        return rrf_fusion(rankings, limit)
+
+    def _to_response(self, results: List[Tuple[int, float]], with_payload: bool) -> QueryResponse:
+        return QueryResponse(points=[
+            ScoredPoint(
+                id=self.ids[row] if self.ids is not None else row,
+                version=0,
+                score=score,
+                payload=self.payloads[row] if with_payload else None,
+            )
+            for row, score in results
+        ])
+
+    def query_points(
+        self,
+        collection_name: str,
+        query: Any = None,
+        using: Optional[str] = None,
+        prefetch: Any = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: bool = True,
+        limit: int = 10,
+        **kwargs,
+    ) -> QueryResponse:
+        leaves = []
+        plan = self._plan(query, using, prefetch, limit, query_filter, leaves)
+        return self._to_response(self._evaluate(plan, self._search_leaves(leaves)), with_payload)
+
+    def retrieve(self, collection_name: str, ids: List[Any], with_payload: bool = True, **kwargs) -> List[Record]:
+        rows = [self._rows[point_id] for point_id in ids] if self._rows is not None else ids
+        return [
+            Record(id=point_id, payload=self.payloads[row] if with_payload else None)
+            for point_id, row in zip(ids, rows)
+        ]
+
+    def query_batch_points(self, collection_name: str, requests: List[models.QueryRequest], **kwargs) -> List[QueryResponse]:
+        # Plan every request first so each vector space is scanned once for the whole batch
+        leaves = []
+        plans = [
+            self._plan(request.query, request.using, request.prefetch, request.limit, request.filter, leaves)
+            for request in requests
+        ]
+        leaf_results = self._search_leaves(leaves)
+        return [
+            self._to_response(self._evaluate(plan, leaf_results), bool(request.with_payload))
+            for plan, request in zip(plans, requests)
+        ]
+
+def get_numpy_search_client(
+    vector_name_1: str,
+    vector_name_2: str,
+    doc_store: Any = None,
+    quantization: Optional[Dict[str, str]] = None,
+    oversampling: float = 4.0,
+    funnel_size: Optional[int] = None
+) -> NumpySearchClient:
+    """
+    Load the corpus embeddings and payloads into an in-process search client.
+    With a DocStore, payloads are read from it on demand instead of being held per process.
+    `quantization` maps vector names to one of QUANTIZATION_MODES.
+    """
+    corpus_embeddings_1, corpus_embeddings_2 = load_corpus_embeddings()
+    if doc_store is not None:
+        payloads = doc_store
+        ids = [doc_store.point_id(idx) for idx in range(len(doc_store))]
+    else:
+        all_docs, all_doc_metas = load_corpus_documents()
+        corpus_ids = chunk_corpus_ids(all_doc_metas)
+        payloads = [build_payload(corpus_id, doc, meta) for corpus_id, doc, meta in zip(corpus_ids, all_docs, all_doc_metas)]
+        ids = [point_id(corpus_id) for corpus_id in corpus_ids]
+    return NumpySearchClient(
+        vectors={
+            vector_name_1: corpus_embeddings_1,
+            vector_name_2: corpus_embeddings_2,
+        },
+        payloads=payloads,
+        quantization=quantization,
+        oversampling=oversampling,
+        funnel_size=funnel_size,
+        ids=ids,
+    )
@@ -0,0 +1,118 @@
+"""
+Cập nhật collection Qdrant đang phục vụ chatbot mà không gián đoạn truy vấn.
+
+Chạy từ thư mục pythonllm:
+    python reindex.py init               # dựng collection lần đầu nếu chưa có (chạy khi khởi động gunicorn)
+    python reindex.py rebuild            # nạp collection mới, kiểm tra, chuyển alias, xoá bản cũ
+    python reindex.py rebuild --keep 1   # giữ lại bản trước đó để rollback
+    python reindex.py sync               # chỉ cập nhật các chunk thay đổi
+    python reindex.py export-embeddings  # xuất embedding .pt sang .npy (memory-mapped) + manifest
+    python reindex.py lexical            # dựng lại chỉ mục BM25 (data/lexical_index.npz) sau khi corpus thay đổi
+    python reindex.py export-datasets    # xuất lại bộ dữ liệu CSV trong dataset/processed_data sang Parquet nếu CSV đã đổi
+    python reindex.py embed              # encode lại corpus bằng embedding/output_v1, output_v2 -> .npy + manifest
+    python reindex.py embed --chunks chunks.jsonl --output-dir out/   # encode các chunk xuất bởi dataset/preprocess.py
+"""
+from dotenv import load_dotenv, find_dotenv
+load_dotenv(find_dotenv())
+import argparse
+import os
+
+from qdrant_client.models import Distance
+
+from handle_qdrant import get_qdrant_client, ensure_qdrant_collection, rebuild_qdrant_collection, sync_qdrant_collection, get_alias_target
+from handle_corpus import (
+    export_corpus_embeddings, load_corpus_documents, CORPUS_MANIFEST_PATH,
+    CORPUS_EMBEDDINGS_NPY_PATH_1, CORPUS_EMBEDDINGS_NPY_PATH_2,
+)
+from handle_dataset import export_parquet_datasets_if_stale, PARQUET_MANIFEST_PATH
+from handle_lexical import build_lexical_index, LEXICAL_INDEX_PATH
+from handle_embeddings import (
+    build_corpus_embeddings, iter_chunk_records, EMBEDDING_BUILD_DIR, EMBEDDING_MODEL_PATH_1, EMBEDDING_MODEL_PATH_2,
+)
+
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
+VECTOR_NAME_1 = "vn-law-embedding_1"
+VECTOR_NAME_2 = "vn-law-embedding_2"
+VECTOR_SIZE = 128
+VECTOR_DISTANCE = Distance.COSINE
+
+def main():
+    parser = argparse.ArgumentParser(description="Cập nhật collection Qdrant sau alias QDRANT_COLLECTION_NAME")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("init", help="Dựng collection và alias nếu chưa có collection nào (không làm gì nếu đã có)")
+    rebuild = subparsers.add_parser("rebuild", help="Blue/green: nạp collection mới rồi chuyển alias")
+    rebuild.add_argument("--keep", type=int, default=0, help="Số bản cũ giữ lại")
+    subparsers.add_parser("sync", help="Cập nhật tăng dần collection hiện tại")
+    subparsers.add_parser("export-embeddings", help="Xuất embedding corpus sang .npy + manifest")
+    subparsers.add_parser("lexical", help="Dựng lại chỉ mục BM25 của corpus")
+    export_datasets = subparsers.add_parser("export-datasets", help="Xuất bộ dữ liệu câu hỏi/corpus/qnc sang Parquet + manifest")
+    export_datasets.add_argument("--force", action="store_true", help="Xuất lại kể cả khi manifest khớp với các file CSV")
+    embed = subparsers.add_parser("embed", help="Encode corpus bằng 2 model (đa tiến trình, có checkpoint để chạy tiếp)")
+    embed.add_argument("--chunks", help="File JSONL từ dataset/preprocess.py --export-chunks ('-' = stdin); mặc định data/all_docs.json")
+    embed.add_argument("--output-dir", help="Thư mục ghi .npy + manifest (mặc định thư mục embedding/, bắt buộc khi dùng --chunks)")
+    embed.add_argument("--model-1", default=EMBEDDING_MODEL_PATH_1)
+    embed.add_argument("--model-2", default=EMBEDDING_MODEL_PATH_2)
+    embed.add_argument("--dim", type=int, default=VECTOR_SIZE)
+    embed.add_argument("--batch-size", type=int, default=256, help="Số chunk mỗi batch (sắp xếp theo độ dài)")
+    embed.add_argument("--workers", type=int, help="Số tiến trình encode (mặc định min(4, số CPU))")
+    args = parser.parse_args()
+
+    if args.command == "export-embeddings":
+        manifest = export_corpus_embeddings()
+        print(f"Exported {manifest['count']} vectors: {[f['path'] for f in manifest['files']]}, manifest: {CORPUS_MANIFEST_PATH}")
+        return
+    if args.command == "lexical":
+        lexical_index = build_lexical_index()
+        print(f"Built lexical index: {LEXICAL_INDEX_PATH} ({len(lexical_index.vocab)} terms)")
+        return
+    if args.command == "export-datasets":
+        manifest = export_parquet_datasets_if_stale(force=args.force)
+        if manifest is None:
+            print(f"Parquet datasets are up to date: {PARQUET_MANIFEST_PATH}")
+        else:
+            print(f"Exported {len(manifest['laws'])} laws to Parquet, manifest: {PARQUET_MANIFEST_PATH}")
+        return
+
+    if args.command == "embed":
+        if args.chunks:
+            if not args.output_dir:
+                parser.error("--chunks cần --output-dir để không ghi đè embedding của corpus hiện tại")
+            records = list(iter_chunk_records(args.chunks))
+            docs = [record["chunk_text"] for record in records]
+            metas = [record["metadata"] for record in records]
+            corpus_ids = [record["corpus_id"] for record in records]
+        else:
+            docs, metas = load_corpus_documents()
+            corpus_ids = None
+        output_paths = (CORPUS_EMBEDDINGS_NPY_PATH_1, CORPUS_EMBEDDINGS_NPY_PATH_2)
+        manifest_path = CORPUS_MANIFEST_PATH
+        build_dir = EMBEDDING_BUILD_DIR
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            output_paths = tuple(os.path.join(args.output_dir, os.path.basename(path)) for path in output_paths)
+            manifest_path = os.path.join(args.output_dir, os.path.basename(CORPUS_MANIFEST_PATH))
+            build_dir = os.path.join(args.output_dir, ".build")
+        manifest = build_corpus_embeddings(
+            docs, metas, output_paths, manifest_path,
+            model_paths=(args.model_1, args.model_2), corpus_ids=corpus_ids, dim=args.dim,
+            batch_size=args.batch_size, workers=args.workers, build_dir=build_dir,
+        )
+        print(f"Encoded {manifest['count']} chunks: {[f['path'] for f in manifest['files']]}, manifest: {manifest_path}")
+        return
+
+    client = get_qdrant_client(QDRANT_URL, QDRANT_API_KEY)
+    if args.command == "init":
+        if ensure_qdrant_collection(client, QDRANT_COLLECTION_NAME, VECTOR_NAME_1, VECTOR_NAME_2, VECTOR_SIZE, VECTOR_DISTANCE) is None:
+            print(f"Collection {QDRANT_COLLECTION_NAME} already exists")
+    elif args.command == "rebuild":
+        rebuild_qdrant_collection(
+            client, QDRANT_COLLECTION_NAME, VECTOR_NAME_1, VECTOR_NAME_2, VECTOR_SIZE, VECTOR_DISTANCE, keep_previous=args.keep
+        )
+    else:
+        target = get_alias_target(client, QDRANT_COLLECTION_NAME) or QDRANT_COLLECTION_NAME
+        sync_qdrant_collection(client, target, VECTOR_NAME_1, VECTOR_NAME_2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are flat and imported by name (as when run from the pythonllm directory)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,15 @@
+import pytest
+from benchmarks.retrieval import ranking_metrics
+
+def test_ranking_metrics():
+    metrics = ranking_metrics([7, 3, 9, 1], {3, 1}, ks=[1, 3, 4])
+    assert metrics["recall@1"] == 0 and metrics["mrr@1"] == 0 and metrics["ndcg@1"] == 0
+    assert metrics["recall@3"] == 0.5
+    assert metrics["mrr@3"] == 0.5
+    # one hit at rank 2 against an ideal of hits at ranks 1 and 2
+    assert metrics["ndcg@3"] == pytest.approx((1 / 1.58496) / (1 + 1 / 1.58496), abs=1e-5)
+    assert metrics["recall@4"] == 1.0
+    assert metrics["ndcg@4"] == pytest.approx((1 / 1.58496 + 1 / 2.32193) / (1 + 1 / 1.58496), abs=1e-5)
+
+def test_ranking_metrics_of_a_perfect_ranking():
+    assert ranking_metrics([4, 2, 8], {2, 4}, ks=[2]) == {"recall@2": 1.0, "mrr@2": 1.0, "ndcg@2": pytest.approx(1.0)}
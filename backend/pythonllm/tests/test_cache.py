@@ -0,0 +1,26 @@
+import sqlite3
+import numpy as np
+from handle_cache import EmbeddingCache
+
+def vectors(value: float):
+    return np.full(4, value, dtype=np.float32), np.full(4, -value, dtype=np.float32)
+
+def test_disk_tier_is_keyed_by_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    EmbeddingCache(disk_path=path, model_id="v1").put("Tội trộm cắp", vectors(1.0))
+
+    # another worker with the same models finds it on disk
+    cached = EmbeddingCache(disk_path=path, model_id="v1").get("  Tội   trộm cắp ")
+    assert cached is not None and np.array_equal(cached[0], vectors(1.0)[0])
+    # a retrained model must not get the old vectors
+    assert EmbeddingCache(disk_path=path, model_id="v2").get("Tội trộm cắp") is None
+
+def test_rows_without_model_identity_are_dropped(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, dim INTEGER, vectors BLOB)")
+    db.execute("INSERT INTO embeddings VALUES (?, ?, ?)", ("Tội trộm cắp", 4, np.stack(vectors(1.0)).tobytes()))
+    db.commit()
+    db.close()
+
+    assert EmbeddingCache(disk_path=path, model_id="v1").get("Tội trộm cắp") is None
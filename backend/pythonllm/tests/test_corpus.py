@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from handle_corpus import load_exported_embeddings, write_corpus_manifest
+
+DOCS = ["Điều 1. Phạm vi điều chỉnh", "Điều 2. Đối tượng áp dụng", "Điều 3. Giải thích từ ngữ"]
+METAS = [{"law_name": "BỘ LUẬT LAO ĐỘNG", "article": article} for article in (1, 2, 3)]
+
+@pytest.fixture
+def exported(tmp_path):
+    npy_paths = (str(tmp_path / "v1.npy"), str(tmp_path / "v2.npy"))
+    manifest_path = str(tmp_path / "manifest.json")
+    for path in npy_paths:
+        np.save(path, np.eye(len(DOCS), 4, dtype=np.float32))
+    write_corpus_manifest(DOCS, METAS, [{"path": "v1.npy", "dim": 4}, {"path": "v2.npy", "dim": 4}], path=manifest_path)
+    return npy_paths, manifest_path
+
+def test_matching_export_is_loaded(exported):
+    npy_paths, manifest_path = exported
+    matrix_1, matrix_2 = load_exported_embeddings(DOCS, METAS, npy_paths, manifest_path)
+    assert matrix_1.shape == matrix_2.shape == (3, 4)
+
+def test_stale_export_is_rejected(exported):
+    npy_paths, manifest_path = exported
+    # a chunk was edited after the export
+    with pytest.raises(ValueError, match="another corpus"):
+        load_exported_embeddings([DOCS[0], "Điều 2. (sửa đổi)", DOCS[2]], METAS, npy_paths, manifest_path)
+    # a chunk was inserted: every row after it would be off by one
+    inserted = METAS[:1] + [{"law_name": "BỘ LUẬT LAO ĐỘNG", "article": 4}] + METAS[1:]
+    with pytest.raises(ValueError, match="another corpus"):
+        load_exported_embeddings(DOCS[:1] + ["Điều 4."] + DOCS[1:], inserted, npy_paths, manifest_path)
+
+def test_vectors_not_matching_the_manifest_are_rejected(exported):
+    npy_paths, manifest_path = exported
+    np.save(npy_paths[1], np.eye(2, 4, dtype=np.float32))
+    with pytest.raises(ValueError, match="shape"):
+        load_exported_embeddings(DOCS, METAS, npy_paths, manifest_path)
+
+def test_missing_export(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_exported_embeddings(DOCS, METAS, (str(tmp_path / "v1.npy"), str(tmp_path / "v2.npy")), str(tmp_path / "manifest.json"))
@@ -0,0 +1,16 @@
+import pyarrow.dataset as ds
+import pytest
+from handle_dataset import DATASET_SCHEMAS, QNC_LAW_NAMES, load_dataset, read_csv_table
+
+@pytest.mark.parametrize("table", list(DATASET_SCHEMAS))
+def test_parquet_export_matches_the_csvs(table):
+    for prefix, law_name in QNC_LAW_NAMES.items():
+        assert load_dataset(table, laws=[law_name]).to_pydict() == read_csv_table(prefix, table).to_pydict()
+
+def test_projection_and_filter():
+    law_name = QNC_LAW_NAMES["lao-dong"]
+    rows = read_csv_table("lao-dong", "corpus").to_pylist()
+    loaded = load_dataset("corpus", columns=["corpus_id", "content"], laws=[law_name], filter=ds.field("article") == 35)
+    assert loaded.column_names == ["corpus_id", "content"]
+    assert loaded.to_pylist() == [{"corpus_id": row["corpus_id"], "content": row["content"]} for row in rows if row["article"] == 35]
+    assert loaded.num_rows > 0
@@ -0,0 +1,38 @@
+import mmap
+import pytest
+from handle_corpus import build_payload, chunk_corpus_ids, point_id
+from handle_docstore import DocStore
+
+DOCS = ["Điều 1. Phạm vi điều chỉnh", "", "Điều 2. Đối tượng áp dụng", "Điều 2. (bản hợp nhất)"]
+METAS = [
+    {"law_name": "BỘ LUẬT DÂN SỰ", "article": "1", "keywords": ["phạm vi"]},
+    {"law_name": "BỘ LUẬT DÂN SỰ", "article": "1a"},
+    {"law_name": "BỘ LUẬT HÌNH SỰ", "article": "2"},
+    {"law_name": "BỘ LUẬT HÌNH SỰ", "article": "2"},
+]
+
+@pytest.fixture
+def doc_store(tmp_path):
+    path = str(tmp_path / "doc_store.bin")
+    DocStore.build(DOCS, METAS, path, source_hash="abc")
+    return DocStore(path)
+
+def test_lookups_match_the_json_corpus(doc_store):
+    assert len(doc_store) == len(DOCS)
+    assert doc_store.source_hash == "abc"
+    for idx, (corpus_id, doc, meta) in enumerate(zip(chunk_corpus_ids(METAS), DOCS, METAS)):
+        assert doc_store.text(idx) == doc
+        assert doc_store.meta(idx) == meta
+        assert doc_store.corpus_id(idx) == corpus_id
+        assert doc_store.payload(idx) == build_payload(corpus_id, doc, meta)
+        assert doc_store.position(point_id(corpus_id)) == idx
+    assert list(doc_store.metas()) == METAS
+
+def test_unknown_point_id(doc_store):
+    with pytest.raises(KeyError):
+        doc_store.position(point_id("BỘ LUẬT LAO ĐỘNG:1"))
+
+def test_texts_are_read_from_the_mapping(doc_store):
+    # nothing is parsed at load time: the blob is mapped and the offsets are a view of the .npy file
+    assert isinstance(doc_store.blob, mmap.mmap)
+    assert not doc_store.offsets.flags.owndata
@@ -0,0 +1,125 @@
+import itertools
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+import handle_qdrant
+from handle_corpus import chunk_corpus_ids, content_hash, point_id
+from handle_qdrant import (
+    ensure_qdrant_collection,
+    get_alias_target,
+    get_stored_hashes,
+    list_collection_versions,
+    rebuild_qdrant_collection,
+    stream_upload,
+    sync_qdrant_collection,
+)
+
+ALIAS = "laws"
+VECTOR_NAME_1, VECTOR_NAME_2 = "vn-law-embedding_1", "vn-law-embedding_2"
+COUNT, DIM = 50, 8
+# local mode ignores the law_name index created by initialize_qdrant_collection
+pytestmark = pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+
+@pytest.fixture
+def client(monkeypatch):
+    """A local-mode Qdrant and a small corpus in place of backend/data and backend/embedding"""
+    rng = np.random.default_rng(0)
+    docs = [f"Điều {i}. Nội dung {i}" for i in range(COUNT)]
+    metas = [{"law_name": "BỘ LUẬT DÂN SỰ", "article": i} for i in range(COUNT)]
+    embeddings = tuple(rng.normal(size=(COUNT, DIM)).astype(np.float32) for _ in range(2))
+    monkeypatch.setattr(handle_qdrant, "load_corpus_documents", lambda: (docs, metas))
+    monkeypatch.setattr(handle_qdrant, "load_corpus_embeddings", lambda mmap=False: embeddings)
+    # versions are named after the time in ms; one second apart here
+    monkeypatch.setattr(handle_qdrant.time, "time", itertools.count(1_700_000_000).__next__)
+    return QdrantClient(location=":memory:")
+
+def build(client, **kwargs) -> str:
+    return rebuild_qdrant_collection(client, ALIAS, VECTOR_NAME_1, VECTOR_NAME_2, DIM, models.Distance.COSINE, **kwargs)
+
+def test_first_start_builds_once(client):
+    first = ensure_qdrant_collection(client, ALIAS, VECTOR_NAME_1, VECTOR_NAME_2, DIM, models.Distance.COSINE)
+    assert get_alias_target(client, ALIAS) == first
+    assert client.count(ALIAS, exact=True).count == COUNT
+    assert ensure_qdrant_collection(client, ALIAS, VECTOR_NAME_1, VECTOR_NAME_2, DIM, models.Distance.COSINE) is None
+    assert list_collection_versions(client, ALIAS) == [first]
+
+def test_rebuild_swaps_the_alias_and_deletes_old_versions(client):
+    first = build(client)
+    second = build(client)
+    assert get_alias_target(client, ALIAS) == second
+    assert list_collection_versions(client, ALIAS) == [second]
+
+    third = build(client, keep_previous=1)
+    assert get_alias_target(client, ALIAS) == third
+    assert list_collection_versions(client, ALIAS) == [second, third]
+    assert first < second < third
+
+def test_failed_smoke_check_keeps_the_serving_version(client, monkeypatch):
+    serving = build(client)
+
+    def smoke_check(*args):
+        raise RuntimeError("smoke check failed")
+
+    monkeypatch.setattr(handle_qdrant, "smoke_check", smoke_check)
+    with pytest.raises(RuntimeError):
+        build(client)
+    assert get_alias_target(client, ALIAS) == serving
+    assert list_collection_versions(client, ALIAS) == [serving]
+
+def test_plain_collection_is_replaced_by_the_alias(client):
+    client.create_collection(ALIAS, vectors_config=models.VectorParams(size=DIM, distance=models.Distance.COSINE))
+    # an existing deployment is not rebuilt on start
+    assert ensure_qdrant_collection(client, ALIAS, VECTOR_NAME_1, VECTOR_NAME_2, DIM, models.Distance.COSINE) is None
+    version = build(client)
+    assert get_alias_target(client, ALIAS) == version
+    assert client.count(ALIAS, exact=True).count == COUNT
+
+def test_stream_upload_builds_points_as_it_uploads(client, monkeypatch):
+    client.create_collection("upload", vectors_config=models.VectorParams(size=DIM, distance=models.Distance.COSINE))
+    rng = np.random.default_rng(1)
+    built = uploaded = 0
+    ahead = []
+
+    def points():
+        nonlocal built
+        for i in range(1000):
+            built += 1
+            yield models.PointStruct(id=i, vector=rng.normal(size=DIM).tolist())
+
+    upsert = client.upsert
+    failed = []
+
+    def upsert_once_failing(collection_name, points):
+        nonlocal uploaded
+        ahead.append(built - uploaded)
+        if not failed:
+            failed.append(len(points))
+            raise ConnectionError("connection reset")
+        upsert(collection_name=collection_name, points=points)
+        uploaded += len(points)
+
+    monkeypatch.setattr(client, "upsert", upsert_once_failing)
+    monkeypatch.setattr(handle_qdrant.time, "sleep", lambda seconds: None)
+    assert stream_upload(client, "upload", points(), total=1000, batch_size=50) == 1000
+    assert client.count("upload", exact=True).count == 1000
+    # local mode uploads on one connection: two batches queued and the next one being built
+    assert max(ahead) <= 3 * 50
+
+def test_sync_uploads_only_changed_chunks(client):
+    build(client)
+    docs, metas = handle_qdrant.load_corpus_documents()
+
+    def sync(docs, metas):
+        counts = sync_qdrant_collection(client, ALIAS, VECTOR_NAME_1, VECTOR_NAME_2, docs, metas)
+        assert get_stored_hashes(client, ALIAS) == {
+            point_id(corpus_id): content_hash(doc, meta)
+            for corpus_id, doc, meta in zip(chunk_corpus_ids(metas), docs, metas)
+        }
+        return counts
+
+    assert sync(docs, metas) == {"upserted": 0, "deleted": 0, "unchanged": COUNT}
+    amended = [doc + " (sửa đổi)" if 10 <= meta["article"] < 15 else doc for doc, meta in zip(docs, metas)]
+    assert sync(amended, metas) == {"upserted": 5, "deleted": 0, "unchanged": COUNT - 5}
+    # point ids do not depend on positions: dropping the first chunk moves no other point
+    assert sync(amended[1:], metas[1:]) == {"upserted": 0, "deleted": 1, "unchanged": COUNT - 1}
+    assert client.count(ALIAS, exact=True).count == COUNT - 1
@@ -0,0 +1,69 @@
+import pytest
+from handle_ratelimit import KeyScheduler, RateLimitExceeded, TokenBucket
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_bucket_refills_at_limit_per_period():
+    bucket = TokenBucket(60, period=60.0, burst=0.5, now=0.0)
+    assert bucket.capacity == 30 and bucket.rate == 1.0
+    bucket.take(30, 0.0)
+    assert bucket.available_at(1, 0.0) == 1.0
+    # never above the burst capacity however long it stays idle
+    assert bucket.available_at(30, 1000.0) == 1000.0 and bucket.level == 30
+
+def test_reserve_spreads_the_burst_then_paces_at_the_quota():
+    clock = FakeClock()
+    scheduler = KeyScheduler(["a", "b"], rpm=4, burst=0.5, clock=clock)
+    # 2 requests of burst per key, handed out in turn
+    assert [scheduler.reserve() for _ in range(4)] == [(0, 0.0), (1, 0.0), (0, 0.0), (1, 0.0)]
+    # then one request per key every 60 / 4 seconds
+    assert scheduler.reserve() == (0, 15.0)
+    assert scheduler.reserve() == (1, 15.0)
+    assert scheduler.reserve() == (0, 30.0)
+    assert scheduler.sent == [4, 3]
+
+def test_release_prefers_the_idle_key():
+    clock = FakeClock()
+    scheduler = KeyScheduler(["a", "b"], rpm=60, clock=clock)
+    assert scheduler.reserve()[0] == 0
+    assert scheduler.reserve()[0] == 1
+    scheduler.release(0)
+    assert scheduler.reserve()[0] == 0
+
+def test_tokens_per_minute_budget():
+    clock = FakeClock()
+    scheduler = KeyScheduler(["a"], rpm=60, tpm=600, burst=0.5, clock=clock)
+    assert scheduler.reserve(tokens=300) == (0, 0.0)
+    # the request bucket has room, the token bucket refills 10 tokens per second
+    assert scheduler.reserve(tokens=100) == (0, 10.0)
+
+def test_penalize_cools_the_key_down():
+    clock = FakeClock()
+    scheduler = KeyScheduler(["a", "b"], rpm=60, burst=0.5, cooldown=20.0, max_wait=30.0, clock=clock)
+    scheduler.penalize(0, retry_after=5.0)
+    assert scheduler.reserve() == (1, 0.0)
+    scheduler.release(1)
+
+    scheduler.penalize(1)
+    # key 0's retry delay is shorter than key 1's default cooldown
+    assert scheduler.reserve() == (0, 5.0)
+    scheduler.release(0)
+
+    clock.now = 20.0
+    assert scheduler.reserve() == (1, 0.0)
+    assert scheduler.rate_limited == [1, 1]
+
+def test_reserve_gives_up_after_max_wait():
+    clock = FakeClock()
+    scheduler = KeyScheduler(["a", "b"], rpm=60, max_wait=30.0, clock=clock)
+    scheduler.penalize(0, retry_after=40.0)
+    scheduler.penalize(1, retry_after=45.0)
+    with pytest.raises(RateLimitExceeded):
+        scheduler.reserve()
+    clock.now = 10.0
+    assert scheduler.reserve() == (0, 30.0)
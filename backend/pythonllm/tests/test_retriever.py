@@ -0,0 +1,163 @@
+import asyncio
+import statistics
+import time
+import zlib
+import numpy as np
+import pytest
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from handle_retriever import LAW_FAMILIES, FusionRetriever, LawIndex, extract_law_citations
+from handle_vector_search import NumpySearchClient
+
+def test_article_list_and_range():
+    assert extract_law_citations("Điều 35, 36 và Điều 37 Bộ luật Lao động") == [
+        ("BỘ LUẬT LAO ĐỘNG", 35, 35), ("BỘ LUẬT LAO ĐỘNG", 36, 36), ("BỘ LUẬT LAO ĐỘNG", 37, 37)
+    ]
+    assert extract_law_citations("điều 35 và 36 bộ luật dân sự") == [("BỘ LUẬT DÂN SỰ", 35, 35), ("BỘ LUẬT DÂN SỰ", 36, 36)]
+    assert extract_law_citations("Điều 35 đến Điều 40 Bộ luật Lao động") == [("BỘ LUẬT LAO ĐỘNG", 35, 40)]
+
+def test_number_after_comma_is_not_an_article():
+    # "2 người" is a count, not article 2
+    assert extract_law_citations("Điều 5, 2 người cùng thực hiện tội phạm theo Bộ luật Hình sự") == [("BỘ LUẬT HÌNH SỰ", 5, 5)]
+    assert extract_law_citations("Theo Bộ luật Dân sự, điều 10 và 3 người thừa kế") == [("BỘ LUẬT DÂN SỰ", 10, 10)]
+    # "2019" is the year of the code, not article 2019
+    assert extract_law_citations("Điều 35, 2019 Bộ luật lao động") == [("BỘ LUẬT LAO ĐỘNG", 35, 35)]
+    assert extract_law_citations("Điều 35, 36 Bộ luật lao động") == [("BỘ LUẬT LAO ĐỘNG", 35, 35), ("BỘ LUẬT LAO ĐỘNG", 36, 36)]
+
+LAWS = [law_name for family in LAW_FAMILIES.values() for law_name in family]
+FAMILY_OF = {law_name: key for key, family in LAW_FAMILIES.items() for law_name in family}
+PER_LAW, DIM = 40, 16
+ROUND_TRIP = 0.02
+
+class RemoteSearchClient:
+    """NumpySearchClient behind a fixed network round-trip per call, as a Qdrant server would be"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def query_points(self, *args, **kwargs):
+        time.sleep(ROUND_TRIP)
+        return self.client.query_points(*args, **kwargs)
+
+    def query_batch_points(self, *args, **kwargs):
+        time.sleep(ROUND_TRIP)
+        return self.client.query_batch_points(*args, **kwargs)
+
+@pytest.fixture(scope="module")
+def fan_out_setup():
+    """Every law in LAW_FAMILIES; civil-law chunks all lie close to the query"""
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=DIM)
+    vectors, payloads = [], []
+    for law_name in LAWS:
+        for article in range(PER_LAW):
+            near = FAMILY_OF[law_name] == "4"
+            vectors.append(query + 0.3 * rng.normal(size=DIM) if near else rng.normal(size=DIM))
+            payloads.append({"chunk_text": f"Điều {article}", "law_name": law_name, "article": article})
+    matrix = np.asarray(vectors, dtype=np.float32)
+    client = RemoteSearchClient(NumpySearchClient({"vn-law-embedding_1": matrix, "vn-law-embedding_2": matrix}, payloads))
+    retriever = FusionRetriever(client=client, embeddings_1=None, embeddings_2=None, collection_name="laws", fan_out_limit=4)
+    return retriever, query.tolist()
+
+def test_fan_out_covers_every_family_within_the_budget(fan_out_setup):
+    retriever, query = fan_out_setup
+    # one unfiltered search only finds civil law
+    assert {FAMILY_OF[doc.metadata["law_name"]] for doc in retriever.search_by_vectors(query, query)} == {"4"}
+    documents = retriever.search_fan_out(query, query, list(LAW_FAMILIES.values()))
+    assert len(documents) <= retriever.fan_out_limit
+    assert {FAMILY_OF[doc.metadata["law_name"]] for doc in documents} == set(LAW_FAMILIES)
+
+def test_fan_out_is_no_slower_than_one_search(fan_out_setup):
+    retriever, query = fan_out_setup
+
+    def median_seconds(search) -> float:
+        timings = []
+        for _ in range(9):
+            start = time.perf_counter()
+            search()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    single = median_seconds(lambda: retriever.search_by_vectors(query, query))
+    fan_out = median_seconds(lambda: retriever.search_fan_out(query, query, list(LAW_FAMILIES.values())))
+    # all families share one round-trip; sequential searches would cost one each
+    assert fan_out < single + ROUND_TRIP / 2
+
+class HashEmbeddings:
+    """Stand-in for a SentenceTransformer: a fixed vector per text, one text or a batch per call"""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+
+    def vector(self, text: str) -> np.ndarray:
+        return np.random.default_rng([self.seed, zlib.crc32(text.encode("utf-8"))]).normal(size=DIM).astype(np.float32)
+
+    def encode(self, inputs, batch_size: int = 32):
+        if isinstance(inputs, str):
+            return self.vector(inputs)
+        return np.stack([self.vector(text) for text in inputs])
+
+def test_batch_retrieve_matches_invoke():
+    rng = np.random.default_rng(1)
+    payloads = [{"chunk_text": f"Điều {i}", "law_name": LAWS[i % len(LAWS)], "article": i} for i in range(200)]
+    client = NumpySearchClient({name: rng.normal(size=(len(payloads), DIM)).astype(np.float32) for name in ("vn-law-embedding_1", "vn-law-embedding_2")}, payloads)
+    retriever = FusionRetriever(client=client, embeddings_1=HashEmbeddings(1), embeddings_2=HashEmbeddings(2), collection_name="laws")
+    questions = [f"Câu hỏi số {i}" for i in range(50)]
+    # batches of 16 leave a last batch of 2, encoded as a list like the others
+    assert retriever.batch_retrieve(questions, batch_size=16) == [retriever.invoke(question) for question in questions]
+    law_names = LAW_FAMILIES["3"]
+    batched = retriever.batch_retrieve(questions, batch_size=16, law_names=law_names)
+    assert batched == [retriever.invoke(question, law_names=law_names) for question in questions]
+    assert all(doc.metadata["law_name"] in law_names for documents in batched for doc in documents)
+
+def linear_lookup(metas, law_name, article):
+    return [idx for idx, meta in enumerate(metas) if meta["law_name"] == law_name and meta["article"] == str(article)]
+
+def test_law_index_matches_a_linear_scan():
+    rng = np.random.default_rng(2)
+    # several chunks per article, and articles such as "5a" that only an exact lookup finds
+    metas = [{"law_name": LAWS[int(rng.integers(3))], "article": str(rng.integers(1, 60)) + ("a" if i % 50 == 0 else "")} for i in range(1000)]
+    index = LawIndex(metas)
+    for law_name in LAWS[:4]:
+        for article in range(62):
+            assert index.lookup(law_name, article) == linear_lookup(metas, law_name, article)
+        assert index.lookup(law_name, "5a") == linear_lookup(metas, law_name, "5a")
+        expected = [idx for article in range(10, 21) for idx in linear_lookup(metas, law_name, article)]
+        assert index.lookup_range(law_name, 10, 20) == expected
+    citations = [(LAWS[0], 7, 7), (LAWS[1], 3, 5), (LAWS[0], 7, 7)]
+    expected = linear_lookup(metas, LAWS[0], 7) + [idx for article in (3, 4, 5) for idx in linear_lookup(metas, LAWS[1], article)]
+    assert index.lookup_citations(citations) == expected
+
+def test_async_search_matches_sync():
+    rng = np.random.default_rng(3)
+    vectors_config = {name: models.VectorParams(size=DIM, distance=models.Distance.COSINE) for name in ("vn-law-embedding_1", "vn-law-embedding_2")}
+    points = [
+        models.PointStruct(
+            id=i,
+            vector={name: rng.normal(size=DIM).tolist() for name in vectors_config},
+            payload={"chunk_text": f"Điều {i}", "law_name": LAWS[i % len(LAWS)], "article": i},
+        )
+        for i in range(200)
+    ]
+    queries = [(rng.normal(size=DIM).tolist(), rng.normal(size=DIM).tolist()) for _ in range(20)]
+    client = QdrantClient(location=":memory:")
+    client.create_collection("laws", vectors_config=vectors_config)
+    client.upsert("laws", points=points)
+    retriever = FusionRetriever(client=client, embeddings_1=None, embeddings_2=None, collection_name="laws")
+    law_families = list(LAW_FAMILIES.values())
+
+    async def search_all():
+        async_client = AsyncQdrantClient(location=":memory:")
+        await async_client.create_collection("laws", vectors_config=vectors_config)
+        await async_client.upsert("laws", points=points)
+        async_retriever = FusionRetriever(client=client, embeddings_1=None, embeddings_2=None, collection_name="laws", async_client=async_client)
+        return await asyncio.gather(
+            *(async_retriever.asearch_by_vectors(vector_1, vector_2) for vector_1, vector_2 in queries),
+            *(async_retriever.asearch_by_vectors(vector_1, vector_2, LAW_FAMILIES["5"]) for vector_1, vector_2 in queries),
+            *(async_retriever.asearch_fan_out(vector_1, vector_2, law_families) for vector_1, vector_2 in queries),
+        )
+
+    assert asyncio.run(search_all()) == (
+        [retriever.search_by_vectors(vector_1, vector_2) for vector_1, vector_2 in queries]
+        + [retriever.search_by_vectors(vector_1, vector_2, LAW_FAMILIES["5"]) for vector_1, vector_2 in queries]
+        + [retriever.search_fan_out(vector_1, vector_2, law_families) for vector_1, vector_2 in queries]
+    )
@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.runnables import RunnableLambda
+from handle_router import LatencyRouter, LatencyStats, RouterRunnable
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def measured(clock: FakeClock, *latencies: float) -> LatencyStats:
+    stats = LatencyStats(clock=clock)
+    for seconds in latencies:
+        stats.record(seconds)
+    return stats
+
+def test_order_ranks_unmeasured_backends_first():
+    clock = FakeClock()
+    router = LatencyRouter(["a", "b"], clock=clock)
+    latencies = {"a": measured(clock, 0.1), "b": measured(clock)}
+    assert router.order(latencies) == ["b", "a"]
+    # ...unless they only failed so far
+    router.record("b", failed=True)
+    assert router.order(latencies) == ["a", "b"]
+
+def test_order_by_expected_latency_and_health():
+    clock = FakeClock()
+    router = LatencyRouter(["a", "b"], error_half_life=30.0, probe_interval=1000.0, clock=clock)
+    latencies = {"a": measured(clock, 0.1), "b": measured(clock, 0.2)}
+    assert router.order(latencies) == ["a", "b"]
+    for _ in range(10):
+        router.record("a", failed=True)
+    assert router.error_rate("a") > router.error_threshold
+    assert router.order(latencies) == ["b", "a"]
+    # two half-lives later "a" is healthy again and still the faster one
+    clock.now = 60.0
+    assert router.order(latencies) == ["a", "b"]
+
+def test_order_probes_a_backend_not_heard_from():
+    clock = FakeClock()
+    router = LatencyRouter(["a", "b"], probe_interval=10.0, clock=clock)
+    latencies = {"a": measured(clock, 0.1), "b": measured(clock, 0.2)}
+    clock.now = 11.0
+    latencies["a"].record(0.1)
+    assert router.order(latencies) == ["b", "a"]
+    # one probe per interval
+    assert router.order(latencies) == ["a", "b"]
+
+def test_hedge_delay():
+    clock = FakeClock()
+    latencies = {"a": measured(clock, *[0.1] * 19, 1.1), "b": measured(clock, 0.5), "c": measured(clock, *[0.3] * 20)}
+    router = LatencyRouter(["a", "b", "c"], hedge_quantile=100.0, min_samples=20, default_hedge_delay=5.0, clock=clock)
+    assert router.hedge_delay(latencies, "a") == 1.1
+    # too few samples of its own: the quickest deadline of the measured backends
+    assert router.hedge_delay(latencies, "b") == 0.3
+    assert router.hedge_delay({"b": latencies["b"]}, "b") == 5.0
+    assert LatencyRouter(["a"], hedge_quantile=None, clock=clock).hedge_delay(latencies, "a") is None
+
+def sleeping(seconds: float, result: str) -> RunnableLambda:
+    def func(x):
+        time.sleep(seconds)
+        return result
+
+    async def afunc(x):
+        await asyncio.sleep(seconds)
+        return result
+
+    return RunnableLambda(func, afunc=afunc)
+
+def hedged_chain(primary: RunnableLambda, secondary: RunnableLambda) -> RouterRunnable:
+    """"primary" ranks first and is hedged after 10ms"""
+    clock = FakeClock()
+    router = LatencyRouter(["primary", "secondary"], hedge_quantile=50.0, min_samples=20, clock=clock)
+    latencies = {"primary": measured(clock, *[0.01] * 20), "secondary": measured(clock, *[1.0] * 20)}
+    return RouterRunnable(router, {"primary": primary, "secondary": secondary}, latencies)
+
+def test_hedged_call_returns_the_first_result():
+    chain = hedged_chain(sleeping(0.5, "primary"), sleeping(0.0, "secondary"))
+    assert chain.invoke("question") == "secondary"
+    assert (chain.router.hedges, chain.router.hedge_wins) == (1, 1)
+    assert asyncio.run(chain.ainvoke("question")) == "secondary"
+    assert (chain.router.hedges, chain.router.hedge_wins) == (2, 2)
+
+    chain = hedged_chain(sleeping(0.0, "primary"), sleeping(0.0, "secondary"))
+    assert chain.invoke("question") == "primary"
+    assert asyncio.run(chain.ainvoke("question")) == "primary"
+    assert chain.router.hedges == 0
+
+def test_failure_falls_back_to_the_next_backend():
+    def fail(x):
+        raise RuntimeError("down")
+
+    chain = hedged_chain(RunnableLambda(fail), sleeping(0.0, "secondary"))
+    assert chain.invoke("question") == "secondary"
+    assert chain.router.calls == {"primary": 1, "secondary": 1}
+    assert chain.router.error_rate("primary") > 0
+
+def test_hedge_fires_when_a_probe_hangs():
+    clock = FakeClock()
+    router = LatencyRouter(["slow", "fast"], min_samples=20, probe_interval=10.0, clock=clock)
+    probed, hang = threading.Event(), threading.Event()
+
+    def slow(x):
+        probed.set()
+        hang.wait(10)
+        return "slow"
+
+    chain = RouterRunnable(router, {"slow": RunnableLambda(slow), "fast": RunnableLambda(lambda x: "fast")})
+    chain.latencies["slow"].record(1.0)
+    clock.now = 60.0
+    for _ in range(20):
+        chain.latencies["fast"].record(0.05)
+    try:
+        # "slow" has not answered for probe_interval, so it gets the call as a probe; with one sample it
+        # has no deadline of its own and is hedged at "fast"'s
+        assert chain.invoke("question") == "fast"
+        assert probed.is_set()
+        assert (router.hedges, router.hedge_wins) == (1, 1)
+    finally:
+        hang.set()
+
+def test_calls_run_in_the_callers_context():
+    request_id = contextvars.ContextVar("request_id", default=None)
+    chain = hedged_chain(RunnableLambda(lambda x: request_id.get()), sleeping(0.0, "secondary"))
+    request_id.set("abc")
+    assert chain.invoke("question") == "abc"
+
+def test_hedge_counters_under_concurrent_calls():
+    hang = threading.Event()
+    chain = hedged_chain(RunnableLambda(lambda x: hang.wait(10) and "primary"), sleeping(0.0, "secondary"))
+    # keep "primary" ranked first while "secondary" answers
+    chain.latencies["secondary"].alpha = 0.0
+    # room for every hanging call and its hedge
+    chain.router.executor = ThreadPoolExecutor(max_workers=128)
+    try:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(chain.invoke, ["question"] * 64))
+    finally:
+        hang.set()
+    assert results == ["secondary"] * 64
+    assert (chain.router.hedges, chain.router.hedge_wins) == (64, 64)
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+from handle_corpus import point_id
+from handle_retriever import build_law_filter
+from handle_vector_search import NumpySearchClient
+
+VECTOR_NAME_1 = "vn-law-embedding_1"
+VECTOR_NAME_2 = "vn-law-embedding_2"
+LAW_NAMES = ["BỘ LUẬT DÂN SỰ", "BỘ LUẬT HÌNH SỰ", "BỘ LUẬT LAO ĐỘNG"]
+COUNT, DIM, QUERIES = 200, 16, 20
+
+@pytest.fixture(scope="module")
+def clients():
+    """The same small corpus in a local-mode Qdrant collection and in a NumpySearchClient"""
+    rng = np.random.default_rng(0)
+    vectors = {name: rng.normal(size=(COUNT, DIM)).astype(np.float32) for name in (VECTOR_NAME_1, VECTOR_NAME_2)}
+    corpus_ids = [f"{LAW_NAMES[i % len(LAW_NAMES)]}:{i}" for i in range(COUNT)]
+    payloads = [{"corpus_id": corpus_id, "law_name": LAW_NAMES[i % len(LAW_NAMES)]} for i, corpus_id in enumerate(corpus_ids)]
+    ids = [point_id(corpus_id) for corpus_id in corpus_ids]
+
+    qdrant = QdrantClient(location=":memory:")
+    qdrant.create_collection(
+        "parity",
+        vectors_config={name: models.VectorParams(size=DIM, distance=models.Distance.COSINE) for name in vectors},
+    )
+    qdrant.upsert("parity", points=[
+        models.PointStruct(id=ids[i], vector={name: matrix[i].tolist() for name, matrix in vectors.items()}, payload=payloads[i])
+        for i in range(COUNT)
+    ])
+    numpy_client = NumpySearchClient(vectors, payloads, ids=ids)
+    queries = [
+        (rng.normal(size=DIM).tolist(), rng.normal(size=DIM).tolist())
+        for _ in range(QUERIES)
+    ]
+    return qdrant, numpy_client, queries
+
+def ranked_ids(client, **query) -> list:
+    return [point.id for point in client.query_points("parity", **query).points]
+
+def rrf_query(vector_1, vector_2, law_names=None) -> dict:
+    # Same shape as FusionRetriever._build_query
+    law_filter = build_law_filter(law_names)
+    return dict(
+        prefetch=[
+            models.Prefetch(query=vector_1, using=VECTOR_NAME_1, filter=law_filter, limit=20),
+            models.Prefetch(query=vector_2, using=VECTOR_NAME_2, filter=law_filter, limit=20),
+        ],
+        query=models.FusionQuery(fusion=models.Fusion.RRF),
+        with_payload=False,
+        limit=5,
+    )
+
+def test_dense_top_k(clients):
+    qdrant, numpy_client, queries = clients
+    for vector_1, _ in queries:
+        query = dict(query=vector_1, using=VECTOR_NAME_1, with_payload=False, limit=10)
+        assert ranked_ids(numpy_client, **query) == ranked_ids(qdrant, **query)
+
+def test_hybrid_rrf_top_k(clients):
+    qdrant, numpy_client, queries = clients
+    for vector_1, vector_2 in queries:
+        assert ranked_ids(numpy_client, **rrf_query(vector_1, vector_2)) == ranked_ids(qdrant, **rrf_query(vector_1, vector_2))
+
+def test_filtered_top_k(clients):
+    qdrant, numpy_client, queries = clients
+    law_names = LAW_NAMES[:2]
+    for vector_1, vector_2 in queries:
+        dense = dict(query=vector_2, using=VECTOR_NAME_2, query_filter=build_law_filter(law_names), with_payload=False, limit=10)
+        assert ranked_ids(numpy_client, **dense) == ranked_ids(qdrant, **dense)
+        fused = rrf_query(vector_1, vector_2, law_names)
+        assert ranked_ids(numpy_client, **fused) == ranked_ids(qdrant, **fused)
+
+def test_batch_and_retrieve_match(clients):
+    qdrant, numpy_client, queries = clients
+    requests = [models.QueryRequest(**rrf_query(vector_1, vector_2, LAW_NAMES[2:])) for vector_1, vector_2 in queries]
+    expected = [[point.id for point in response.points] for response in qdrant.query_batch_points("parity", requests=requests)]
+    actual = [[point.id for point in response.points] for response in numpy_client.query_batch_points("parity", requests=requests)]
+    assert actual == expected
+
+    ids = expected[0]
+    assert [record.payload for record in numpy_client.retrieve("parity", ids=ids)] == [
+        record.payload for record in sorted(qdrant.retrieve("parity", ids=ids), key=lambda record: ids.index(record.id))
+    ]
+
+def compressed_client(numpy_client, mode: str, **kwargs) -> NumpySearchClient:
+    return NumpySearchClient(
+        numpy_client.vectors, numpy_client.payloads, ids=numpy_client.ids,
+        quantization={VECTOR_NAME_1: mode, VECTOR_NAME_2: mode}, **kwargs
+    )
+
+def scored_points(client, **query) -> list:
+    return [(point.id, point.score) for point in client.query_points("parity", **query).points]
+
+def assert_same_scored_points(actual: list, expected: list):
+    assert [point_id for point_id, _ in actual] == [point_id for point_id, _ in expected]
+    assert [score for _, score in actual] == pytest.approx([score for _, score in expected], abs=1e-5)
+
+@pytest.mark.parametrize("mode", ["int8", "binary", "matryoshka-8"])
+def test_scan_of_every_candidate_is_exact(clients, mode):
+    # with a funnel over the whole corpus, rescoring alone decides the ranking
+    _, numpy_client, queries = clients
+    compressed = compressed_client(numpy_client, mode, funnel_size=COUNT)
+    for vector_1, vector_2 in queries:
+        dense = dict(query=vector_1, using=VECTOR_NAME_1, with_payload=False, limit=10)
+        assert_same_scored_points(scored_points(compressed, **dense), scored_points(numpy_client, **dense))
+        assert ranked_ids(compressed, **rrf_query(vector_1, vector_2, LAW_NAMES[:2])) == ranked_ids(numpy_client, **rrf_query(vector_1, vector_2, LAW_NAMES[:2]))
+
+@pytest.mark.parametrize("mode, min_overlap", [("int8", 0.95), ("binary", 0.6), ("matryoshka-8", 0.6)])
+def test_oversampled_scan_is_rescored_exactly(clients, mode, min_overlap):
+    _, numpy_client, queries = clients
+    compressed = compressed_client(numpy_client, mode, oversampling=4)
+    overlap = []
+    for vector_1, _ in queries:
+        dense = dict(query=vector_1, using=VECTOR_NAME_1, query_filter=build_law_filter(LAW_NAMES[1:]), with_payload=False, limit=10)
+        expected = scored_points(numpy_client, **dense)
+        actual = scored_points(compressed, **dense)
+        # every returned score is the float score of that point, not the approximate one
+        query = np.asarray(vector_1, dtype=np.float32) / np.linalg.norm(vector_1)
+        rows = [numpy_client.ids.index(point_id) for point_id, _ in actual]
+        assert [score for _, score in actual] == pytest.approx(numpy_client.vectors[VECTOR_NAME_1][rows] @ query, abs=1e-5)
+        assert all(numpy_client.payloads[row]["law_name"] in LAW_NAMES[1:] for row in rows)
+        overlap.append(len({point_id for point_id, _ in actual} & {point_id for point_id, _ in expected}) / len(expected))
+    assert np.mean(overlap) >= min_overlap
@@ -1,14 +1,17 @@
 import os
+import argparse
+import hashlib
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from docx import Document
 import pandas as pd
 import logging
 from pathlib import Path
 import sys
-import win32com.client
-import pythoncom
 import shutil
 import re
-from typing import Generator, List, Dict, Any
+from typing import Generator, List, Dict, Any, Optional
 import json
 
 def is_running_in_notebook() -> bool:
@@ -44,6 +47,20 @@ def convert_doc_to_docx(doc_path):
         if os.path.exists(docx_path):
             return docx_path
             
+        try:
+            import win32com.client
+            import pythoncom
+        except ImportError:
+            # Không có Microsoft Word (Linux, macOS): chuyển đổi bằng LibreOffice
+            soffice = shutil.which("soffice") or shutil.which("libreoffice")
+            if soffice is None:
+                raise RuntimeError("Cần Microsoft Word (pywin32) hoặc LibreOffice để chuyển đổi file .doc")
+            subprocess.run(
+                [soffice, "--headless", "--convert-to", "docx", "--outdir", os.path.dirname(os.path.abspath(doc_path)), doc_path],
+                check=True, capture_output=True
+            )
+            return docx_path
+
         # Khởi tạo COM object
         pythoncom.CoInitialize()
         word = win32com.client.Dispatch("Word.Application")
@@ -170,36 +187,149 @@ def extract_law_metadata(file_path) -> dict:
 
     return metadata
 
-def extract_articles_with_parts(text: str) -> List[Dict[str, Any]]:
-    """Trích xuất các điều luật kèm nội dung phân tách thành các phần nhỏ (văn bản, mục số, mục con) từ văn bản"""
-    article_pattern = r'^(Đi.{1,2}u\s+\d+[.:]?[^\n]*)'
-    matches = list(re.finditer(article_pattern, text, flags=re.IGNORECASE | re.MULTILINE))
-
-    articles = []
-    for i, match in enumerate(matches):
-        start = match.end()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-        article_header = match.group(1).strip()
-        article_content = text[start:end].strip()
-
-        # Tách tiêu đề
-        article_index_match = re.match(r'^Đi.{1,2}u\s+(\d+)[.:]?[ \t\r\f\v]*(.*)', article_header, flags=re.IGNORECASE)
-        if article_index_match:
-            article_index = article_index_match.group(1)
-            article_title = article_index_match.group(2).strip()
-
-        # Phân tách nội dung bài viết thành các phần: text, item (1., 2.), subitems (a), b), ...)
-        items = []
-        lines = article_content.splitlines()
-        current_item = None
-
-        for line in lines:
+# Mẫu tiêu đề của từng cấp, áp dụng trên từng dòng. Phần "rest" (sau số thứ tự) được tách tiếp bằng
+# HEADING_TITLE_PATTERN; nếu dòng không có tiêu đề thì tiêu đề nằm ở dòng không rỗng kế tiếp
+PART_PATTERN = re.compile(r'Phần\s+thứ\s+[^\d]*', flags=re.IGNORECASE)
+CHAPTER_PATTERN = re.compile(r'Chương\s+(?P<index>[IVXLCDM\d]+)\.?(?P<rest>.*)', flags=re.IGNORECASE)
+SECTION_PATTERN = re.compile(r'Mục\s+(?P<index>\d+)\.?(?P<rest>.*)', flags=re.IGNORECASE)
+SUBSECTION_PATTERN = re.compile(r'Tiểu\s+mục\s+(?P<index>\d+)\.?(?P<rest>.*)', flags=re.IGNORECASE)
+ARTICLE_PATTERN = re.compile(r'Đi.{1,2}u\s+(?P<index>\d+)[.:]?[ \t\r\f\v]*(?P<title>.*)', flags=re.IGNORECASE)
+HEADING_TITLE_PATTERN = re.compile(r'\s*[:\-]?\s*([^\n]*)')
+ITEM_PATTERN = re.compile(r'^(\d+)\.\s+(.*)')
+SUBITEM_PATTERN = re.compile(r'^([a-zA-ZđĐ])\)\s+(.*)')
+
+PART, CHAPTER, SECTION, SUBSECTION, ARTICLE = "part", "chapter", "section", "subsection", "article"
+# Cấp con trực tiếp của từng cấp và khoá chứa chúng trong JSON (không có cấp con thì chứa "articles")
+CHILD_LEVELS = {
+    PART: (CHAPTER, "chapters"),
+    CHAPTER: (SECTION, "sections"),
+    SECTION: (SUBSECTION, "subsections"),
+}
+
+class LawParser:
+    """
+    Phân tích cấu trúc Phần > Chương > Mục > Tiểu mục > Điều > khoản > điểm trong một lượt.
+
+    Mỗi dòng được phân loại đúng một lần bằng các mẫu đã biên dịch; cây được dựng trên các khoảng
+    chỉ số dòng [lo, hi) nên không cắt hay sao chép văn bản. Kết quả giống hệt cách tách cũ bằng
+    re.finditer lồng nhau: nội dung trước tiêu đề con đầu tiên bị bỏ qua, và tiêu đề rỗng lấy
+    dòng không rỗng kế tiếp trong cùng phạm vi.
+    """
+
+    def __init__(self, text: str):
+        self.lines = text.split('\n')
+        self.kinds = [self.classify(line) for line in self.lines]
+
+    @staticmethod
+    def classify(line: str):
+        first = line[:1].lower()
+        if first == 'đ':
+            match = ARTICLE_PATTERN.match(line)
+            return (ARTICLE, match) if match else None
+        if first == 'c':
+            match = CHAPTER_PATTERN.match(line)
+            return (CHAPTER, match) if match else None
+        if first == 'm':
+            match = SECTION_PATTERN.match(line)
+            return (SECTION, match) if match else None
+        if first == 't':
+            match = SUBSECTION_PATTERN.match(line)
+            return (SUBSECTION, match) if match else None
+        if first == 'p' and PART_PATTERN.fullmatch(line):
+            return (PART, None)
+        return None
+
+    def first_line(self, lo: int, hi: int) -> int:
+        """Dòng không rỗng đầu tiên của phạm vi (cách cũ strip() đoạn văn bản nên dòng này được so khớp sau lstrip)"""
+        while lo < hi and not self.lines[lo].strip():
+            lo += 1
+        return lo
+
+    def kind(self, i: int, first: int):
+        if i == first:
+            return self.classify(self.lines[i].lstrip())
+        return self.kinds[i]
+
+    def contains(self, level: str, lo: int, hi: int, first: int) -> bool:
+        return any((kind := self.kind(i, first)) is not None and kind[0] == level for i in range(lo, hi))
+
+    def headings(self, level: str, lo: int, hi: int, first: int) -> List[tuple]:
+        """(chỉ số, tiêu đề, dòng đầu, dòng cuối của nội dung) của các tiêu đề cấp `level` trong [lo, hi)"""
+        found = []
+        i = lo
+        while i < hi:
+            kind = self.kind(i, first)
+            if kind is None or kind[0] != level:
+                i += 1
+                continue
+            if level == PART:
+                # Tiêu đề của phần luôn là dòng ngay sau dòng "Phần thứ ..."
+                if i + 1 >= len(self.lines):
+                    break
+                found.append((i, self.lines[i].strip(), self.lines[i + 1].strip(), i + 2))
+                i += 2
+                continue
+            match = kind[1]
+            rest = match.group('rest')
+            title = HEADING_TITLE_PATTERN.match(rest).group(1)
+            j = i + 1
+            while not title and j < hi:
+                rest += '\n' + self.lines[j]
+                title = HEADING_TITLE_PATTERN.match(rest).group(1)
+                j += 1
+            found.append((i, match.group('index').strip(), title.strip(), j))
+            i = j
+        return [
+            (index, title, start, found[k + 1][0] if k + 1 < len(found) else hi)
+            for k, (_, index, title, start) in enumerate(found)
+        ]
+
+    def node(self, level: str, lo: int, hi: int, first: int) -> List[Dict[str, Any]]:
+        """Các nút cấp `level` trong [lo, hi), mỗi nút chứa cấp con nếu có, nếu không thì chứa các điều"""
+        nodes = []
+        for index, title, start, end in self.headings(level, lo, hi, first):
+            child = CHILD_LEVELS.get(level)
+            node = {"type": level, "index": index, "title": title}
+            first_child = self.first_line(start, end)
+            if child and self.contains(child[0], start, end, first_child):
+                node[child[1]] = self.node(child[0], start, end, first_child)
+            else:
+                node["articles"] = self.articles(start, end, first_child)
+            nodes.append(node)
+        return nodes
+
+    def articles(self, lo: int, hi: int, first: int) -> List[Dict[str, Any]]:
+        articles = []
+        starts = [i for i in range(lo, hi) if (kind := self.kind(i, first)) is not None and kind[0] == ARTICLE]
+        for k, i in enumerate(starts):
+            match = ARTICLE_PATTERN.match(self.lines[i].strip())
+            end = starts[k + 1] if k + 1 < len(starts) else hi
+            articles.append({
+                "type": "article",
+                "index": match.group('index'),
+                "title": match.group('title').strip(),
+                "items": parse_article_items(self.lines[i + 1:end])
+            })
+        return articles
+
+    def parse(self) -> Dict[str, Any]:
+        # Toàn văn bản không được strip() như các phạm vi con
+        if self.contains(PART, 0, len(self.lines) - 1, -1):
+            return {"parts": self.node(PART, 0, len(self.lines), -1)}
+        return {"chapters": self.node(CHAPTER, 0, len(self.lines), -1)}
+
+def parse_article_items(lines: List[str]) -> List[Dict[str, Any]]:
+    """Phân tách nội dung một điều thành các phần: text, item (1., 2.), subitems (a), b), ...)"""
+    items = []
+    current_item = None
+    for raw_line in lines:
+        for line in raw_line.splitlines():
             line = line.strip()
             if not line:
                 continue
 
             # Mục chính: 1. 2. 3.
-            item_match = re.match(r'^(\d+)\.\s+(.*)', line)
+            item_match = ITEM_PATTERN.match(line)
             if item_match:
                 if current_item:
                     items.append(current_item)
@@ -212,7 +342,7 @@ def extract_articles_with_parts(text: str) -> List[Dict[str, Any]]:
                 continue
 
             # Mục con: a) b) c) d) đ) e) ...
-            subitem_match = re.match(r'^([a-zA-ZđĐ])\)\s+(.*)', line)
+            subitem_match = SUBITEM_PATTERN.match(line)
             if subitem_match and current_item:
                 current_item["subitems"].append({
                     "index": subitem_match.group(1).lower(),
@@ -234,208 +364,156 @@ def extract_articles_with_parts(text: str) -> List[Dict[str, Any]]:
                     "content": line
                 })
 
-        # Thêm mục cuối nếu đang xử lý dở
-        if current_item:
-            items.append(current_item)
-
-        articles.append({
-            "type": "article",
-            "index": article_index,
-            "title": article_title,
-            "items": items
-        })
-
-    return articles
-
-def extract_sections_with_subsections(text: str) -> List[Dict[str, Any]]:
-    """Trích xuất các mục kèm theo các tiểu mục từ văn bản"""
-    section_pattern = r'^(?P<full>Mục\s+(?P<index>\d+)\.?\s*[:\-]?\s*(?P<title>[^\n]*))'
-    subsection_pattern = r'^(?P<full>Tiểu\s+mục\s+(?P<index>\d+)\.?\s*[:\-]?\s*(?P<title>[^\n]*))'
-    sections = []
-    section_matches = list(re.finditer(section_pattern, text, flags=re.IGNORECASE | re.MULTILINE))
-
-    for j, sec_match in enumerate(section_matches):
-        section_index = sec_match.group('index').strip()
-        section_title = sec_match.group('title').strip()
-        sec_start = sec_match.end()
-        sec_end = section_matches[j + 1].start() if j + 1 < len(section_matches) else len(text)
-        section_text = text[sec_start:sec_end].strip()
-
-        subsection_matches = list(re.finditer(subsection_pattern, section_text, flags=re.IGNORECASE | re.MULTILINE))
-
-        if subsection_matches:
-            subsections = []
-            for k, sub_match in enumerate(subsection_matches):
-                subsection_index = sub_match.group('index').strip()
-                subsection_title = sub_match.group('title').strip()
-                sub_start = sub_match.end()
-                sub_end = subsection_matches[k + 1].start() if k + 1 < len(subsection_matches) else len(section_text)
-                subsection_text = section_text[sub_start:sub_end].strip()
-
-                articles = extract_articles_with_parts(subsection_text)
-                subsections.append({
-                    "type": "subsection",
-                    "index": subsection_index,
-                    "title": subsection_title,
-                    "articles": articles
-                })
-
-            sections.append({
-                "type": "section",
-                "index": section_index,
-                "title": section_title,
-                "subsections": subsections
-            })
-        else:
-            articles = extract_articles_with_parts(section_text)
-            sections.append({
-                "type": "section",
-                "index": section_index,
-                "title": section_title,
-                "articles": articles
-            })
-    return sections
-
-def extract_chapters_with_sections(text: str) -> List[Dict[str, Any]]:
-    """Trích xuất các chương kèm theo các mục con từ văn bản"""
-    chapter_pattern = r'^(?P<full>Chương\s+(?P<index>[IVXLCDM\d]+)\.?\s*[:\-]?\s*(?P<title>[^\n]*))'
-    section_pattern = r'^(?P<full>Mục\s+(?P<index>\d+)\.?\s*[:\-]?\s*(?P<title>[^\n]*))'
-    chapters = []
-    chapter_matches = list(re.finditer(chapter_pattern, text, flags=re.IGNORECASE | re.MULTILINE))
-
-    for i, chap_match in enumerate(chapter_matches):
-        chapter_index = chap_match.group('index').strip()
-        chapter_title = chap_match.group('title').strip()
-        start_pos = chap_match.end()
-        end_pos = chapter_matches[i + 1].start() if i + 1 < len(chapter_matches) else len(text)
-        chapter_text = text[start_pos:end_pos].strip()
-
-        section_matches = list(re.finditer(section_pattern, chapter_text, flags=re.IGNORECASE | re.MULTILINE))
-
-        if section_matches:
-            sections = extract_sections_with_subsections(chapter_text)
-            chapters.append({
-                "type" : "chapter",
-                "index": chapter_index,
-                "title": chapter_title,
-                "sections": sections
-            })
-        else:
-            articles = extract_articles_with_parts(chapter_text)
-            chapters.append({
-                "type" : "chapter",
-                "index": chapter_index,
-                "title": chapter_title,
-                "articles": articles
-            })
-
-    return chapters
-
-def extract_parts_with_chapters(text: str) -> List[Dict[str, Any]]:
-    """Trích xuất các phần luật kèm theo các chương từ văn bản"""
-    part_pattern = r'^(?P<full>(?P<index>Phần\s+thứ\s+[^\n\d]*)\n(?P<title>[^\n]*))'
-    chapter_pattern = r'^(?P<full>Chương\s+(?P<index>[IVXLCDM\d]+)\.?\s*[:\-]?\s*(?P<title>[^\n]*))'
-
-    parts = []
-    part_matches = list(re.finditer(part_pattern, text, flags=re.IGNORECASE | re.MULTILINE))
-
-    for i, match in enumerate(part_matches):
-        part_index = match.group('index').strip()
-        part_title = match.group('title').strip()
-        start_pos = match.end()
-        end_pos = part_matches[i + 1].start() if i + 1 < len(part_matches) else len(text)
-        part_content = text[start_pos:end_pos].strip()
-
-        chapter_matches = list(re.finditer(chapter_pattern, part_content, flags=re.IGNORECASE | re.MULTILINE))
-        if chapter_matches:
-            chapters = extract_chapters_with_sections(part_content)
-            parts.append({
-                "type": "part",
-                "index": part_index,
-                "title": part_title,
-                "chapters": chapters
-            })
-        else:
-            articles = extract_articles_with_parts(part_content)
-            parts.append({
-                "type": "part",
-                "index": part_index,
-                "title": part_title,
-                "articles": articles
-            })
-
-    return parts
+    # Thêm mục cuối nếu đang xử lý dở
+    if current_item:
+        items.append(current_item)
+    return items
 
 def extract_law_structure_and_metadata(text: str, metadata_file_path: str) -> Dict[str, Any]:
     """Trích xuất cấu trúc của luật từ văn bản"""
-    law_name = extract_law_name(text)
-    metadata = extract_law_metadata(metadata_file_path)
-
-    part_pattern = r'^(?P<full>(?P<index>Phần\s+thứ\s+[^\n\d]*)\n(?P<title>[^\n]*))'
-    part_matches = list(re.finditer(part_pattern, text, flags=re.IGNORECASE | re.MULTILINE))
-    if part_matches:
-        # Nếu có phần
-        parts = extract_parts_with_chapters(text)
-        return {
-            "law_name": law_name,
-            "metadata": metadata,
-            "parts": parts
-        }
-    else:
-        # Nếu không có phần, chỉ có chương và mục
-        chapters = extract_chapters_with_sections(text)
-        return {
-            "law_name": law_name,
-            "metadata": metadata,
-            "chapters": chapters
-        }
+    return {
+        "law_name": extract_law_name(text),
+        "metadata": extract_law_metadata(metadata_file_path),
+        **LawParser(text).parse()
+    }
 
-def process_documents(root_dir) -> tuple[list, list]:
-    """Xử lý tất cả file .doc hoặc .docx trong thư mục"""
+# Tăng khi LawParser thay đổi kết quả để các file .json cũ được xử lý lại
+PARSER_VERSION = 2
+PREPROCESS_MANIFEST = '.preprocess_manifest.json'
+
+def file_fingerprint(path: str, previous: Optional[dict] = None) -> dict:
+    """mtime, kích thước và sha1 của file; sha1 chỉ được tính lại khi mtime hoặc kích thước thay đổi"""
+    stat = os.stat(path)
+    if previous and previous["mtime_ns"] == stat.st_mtime_ns and previous["size"] == stat.st_size:
+        return previous
+    with open(path, 'rb') as f:
+        sha1 = hashlib.sha1(f.read()).hexdigest()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": sha1}
+
+def collect_documents(root_dir) -> tuple[list, list]:
+    """(file văn bản, file metadata) trong thư mục, ưu tiên .docx khi có cả .doc và .docx cùng tên"""
+    documents = {}
+    missing_metadata = []
+    for root, dirs, files in os.walk(root_dir):
+        for file in sorted(files):
+            if not file.endswith(('.doc', '.docx')) or file.startswith('~$'):
+                continue
+            file_path = os.path.join(root, file)
+            base = os.path.splitext(file_path)[0]
+            metadata_file_path = base + '-metadata.txt'
+            if not os.path.exists(metadata_file_path):
+                logging.warning(f"Không tìm thấy file metadata cho {file_path}")
+                missing_metadata.append(file_path)
+                continue
+            if base not in documents or file.endswith('.docx'):
+                documents[base] = (file_path, metadata_file_path)
+    return list(documents.values()), missing_metadata
+
+def process_document(file_path: str, metadata_file_path: str) -> float:
+    """Phân tích một văn bản và ghi file .json cạnh nó, trả về thời gian xử lý (giây)"""
+    start = time.perf_counter()
+    base = os.path.splitext(file_path)[0]
+    txt_path = base + '.txt'
+    if os.path.exists(txt_path):
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    else:
+        text = read_doc_file(file_path)
+    if not text.strip():
+        raise ValueError(f"File {file_path} không chứa nội dung văn bản")
+
+    law_structure = extract_law_structure_and_metadata(text, metadata_file_path)
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(law_structure, f, ensure_ascii=False, indent=4)
+    return time.perf_counter() - start
+
+def load_preprocess_manifest(root_dir) -> dict:
+    manifest_path = os.path.join(root_dir, PREPROCESS_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def process_documents(root_dirs, workers: Optional[int] = None, force: bool = False) -> tuple[list, list]:
+    """
+    Xử lý tất cả file .doc hoặc .docx trong một hoặc nhiều thư mục, song song trên `workers` tiến trình.
+
+    `<thư mục>/.preprocess_manifest.json` lưu dấu vân tay (mtime, kích thước, sha1) của văn bản,
+    metadata và file .txt đi kèm của mỗi file đã xử lý: file không đổi và đã có .json được bỏ qua
+    (trừ khi `force`), nên thêm một luật mới chỉ xử lý đúng file đó.
+    """
+    if isinstance(root_dirs, str):
+        root_dirs = [root_dirs]
+    manifests = {root_dir: load_preprocess_manifest(root_dir) for root_dir in root_dirs}
+    pending = {}
     processed_files = []
     failed_files = []
-    
-    for root, dirs, files in os.walk(root_dir):
-        for file in files:
-            if file.endswith(('.doc', '.docx')) and not file.startswith('~$'):
-                file_path = os.path.join(root, file)
-                metadata_file_path = file_path.split('.')[0] + '-metadata.txt'
-                if not os.path.exists(metadata_file_path):
-                    logging.warning(f"Không tìm thấy file metadata cho {file_path}")
-                    failed_files.append(file_path)
-                    continue
-
-                if file_path.split(".")[0] in processed_files:
-                    continue
-
+    skipped = 0
+    for root_dir, manifest in manifests.items():
+        documents, missing_metadata = collect_documents(root_dir)
+        failed_files.extend(missing_metadata)
+        for file_path, metadata_file_path in documents:
+            key = os.path.relpath(file_path, root_dir)
+            previous = manifest.get(key, {})
+            previous_inputs = previous.get("inputs", {})
+            inputs = [file_path, metadata_file_path, os.path.splitext(file_path)[0] + '.txt']
+            fingerprints = {
+                os.path.relpath(path, root_dir): file_fingerprint(path, previous_inputs.get(os.path.relpath(path, root_dir)))
+                for path in inputs
+                if os.path.exists(path)
+            }
+            entry = {"parser_version": PARSER_VERSION, "inputs": fingerprints}
+            unchanged = (
+                previous.get("parser_version") == PARSER_VERSION
+                and {path: fp["sha1"] for path, fp in previous_inputs.items()} == {path: fp["sha1"] for path, fp in fingerprints.items()}
+                and os.path.exists(os.path.splitext(file_path)[0] + '.json')
+            )
+            if unchanged and not force:
+                # Ghi lại mtime mới (nếu có) để lần sau không phải băm lại file
+                manifest[key] = entry
+                skipped += 1
+            else:
+                pending[file_path] = (metadata_file_path, manifest, key, entry)
+
+    def record(file_path, seconds=None, error=None):
+        _, manifest, key, entry = pending[file_path]
+        if error is None:
+            processed_files.append(os.path.splitext(file_path)[0])
+            manifest[key] = entry
+            logging.info(f"Đã xử lý thành công file: {file_path} ({seconds * 1000:.0f} ms)")
+        else:
+            failed_files.append(file_path)
+            manifest.pop(key, None)
+            logging.error(f"Lỗi khi xử lý file {file_path}: {str(error)}")
+
+    workers = min(workers or os.cpu_count() or 1, max(len(pending), 1))
+    if workers == 1:
+        for file_path, (metadata_file_path, *_) in pending.items():
+            logging.info(f"Đang xử lý file: {file_path}")
+            try:
+                record(file_path, process_document(file_path, metadata_file_path))
+            except Exception as e:
+                record(file_path, error=e)
+    else:
+        logging.info(f"Đang xử lý {len(pending)} file trên {workers} tiến trình")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(process_document, file_path, metadata_file_path): file_path
+                for file_path, (metadata_file_path, *_) in pending.items()
+            }
+            for future in as_completed(futures):
                 try:
-                    logging.info(f"Đang xử lý file: {file_path}")
-                    txt_path = file_path.split('.')[0] + '.txt'
-                    if os.path.exists(txt_path):
-                        with open(txt_path, 'r', encoding='utf-8') as f:
-                            text = f.read()
-                    else:
-                        text = read_doc_file(file_path)
-                    
-                    if not text.strip():
-                        failed_files += 1
-                        continue
-                        
-                    law_structure = extract_law_structure_and_metadata(text, metadata_file_path)
-                    save_path = file_path.split('.')[0] + '.json'
-                    with open(save_path, 'w', encoding='utf-8') as f:
-                        json.dump(law_structure, f, ensure_ascii=False, indent=4)
-
-                    processed_files.append(file_path.split(".")[0])
-                    logging.info(f"Đã xử lý thành công file: {file_path}")
-                    
+                    record(futures[future], future.result())
                 except Exception as e:
-                    failed_files.append(file_path)
-                    logging.error(f"Lỗi khi xử lý file {file_path}: {str(e)}")
-                    continue
-    
-    logging.info(f"Tổng số file đã xử lý của thư mục {root_dir}: {len(processed_files)}")
-    logging.info(f"Tổng số file thất bại của thư mục {root_dir}: {len(failed_files)}")
+                    record(futures[future], error=e)
+
+    for root_dir, manifest in manifests.items():
+        with open(os.path.join(root_dir, PREPROCESS_MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+
+    logging.info(f"Tổng số file đã xử lý của {', '.join(root_dirs)}: {len(processed_files)}")
+    logging.info(f"Tổng số file không thay đổi (bỏ qua): {skipped}")
+    logging.info(f"Tổng số file thất bại: {len(failed_files)}")
     return processed_files, failed_files
 
 def iterate_law_recursive(
@@ -549,21 +627,242 @@ def get_law_text(data, law_mapping=None):
     text = text.strip()  # Remove leading and trailing spaces
     return text
 
+# Tên luật in ở đầu mỗi chunk: law_name trong file .json -> tên kèm năm ban hành
+LAW_DISPLAY_NAMES = {
+    "HIẾN PHÁP NƯỚC CỘNG HÒA XÃ HỘI CHỦ NGHĨA VIỆT NAM": "Hiến pháp 2013",
+    "BỘ LUẬT DÂN SỰ": "Bộ luật dân sự 2015",
+    "LUẬT BẢO VỆ QUYỀN LỢI NGƯỜI TIÊU DÙNG": "Luật Bảo vệ quyền lợi người tiêu dùng 2023",
+    "LUẬT HÔN NHÂN VÀ GIA ĐÌNH": "Luật Hôn nhân và gia đình 2014",
+    "BỘ LUẬT HÌNH SỰ": "Bộ luật Hình sự sửa đổi 2017",
+    "BỘ LUẬT LAO ĐỘNG": "Bộ luật Lao động 2019",
+    "LUẬT AN TOÀN, VỆ SINH LAO ĐỘNG": "Luật an toàn, vệ sinh lao động 2015",
+    "LUẬT CÔNG ĐOÀN": "Luật Công đoàn 2012",
+    "LUẬT VIỆC LÀM": "Luật việc làm 2013",
+    "LUẬT BẢO HIỂM XÃ HỘI": "Luật Bảo hiểm xã hội sửa đổi 2019"
+}
+
+# Các văn bản (tương đối với raw_data) tạo nên corpus của chatbot, theo đúng thứ tự chunk trong corpus
+CORPUS_SOURCES = [
+    'HienPhap/hien-phap-2013.json',
+    'LuatDanSu/bo-luat-dan-su-2015.json',
+    'LuatDanSu/luat-bao-ve-quyen-loi-nguoi-tieu-dung-2023.json',
+    'LuatDanSu/luat-hon-nhan-va-gia-dinh-2014.json',
+    'LuatHinhSu/van-ban-hop-nhat-01.json',
+    'LuatLaoDong/bo-luat-lao-dong-2019.json',
+    'LuatLaoDong/luat-an-toan-ve-sinh-lao-dong-2015.json',
+    'LuatLaoDong/luat-cong-doan-2012.json',
+    'LuatLaoDong/luat-viec-lam-2013.json',
+    'LuatLaoDong/van-ban-hop-nhat-19.json'
+]
+
+def append_new_lines(text: str, new_text: str) -> str:
+    """Nối vào `text` các dòng của `new_text` kể từ dòng đầu tiên chưa có trong `text` (bỏ phần tiêu đề lặp lại)"""
+    lines = text.splitlines()
+    new_lines = new_text.splitlines()
+    for i, line in enumerate(new_lines):
+        if line not in lines:
+            lines.extend(new_lines[i:])
+            break
+    return '\n'.join(lines)
+
+# Chú thích của từng điều trong corpus backend (sinh ngoài pipeline này), gắn lại vào metadata khi xuất chunk
+ANNOTATION_FIELDS = ['keywords', 'topics', 'related_concepts']
+ANNOTATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'data', 'all_doc_metas.json')
+
+def load_chunk_annotations(metas_path: str = ANNOTATIONS_PATH) -> Dict[tuple, dict]:
+    """keywords/topics/related_concepts đã có của các điều, theo (law_name, điều)"""
+    if not os.path.exists(metas_path):
+        logging.warning(f"Không tìm thấy {metas_path}, các chunk được xuất với chú thích rỗng")
+        return {}
+    with open(metas_path, 'r', encoding='utf-8') as f:
+        return {
+            (meta['law_name'], meta['article']): {field: meta.get(field, []) for field in ANNOTATION_FIELDS}
+            for meta in json.load(f)
+        }
+
+def iter_law_chunks(
+    json_path: str,
+    granularity: str = "article",
+    law_mapping: Optional[dict] = None,
+    annotations: Optional[Dict[tuple, dict]] = None,
+    seen: Optional[Dict[str, int]] = None
+) -> Generator[dict, None, None]:
+    """
+    Các chunk của một văn bản luật đã xử lý, sinh lần lượt từ iterate_law_recursive.
+
+    `granularity="item"`: mỗi khoản/điểm là một chunk; `"article"`: các khoản liên tiếp của cùng một điều
+    được gộp thành một chunk. corpus_id chỉ phụ thuộc vào tên luật và vị trí trong luật
+    (`<law_name>:<điều>` hoặc `<law_name>:<điều>#<thứ tự khoản>`), nên không đổi khi thêm hoặc bớt văn bản
+    khác, và trùng với id ổn định của backend (handle_corpus.chunk_corpus_ids). Metadata gồm law_name, article
+    và các trường ANNOTATION_FIELDS lấy từ `annotations` (danh sách rỗng nếu điều chưa có chú thích).
+    `seen` đếm các id đã sinh, dùng chung giữa các văn bản của cùng một lần xuất.
+    """
+    law_mapping = law_mapping or LAW_DISPLAY_NAMES
+    annotations = annotations or {}
+    seen = {} if seen is None else seen
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    def chunk_id(law_name: str, key: str) -> str:
+        # Cùng số điều xuất hiện lại (văn bản hợp nhất) được đánh số tiếp để id không trùng
+        key = f"{law_name}:{key}"
+        seen[key] = seen.get(key, 0) + 1
+        return key if seen[key] == 1 else f"{key}~{seen[key]}"
+
+    def metadata(record: dict) -> dict:
+        annotation = annotations.get((record['law'], record['article'][0]), {})
+        return {
+            **{field: annotation.get(field, []) for field in ANNOTATION_FIELDS},
+            "law_name": record['law'],
+            "article": record['article'][0],
+        }
+
+    if granularity == "item":
+        article, position = None, 0
+        for record in iterate_law_recursive(data):
+            position = position + 1 if record['article'][0] == article else 0
+            article = record['article'][0]
+            yield {
+                "corpus_id": chunk_id(record['law'], f"{article}#{position}"),
+                "chunk_text": get_law_text(record, law_mapping),
+                "metadata": {**metadata(record), "item": record['item'][0], "subitem": record['subitem'][0]}
+            }
+        return
+
+    current = None
+    for record in iterate_law_recursive(data):
+        law_text = get_law_text(record, law_mapping)
+        if current is not None and record['article'][0] == current["metadata"]["article"]:
+            current["chunk_text"] = append_new_lines(current["chunk_text"], law_text)
+            continue
+        if current is not None:
+            yield current
+        current = {
+            "corpus_id": chunk_id(record['law'], record['article'][0]),
+            "chunk_text": law_text,
+            "metadata": metadata(record)
+        }
+    if current is not None:
+        yield current
+
+def export_chunks(json_paths: List[str], out, granularity: str = "article", annotations: Optional[Dict[tuple, dict]] = None) -> int:
+    """Ghi các chunk của nhiều văn bản ra `out` dạng JSONL (mỗi dòng một chunk), trả về số chunk"""
+    count = 0
+    seen = {}
+    for json_path in json_paths:
+        for chunk in iter_law_chunks(json_path, granularity, annotations=annotations, seen=seen):
+            out.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+def read_source_text(base: str) -> Optional[str]:
+    """Văn bản nguồn `base`.txt hoặc `base`.docx, None nếu không có"""
+    if os.path.exists(base + '.txt'):
+        with open(base + '.txt', 'r', encoding='utf-8') as f:
+            return f.read()
+    if os.path.exists(base + '.docx'):
+        doc = Document(base + '.docx')
+        return "".join(para.text.strip() + "\n" for para in doc.paragraphs if para.text.strip()).strip()
+    return None
+
+def iter_golden_files(root_dir) -> Generator[tuple, None, None]:
+    """(file .json đã xử lý, văn bản nguồn) cho mọi file .json có file .txt hoặc .docx tương ứng"""
+    for root, dirs, files in os.walk(root_dir):
+        for file in sorted(files):
+            if not file.endswith('.json'):
+                continue
+            base = os.path.join(root, file[:-len('.json')])
+            text = read_source_text(base)
+            if text is not None:
+                yield base + '.json', text
+
+def check_golden(root_dir) -> List[str]:
+    """So sánh cấu trúc do LawParser dựng với các file .json đã xử lý trước đó, trả về các file khác biệt"""
+    mismatched = []
+    for json_path, text in iter_golden_files(root_dir):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            golden = json.load(f)
+        golden.pop("metadata", None)
+        structure = {"law_name": extract_law_name(text), **LawParser(text).parse()}
+        if structure == golden:
+            logging.info(f"Khớp: {json_path}")
+        else:
+            logging.error(f"Khác biệt: {json_path}")
+            mismatched.append(json_path)
+    logging.info(f"Số file khác biệt: {len(mismatched)}")
+    return mismatched
+
+def benchmark_parser(root_dir, repeat: int = 5) -> None:
+    """Thời gian LawParser dựng cấu trúc cho từng văn bản (lấy lần nhanh nhất trong `repeat` lần)"""
+    print(f"{'file':<50} {'ký tự':>9} {'ms':>8} {'MB/s':>7}")
+    for json_path, text in iter_golden_files(root_dir):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            LawParser(text).parse()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f"{os.path.basename(json_path)[:-len('.json')]:<50} {len(text):>9} {best * 1000:>8.1f} {len(text.encode('utf-8')) / best / 1e6:>7.1f}")
+
+# Module handle_dataset của backend đọc các file CSV trong processed_data và xuất chúng sang Parquet
+PYTHONLLM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'pythonllm')
+
+def export_datasets(force: bool = False) -> None:
+    """Xuất lại bộ dữ liệu CSV trong processed_data sang Parquet nếu CSV đã thay đổi (so với manifest)"""
+    sys.path.insert(0, os.path.abspath(PYTHONLLM_DIR))
+    try:
+        from handle_dataset import export_parquet_datasets_if_stale, PARQUET_DIR
+    except ImportError as e:
+        logging.warning(f"Không xuất được Parquet ({e}), chạy `python reindex.py export-datasets` trong {PYTHONLLM_DIR}")
+        return
+    finally:
+        sys.path.pop(0)
+    manifest = export_parquet_datasets_if_stale(force=force)
+    if manifest is None:
+        logging.info(f"Bộ dữ liệu Parquet đã cập nhật: {PARQUET_DIR}")
+    else:
+        logging.info(f"Đã xuất {len(manifest['laws'])} bộ luật sang Parquet: {PARQUET_DIR}")
+
 def main():
-    # Xử lý tất cả các thư mục
-    # directories = ['HienPhap', 'LuatLaoDong', 'LuatDanSu', 'LuatHinhSu']
-    directories = ['HienPhap', 'LuatLaoDong', 'LuatDanSu', 'LuatHinhSu']
-    all_processed_files = []
-    all_failed_files = []
-
-    for directory in directories:
-        logging.info(f"Đang xử lý thư mục {directory}...")
-        processed_files, failed_files = process_documents(directory)
-        all_processed_files.extend(processed_files)
-        all_failed_files.extend(failed_files)
-
-    logging.info(f"Tổng số file đã xử lý của tất cả thư mục: {len(all_processed_files)}")
-    logging.info(f"Tổng số file thất bại của tất cả thư mục: {len(all_failed_files)}")
+    parser = argparse.ArgumentParser(description="Tiền xử lý văn bản luật trong các thư mục HienPhap, LuatLaoDong, LuatDanSu, LuatHinhSu")
+    parser.add_argument("--check-golden", metavar="DIR", help="Kiểm tra LawParser với các file .json đã xử lý trong DIR")
+    parser.add_argument("--benchmark", metavar="DIR", help="Đo thời gian phân tích các văn bản trong DIR")
+    parser.add_argument("--workers", type=int, default=None, help="Số tiến trình xử lý song song (mặc định: số nhân CPU)")
+    parser.add_argument("--force", action="store_true", help="Xử lý lại mọi file, kể cả file không thay đổi")
+    parser.add_argument("--export-chunks", metavar="OUT", help="Ghi các chunk của corpus ra file JSONL OUT ('-' = stdout)")
+    parser.add_argument("--granularity", choices=["article", "item"], default="article", help="Mỗi chunk là một điều hoặc một khoản/điểm")
+    parser.add_argument("--sources", nargs="+", default=CORPUS_SOURCES, help="Các file .json dùng cho --export-chunks")
+    parser.add_argument("--annotations", default=ANNOTATIONS_PATH, help="File metadata có keywords/topics/related_concepts của từng điều")
+    parser.add_argument("--export-datasets", action="store_true", help="Chỉ xuất các file CSV trong processed_data sang Parquet (kể cả khi không đổi)")
+    parser.add_argument("directories", nargs="*", default=['HienPhap', 'LuatLaoDong', 'LuatDanSu', 'LuatHinhSu'])
+    args = parser.parse_args()
+    if args.check_golden:
+        sys.exit(1 if check_golden(args.check_golden) else 0)
+    if args.benchmark:
+        benchmark_parser(args.benchmark)
+        return
+    if args.export_chunks:
+        annotations = load_chunk_annotations(args.annotations)
+        if args.export_chunks == '-':
+            count = export_chunks(args.sources, sys.stdout, args.granularity, annotations)
+        else:
+            with open(args.export_chunks, 'w', encoding='utf-8') as f:
+                count = export_chunks(args.sources, f, args.granularity, annotations)
+        logging.info(f"Đã ghi {count} chunk ({args.granularity}) ra {args.export_chunks}")
+        return
+    if args.export_datasets:
+        export_datasets(force=True)
+        return
+
+    # Xử lý tất cả các thư mục trong cùng một pool tiến trình
+    logging.info(f"Đang xử lý các thư mục {', '.join(args.directories)}...")
+    start = time.perf_counter()
+    processed_files, failed_files = process_documents(args.directories, workers=args.workers, force=args.force)
+    logging.info(f"Tổng số file đã xử lý của tất cả thư mục: {len(processed_files)}")
+    logging.info(f"Tổng số file thất bại của tất cả thư mục: {len(failed_files)}")
+    logging.info(f"Tổng thời gian: {time.perf_counter() - start:.2f} s")
+    # Bản Parquet của bộ dữ liệu CSV (câu hỏi/corpus/qnc) mà backend đọc
+    export_datasets()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# preprocess.py is a script imported by name (as when run from the dataset directory)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))